@@ -12,6 +12,12 @@
     --all          处理所有文件，包括已有摘要的文件
     --limit N      限制处理文件数量为N（默认处理所有）
     --category CAT 只处理特定分类的文件
+    --resume       从上次中断的位置继续，跳过进度日志中已完成的文章
+    --time-budget SECONDS  运行时间预算（秒），到时后安全停止
+    --batch        将多篇短文章合并为一次API请求，按令牌预算分批
+    --summary-engine local|api|auto  摘要引擎（默认使用设置中的SUMMARY_ENGINE）
+    --max-tokens-budget N  AI令牌上限，达到后安全停止
+    --max-cost YUAN  AI费用上限（元），达到后安全停止
     --help, -h     显示帮助信息
 """
 
@@ -20,101 +26,191 @@ import re
 import sys
 import time
 import argparse
-import re
-import os
-import sys
-import time
-import argparse
 from obsidian2chirpy.config import settings
-from obsidian2chirpy.utils import ai_utils
+from obsidian2chirpy.utils import ai_utils, file_utils, summary_input, text_utils
 
-def add_summary_to_file(file_path, override_existing=False):
+def prepare_summary_input(file_path, override_existing=False, completed_hashes=None):
+    """
+    读取文件并准备用于生成摘要的正文内容
+    
+    Args:
+        file_path: 文件路径
+        override_existing: 是否覆盖已有的摘要
+        completed_hashes: 进度日志中已完成文章的正文哈希值集合，命中则跳过
+    
+    Returns:
+        字典 {body, content_hash, signature}，如果应跳过则返回None
+    """
+    # 读取文件内容
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # 检查文件是否已有description字段
+    yaml_match = re.match(r'^---\s*\n(.*?)\n---\s*\n', content, re.DOTALL)
+    if not yaml_match:
+        print(f"⚠️ 文件 {os.path.basename(file_path)} 没有YAML前置元数据，跳过")
+        return None
+    
+    yaml_content = yaml_match.group(1)
+    if re.search(r'description:', yaml_content) and not override_existing:
+        print(f"⚠️ 文件 {os.path.basename(file_path)} 已有摘要，跳过")
+        return None
+    
+    # 提取正文内容用于生成摘要
+    rest_of_doc = content[yaml_match.end():]
+    
+    # 以正文哈希值作为进度日志的键，添加摘要不会改变正文
+    content_hash = text_utils.calculate_text_hash(rest_of_doc.strip())
+    if completed_hashes is not None and content_hash in completed_hashes:
+        print(f"⚠️ 文件 {os.path.basename(file_path)} 在上次运行中已完成，跳过")
+        return None
+    
+    # 已有摘要且正文与生成摘要时相比只有细微修改，不重新生成
+    signature = summary_input.summary_signature(rest_of_doc)
+    simhash_match = re.search(r'^summary_simhash:\s*([0-9a-fA-F]+)', yaml_content, re.MULTILINE)
+    if simhash_match and text_utils.simhash_similarity(simhash_match.group(1), signature) >= settings.SUMMARY_SIMILARITY_THRESHOLD:
+        print(f"⚠️ 文件 {os.path.basename(file_path)} 正文没有实质修改，保留现有摘要")
+        return None
+    
+    return {
+        'body': rest_of_doc,
+        'content_hash': content_hash,
+        'signature': signature,
+    }
+
+
+def write_summary_to_file(file_path, prepared, summary, journal_path=None):
+    """
+    将摘要写入文件的YAML前置元数据，并记录进度
+    
+    Args:
+        file_path: 文件路径
+        prepared: prepare_summary_input 返回的字典
+        summary: 生成的摘要
+        journal_path: 进度日志路径，成功后追加记录
+    
+    Returns:
+        bool: 是否成功添加摘要
+    """
+    if not summary:
+        print(f"❌ 文件 {os.path.basename(file_path)} 摘要生成失败")
+        return False
+    
+    # 将摘要和正文签名写入YAML前置元数据，已有摘要时替换
+    if not file_utils.patch_post_description(file_path, summary, prepared['signature'], replace_existing=True):
+        print(f"❌ 文件 {os.path.basename(file_path)} 摘要写入失败")
+        return False
+    
+    # 记录进度
+    if journal_path:
+        file_utils.append_summary_journal(journal_path, prepared['content_hash'], file_path)
+    
+    # 输出简化的摘要信息
+    truncated_summary = summary[:50] + "..." if len(summary) > 50 else summary
+    print(f"✅ 文件 {os.path.basename(file_path)} 摘要添加成功")
+    print(f"   摘要: {truncated_summary}")
+    return True
+
+
+def add_summary_to_file(file_path, override_existing=False, completed_hashes=None, journal_path=None):
     """
     为单个文件添加AI摘要
     
     Args:
         file_path: 文件路径
         override_existing: 是否覆盖已有的摘要
+        completed_hashes: 进度日志中已完成文章的正文哈希值集合，命中则跳过
+        journal_path: 进度日志路径，成功后追加记录
         
     Returns:
         bool: 是否成功添加摘要
     """
     try:
-        # 读取文件内容
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 检查文件是否已有description字段
-        yaml_match = re.match(r'^---\s*\n(.*?)\n---\s*\n', content, re.DOTALL)
-        if not yaml_match:
-            print(f"⚠️ 文件 {os.path.basename(file_path)} 没有YAML前置元数据，跳过")
+        prepared = prepare_summary_input(file_path, override_existing, completed_hashes)
+        if not prepared:
             return False
         
-        yaml_content = yaml_match.group(1)
-        if re.search(r'description:', yaml_content) and not override_existing:
-            print(f"⚠️ 文件 {os.path.basename(file_path)} 已有摘要，跳过")
-            return False
-        
-        # 提取正文内容用于生成摘要
-        rest_of_doc = content[yaml_match.end():]
-        
-        # 从正文内容中删除Markdown特殊格式
-        content_for_summary = re.sub(r'```.*?```', '', rest_of_doc, flags=re.DOTALL)
-        content_for_summary = re.sub(r'<.*?>', '', content_for_summary)
-        content_for_summary = re.sub(r'!\[.*?\]\(.*?\)', '', content_for_summary)
-        content_for_summary = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', content_for_summary)
-        
         # 生成摘要
         print(f"正在为文件 {os.path.basename(file_path)} 生成摘要...")
-        summary = ai_utils.generate_summary(content_for_summary, settings.SUMMARY_MAX_LENGTH)
-        
-        if not summary:
-            print(f"❌ 文件 {os.path.basename(file_path)} 摘要生成失败")
-            return False
-        
-        # 处理摘要中可能包含的引号，确保YAML格式正确
-        summary = summary.replace('"', '\\"')
+        summary = ai_utils.summarize(prepared['body'], settings.SUMMARY_MAX_LENGTH)
         
-        # 将摘要添加到YAML前置元数据中
-        new_yaml = yaml_content.rstrip() + f'\ndescription: "{summary}"\n'
-        new_content = re.sub(r'^---\s*\n(.*?)\n---\s*\n', f'---\n{new_yaml}\n---\n\n', content, flags=re.DOTALL)
-        
-        # 写回文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        
-        # 输出简化的摘要信息
-        truncated_summary = summary[:50] + "..." if len(summary) > 50 else summary
-        print(f"✅ 文件 {os.path.basename(file_path)} 摘要添加成功")
-        print(f"   摘要: {truncated_summary}")
-        return True
+        return write_summary_to_file(file_path, prepared, summary, journal_path)
     
     except Exception as e:
         print(f"❌ 处理文件 {os.path.basename(file_path)} 时出错: {str(e)}")
         return False
 
-def process_all_posts(override_existing=False, limit=None, category=None):
+
+def add_summaries_in_batch(batch, journal_path=None):
+    """
+    将多篇文章合并为一次API请求生成摘要，并分别写回文件
+    
+    Args:
+        batch: 列表 [(文件路径, prepare_summary_input 返回的字典)]
+        journal_path: 进度日志路径
+    
+    Returns:
+        元组 (成功数, 失败数)
+    """
+    names = ", ".join(os.path.basename(file_path) for file_path, _ in batch)
+    print(f"正在批量为 {len(batch)} 个文件生成摘要: {names}")
+    summaries = ai_utils.generate_summaries_batch(
+        [prepared['body'] for _, prepared in batch],
+        settings.SUMMARY_MAX_LENGTH,
+        [prepared['summary_input'] for _, prepared in batch]
+    )
+    
+    cache = ai_utils.get_summary_cache()
+    success_count = 0
+    failed_count = 0
+    for (file_path, prepared), summary in zip(batch, summaries):
+        if summary and cache:
+            cache.put(prepared['body'], settings.SUMMARY_MAX_LENGTH, summary)
+        # 自动模式下，AI摘要失败的文章改用本地摘要
+        if not summary and settings.SUMMARY_ENGINE == "auto":
+            summary = ai_utils.summarize(prepared['body'], settings.SUMMARY_MAX_LENGTH, engine="local")
+        try:
+            if write_summary_to_file(file_path, prepared, summary, journal_path):
+                success_count += 1
+            else:
+                failed_count += 1
+        except Exception as e:
+            print(f"❌ 处理文件 {os.path.basename(file_path)} 时出错: {str(e)}")
+            failed_count += 1
+    return success_count, failed_count
+
+def process_all_posts(override_existing=False, limit=None, category=None, resume=False, time_budget=None, batch=False):
     """
-    处理_posts目录中的所有Markdown文件
+    处理_posts目录中的所有Markdown文件，最近修改的文章优先处理
     
     Args:
         override_existing: 是否覆盖已有摘要
         limit: 限制处理的文件数量
         category: 只处理特定分类的文件
+        resume: 是否从进度日志继续上次中断的运行
+        time_budget: 运行时间预算（秒），到时后安全停止
+        batch: 是否将多篇文章合并为一次API请求
     """
     if not os.path.exists(settings.POSTS_ROOT):
         print(f"❌ 目录不存在: {settings.POSTS_ROOT}")
         return
     
-    # 检查API密钥
-    if not settings.AI_API_KEY:
-        api_key = input("请输入AI API密钥: ").strip()
+    # 检查API密钥，本地摘要引擎不需要密钥
+    use_api = settings.SUMMARY_ENGINE != "local"
+    if use_api and not ai_utils.api_available():
+        api_key = input("请输入AI API密钥（按Enter跳过）: ").strip()
         if api_key:
             settings.AI_API_KEY = api_key
+        elif settings.SUMMARY_ENGINE == "auto":
+            print("⚠️ 未提供API密钥，将使用本地摘要")
+            use_api = False
         else:
             print("❌ 未提供API密钥，无法生成摘要")
             return
     
+    # 本地摘要不需要合并请求
+    batch = batch and use_api
+    
     print(f"开始处理 {settings.POSTS_ROOT} 中的Markdown文件...")
     if override_existing:
         print("已启用覆盖现有摘要选项")
@@ -122,6 +218,21 @@ def process_all_posts(override_existing=False, limit=None, category=None):
         print(f"将只处理 {limit} 个文件")
     if category:
         print(f"将只处理 {category} 分类的文件")
+    if time_budget:
+        print(f"时间预算：{time_budget} 秒")
+    if batch:
+        print(f"已启用批量模式，每次请求的输入令牌预算为 {settings.SUMMARY_BATCH_TOKEN_BUDGET}")
+    
+    # 加载或重置进度日志
+    journal_path = settings.SUMMARY_JOURNAL_PATH
+    if resume:
+        completed_hashes = file_utils.load_summary_journal(journal_path)
+        print(f"从进度日志继续，已完成 {len(completed_hashes)} 篇文章")
+    else:
+        completed_hashes = None
+        file_utils.reset_summary_journal(journal_path)
+    start_time = time.time()
+    stopped_early = False
     
     # 统计信息
     total_files = 0
@@ -130,45 +241,119 @@ def process_all_posts(override_existing=False, limit=None, category=None):
     skipped_count = 0
     failed_count = 0
     
-    # 遍历目录
-    for root, _, files in os.walk(settings.POSTS_ROOT):
-        for file in files:
-            if file.lower().endswith(('.md', '.markdown')):
-                file_path = os.path.join(root, file)
-                
-                # 如果指定了分类，检查是否匹配
-                if category:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    category_match = re.search(r'categories:\s*\[(.*?)\]', content)
-                    if not category_match or category.lower() not in category_match.group(1).lower():
-                        continue
-                
-                total_files += 1
-                
-                # 如果设置了限制，并且已经达到限制，停止处理
-                if limit and processed_files >= limit:
-                    break
-                
-                processed_files += 1
+    # 通过元数据索引筛选文章，只读取YAML头部，无需读取正文
+    posts_index = file_utils.load_posts_metadata_index(settings.POSTS_ROOT)
+    
+    posts = sorted(posts_index.items(), key=lambda item: item[1]['mtime'], reverse=True)
+    
+    # 批量模式下等待合并请求的文章
+    pending_batch = []
+    pending_tokens = 0
+    summary_cache = ai_utils.get_summary_cache() if batch else None
+    
+    try:
+        for file_path, meta in posts:
+            # 如果指定了分类，检查是否匹配
+            if category and category.lower() not in ",".join(meta['categories']).lower():
+                continue
+            
+            total_files += 1
+            
+            # 已有摘要的文章直接跳过，不需要打开文件
+            if meta['has_description'] and not override_existing:
+                skipped_count += 1
+                continue
+            
+            # 如果设置了限制，并且已经达到限制，停止处理
+            if limit and processed_files >= limit:
+                break
+            
+            # 达到AI用量上限，安全停止
+            if use_api and ai_utils.usage_tracker.budget_exceeded():
+                print("\n⚠️ 已达到AI令牌或费用上限，停止处理")
+                stopped_early = True
+                break
+            
+            # 超出时间预算，安全停止
+            if time_budget and time.time() - start_time >= time_budget:
+                print(f"\n⚠️ 已达到时间预算 {time_budget} 秒，停止处理")
+                stopped_early = True
+                break
+            
+            processed_files += 1
+            
+            if batch:
+                # 批量模式：先准备输入，累计到令牌预算后合并为一次请求
                 try:
-                    result = add_summary_to_file(file_path, override_existing)
-                    if result:
-                        success_count += 1
-                    else:
-                        skipped_count += 1
+                    prepared = prepare_summary_input(file_path, override_existing, completed_hashes)
                 except Exception as e:
                     print(f"❌ 处理文件 {os.path.basename(file_path)} 时出错: {str(e)}")
                     failed_count += 1
+                    continue
+                if not prepared:
+                    skipped_count += 1
+                    continue
                 
-                # 添加延迟，避免API调用过于频繁
+                # 摘要缓存中已有的文章直接写入，不加入批次
+                cached_summary = summary_cache.get(prepared['body'], settings.SUMMARY_MAX_LENGTH) if summary_cache else None
+                if cached_summary:
+                    print(f"文件 {os.path.basename(file_path)} 使用缓存的AI摘要")
+                    try:
+                        if write_summary_to_file(file_path, prepared, cached_summary, journal_path):
+                            success_count += 1
+                        else:
+                            failed_count += 1
+                    except Exception as e:
+                        print(f"❌ 处理文件 {os.path.basename(file_path)} 时出错: {str(e)}")
+                        failed_count += 1
+                    continue
+                
+                # 摘要输入只准备一次，既用于计算批次的令牌数，也用于生成请求
+                prepared['summary_input'] = summary_input.prepare_summary_input(prepared['body'])
+                tokens = prepared['summary_input'][2]
+                if pending_batch and pending_tokens + tokens > settings.SUMMARY_BATCH_TOKEN_BUDGET:
+                    batch_success, batch_failed = add_summaries_in_batch(pending_batch, journal_path)
+                    success_count += batch_success
+                    failed_count += batch_failed
+                    pending_batch, pending_tokens = [], 0
+                    time.sleep(1)
+                pending_batch.append((file_path, prepared))
+                pending_tokens += tokens
+                continue
+            
+            # 摘要来自进度日志、摘要缓存或本地摘要时没有请求API，无需等待
+            request_count = ai_utils.usage_tracker.request_count
+            try:
+                result = add_summary_to_file(file_path, override_existing, completed_hashes, journal_path)
+                if result:
+                    success_count += 1
+                else:
+                    skipped_count += 1
+            except Exception as e:
+                print(f"❌ 处理文件 {os.path.basename(file_path)} 时出错: {str(e)}")
+                failed_count += 1
+            
+            # 添加延迟，避免API调用过于频繁
+            if ai_utils.usage_tracker.request_count != request_count:
                 time.sleep(1)
+        
+        # 处理剩余的批次
+        if pending_batch:
+            batch_success, batch_failed = add_summaries_in_batch(pending_batch, journal_path)
+            success_count += batch_success
+            failed_count += batch_failed
+    except KeyboardInterrupt:
+        print("\n⚠️ 用户中断，停止处理")
+        stopped_early = True
     
     print("\n处理完成！统计信息：")
     print(f"- 总文件数：{total_files}")
     print(f"- 成功添加摘要数：{success_count}")
     print(f"- 跳过文件数（已有摘要）：{skipped_count}")
     print(f"- 处理失败数：{failed_count}")
+    ai_utils.usage_tracker.print_report()
+    if stopped_early:
+        print("使用 --resume 参数可从中断处继续，已完成的文章不会重复生成摘要")
 
 if __name__ == "__main__":
     # 创建命令行参数解析器
@@ -176,6 +361,12 @@ if __name__ == "__main__":
     parser.add_argument('--all', action='store_true', help='处理所有文件，包括已有摘要的文件')
     parser.add_argument('--limit', type=int, help='限制处理文件数量')
     parser.add_argument('--category', help='只处理特定分类的文件')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的位置继续')
+    parser.add_argument('--time-budget', type=float, help='运行时间预算（秒），到时后安全停止')
+    parser.add_argument('--batch', action='store_true', help='将多篇短文章合并为一次API请求')
+    parser.add_argument('--max-tokens-budget', type=int, help='本次运行的AI令牌上限，达到后安全停止')
+    parser.add_argument('--max-cost', type=float, help='本次运行的AI费用上限（元），达到后安全停止')
+    parser.add_argument('--summary-engine', choices=['local', 'api', 'auto'], help='摘要引擎：local（本地抽取）、api（AI接口）、auto（优先AI接口，失败时使用本地摘要）')
     
     # 解析命令行参数
     args = parser.parse_args()
@@ -184,5 +375,12 @@ if __name__ == "__main__":
     override_existing = args.all
     limit = args.limit
     category = args.category
+    if args.summary_engine:
+        settings.SUMMARY_ENGINE = args.summary_engine
+    if args.max_tokens_budget:
+        settings.MAX_TOKENS_BUDGET = args.max_tokens_budget
+    if args.max_cost:
+        settings.MAX_COST = args.max_cost
     
-    process_all_posts(override_existing=override_existing, limit=limit, category=category)
+    process_all_posts(override_existing=override_existing, limit=limit, category=category,
+                      resume=args.resume, time_budget=args.time_budget, batch=args.batch)
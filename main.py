@@ -8,53 +8,95 @@ python main.py [选项] [文件名/文件夹名/路径]
 
 选项:
 --summary, -s     启用AI自动生成文章摘要
+--summary-engine  摘要引擎：local（本地抽取）、api（AI接口）、auto（默认，优先AI接口）
+--max-tokens-budget  本次运行的AI令牌上限
+--max-cost        本次运行的AI费用上限（元）
+--daemon          以守护进程方式运行，通过 python -m obsidian2chirpy.client 转换单篇笔记
+--profiles        多站点配置文件，依次自动处理其中的每组 笔记库→博客
+--shard i/N       只自动处理第i个分片（共N个）中的笔记，结果写入分片清单
+--merge           把各分片清单合并到全局哈希记录和文章索引
 --help, -h        显示帮助信息
 """
 
 import sys
-import os
-import re
-import time
-import hashlib
-import json
 import argparse
 
 # 导入重构后的模块
 from obsidian2chirpy.core.file_processor import process_folder
 from obsidian2chirpy.config import settings
+from obsidian2chirpy.utils import ai_utils
 
 
 if __name__ == "__main__":
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='将Obsidian格式的Markdown文件转换为Chirpy主题博客兼容的格式')
     parser.add_argument('--summary', '-s', action='store_true', help='启用AI自动生成文章摘要')
+    parser.add_argument('--summary-engine', choices=['local', 'api', 'auto'], help='摘要引擎：local（本地抽取）、api（AI接口）、auto（优先AI接口，失败时使用本地摘要）')
+    parser.add_argument('--max-tokens-budget', type=int, help='本次运行的AI令牌上限，达到后不再请求摘要')
+    parser.add_argument('--max-cost', type=float, help='本次运行的AI费用上限（元），达到后不再请求摘要')
+    parser.add_argument('--daemon', action='store_true', help='以守护进程方式运行，保留文章清单和缓存，接收客户端的转换请求')
+    parser.add_argument('--profiles', help='多站点配置文件（JSON），依次自动处理其中的每组 笔记库→博客')
+    parser.add_argument('--shard', metavar='i/N', help='只自动处理第i个分片（共N个）中的笔记，哈希记录写入分片清单，可在多台机器上同时运行')
+    parser.add_argument('--merge', action='store_true', help='把各分片清单合并到全局哈希记录和文章索引，发现冲突时不做修改')
     parser.add_argument('input_path', nargs='?', default='', help='要处理的文件名、文件夹名或路径')
     
     # 解析命令行参数
     args = parser.parse_args()
     
     # 根据命令行参数设置是否启用摘要生成
+    if args.summary_engine:
+        settings.SUMMARY_ENGINE = args.summary_engine
+    if args.max_tokens_budget:
+        settings.MAX_TOKENS_BUDGET = args.max_tokens_budget
+    if args.max_cost:
+        settings.MAX_COST = args.max_cost
     if args.summary:
         settings.ENABLE_AUTO_SUMMARY = True
         print("已启用AI自动生成文章摘要功能")
-        if not settings.AI_API_KEY:
+        if settings.SUMMARY_ENGINE != "local" and not ai_utils.api_available():
             api_key = input("请输入AI API密钥（按Enter跳过）: ").strip()
             if api_key:
                 settings.AI_API_KEY = api_key
+            elif settings.SUMMARY_ENGINE == "auto":
+                print("⚠️ 未提供API密钥，将使用本地摘要")
             else:
                 print("⚠️ 未提供API密钥，摘要功能将被禁用")
                 settings.ENABLE_AUTO_SUMMARY = False
     else:
         settings.ENABLE_AUTO_SUMMARY = False
     
+    if args.daemon:
+        from obsidian2chirpy.core import daemon
+        daemon.serve()
+        sys.exit(0)
+    
+    if args.merge:
+        from obsidian2chirpy.core import sharding
+        sys.exit(0 if sharding.merge_manifests() else 1)
+    
+    if args.shard:
+        from obsidian2chirpy.core import sharding
+        try:
+            for name, value in sharding.shard_settings(*sharding.parse_shard(args.shard)).items():
+                setattr(settings, name, value)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.profiles:
+        settings.PROFILES_PATH = args.profiles
+    
     # 处理输入路径
     input_path = args.input_path
-    if not input_path:
+    if not input_path and not args.profiles and not args.shard:
         # 获取用户输入的文件名、文件夹名或路径
         input_path = input("请输入要处理的Markdown文件名、文件夹名或路径（留空则自动处理源文件夹）：").strip()
     
     # 先尝试去除输入可能带的引号
     cleaned_input = input_path.strip('\'"')
     
-    # 处理给定输入或自动处理
-    process_folder(cleaned_input)
+    # 处理给定输入或自动处理；设置了多站点配置时依次处理每个配置
+    if not cleaned_input and settings.PROFILES_PATH:
+        from obsidian2chirpy.core.profiles import process_profiles
+        process_profiles(settings.PROFILES_PATH)
+    else:
+        process_folder(cleaned_input)
@@ -0,0 +1,103 @@
+"""
+守护进程客户端
+向转换守护进程发送JSON-RPC请求，只依赖标准库，启动很快，适合编辑器快捷键和Obsidian插件调用
+
+用法：
+python -m obsidian2chirpy.client convert 笔记路径
+python -m obsidian2chirpy.client status
+python -m obsidian2chirpy.client rebuild
+"""
+
+import json
+import os
+import socket
+import sys
+
+from .config import settings
+
+
+class DaemonError(Exception):
+    """
+    守护进程返回的错误
+    """
+
+
+def use_unix_socket():
+    """
+    是否通过Unix套接字通信，不支持的系统上使用本机端口
+    """
+    return hasattr(socket, 'AF_UNIX') and bool(settings.DAEMON_SOCKET_PATH)
+
+
+def call(method, params=None, timeout=None):
+    """
+    调用守护进程的方法
+
+    Args:
+        method: 方法名：convert、status 或 rebuild
+        params: 参数列表
+        timeout: 超时时间（秒），为None时一直等待
+
+    Returns:
+        方法的返回值
+
+    Raises:
+        ConnectionError: 守护进程没有运行
+        DaemonError: 方法执行失败
+    """
+    if use_unix_socket():
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = settings.DAEMON_SOCKET_PATH
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = ('127.0.0.1', settings.DAEMON_PORT)
+    connection.settimeout(timeout)
+    with connection:
+        try:
+            connection.connect(address)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(f"守护进程没有运行: {address}") from e
+        request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or []}
+        connection.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise DaemonError("守护进程关闭了连接")
+    response = json.loads(line)
+    if 'error' in response:
+        raise DaemonError(response['error'].get('message', ''))
+    return response.get('result')
+
+
+def main(argv=None):
+    """
+    命令行入口
+
+    Returns:
+        退出码：0 成功，1 方法执行失败，2 守护进程没有运行或用法错误
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ('convert', 'status', 'rebuild') or (argv[0] == 'convert' and len(argv) != 2):
+        print(__doc__.strip())
+        return 2
+
+    method = argv[0]
+    params = [os.path.abspath(argv[1])] if method == 'convert' else []
+    try:
+        result = call(method, params)
+    except ConnectionError as e:
+        print(f"× {e}，请先运行 python main.py --daemon")
+        return 2
+    except DaemonError as e:
+        print(f"× {e}")
+        return 1
+
+    if method == 'convert':
+        print(f"✓ {result['post']}（{result['elapsed_ms']} ms）")
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,6 @@
 """
 配置模块初始化
-"""
\ No newline at end of file
+"""
+
+# 让 settings 支持按线程使用转换器各自的设置（只在使用期间生效）
+from . import context
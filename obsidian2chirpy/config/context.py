@@ -0,0 +1,186 @@
+"""
+设置上下文模块
+让同一进程中的多个转换器（core.converter.Converter）各自使用一份设置
+转换器调用期间，当前线程读写 settings.XXX 时访问转换器自己的设置，其他线程不受影响；
+没有转换器时仍直接访问 settings 模块中的全局变量
+
+按线程查找设置需要替换 settings 模块的类型，读取设置会慢一个数量级，
+因此只在有线程使用转换器的设置期间替换，命令行程序的普通运行不受影响。
+其他模块只能在调用时读取 settings.XXX，不能在导入时把设置值保存到模块变量或参数默认值中，
+否则转换器的设置对其不起作用
+
+模块中的可变状态（步骤统计、AI用量、接口池、摘要缓存等）用 ScopedState 定义，
+转换器调用期间使用转换器自己的一份（见 use_state），不与其他转换器共用
+"""
+
+import contextvars
+import copy
+import os
+import threading
+import types
+from contextlib import contextmanager
+
+from . import settings
+
+_active = contextvars.ContextVar("o2c_settings", default=None)
+# 当前线程使用的模块状态 {ScopedState: 值}
+_state = contextvars.ContextVar("o2c_state", default=None)
+
+# 正在使用转换器设置的调用数，大于0时 settings 模块的类型为 _ContextSettings
+_hook_users = 0
+_hook_lock = threading.Lock()
+
+
+class _ContextSettings(types.ModuleType):
+    """
+    settings 模块的类型，读写属性时优先使用当前线程的设置
+    """
+
+    def __getattribute__(self, name):
+        values = _active.get()
+        if values is not None and name in values:
+            return values[name]
+        return types.ModuleType.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        values = _active.get()
+        if values is not None and name in values:
+            values[name] = value
+        else:
+            types.ModuleType.__setattr__(self, name, value)
+
+
+@contextmanager
+def _hooked():
+    """
+    在 with 语句块期间让 settings 按线程查找设置，最后一个调用结束后恢复普通模块
+    """
+    global _hook_users
+    with _hook_lock:
+        if _hook_users == 0:
+            settings.__class__ = _ContextSettings
+        _hook_users += 1
+    try:
+        yield
+    finally:
+        with _hook_lock:
+            _hook_users -= 1
+            if _hook_users == 0:
+                settings.__class__ = types.ModuleType
+
+
+def snapshot(**overrides):
+    """
+    复制当前的全部设置，并应用覆盖的设置项
+
+    修改了 POSTS_ROOT 时，没有单独指定的 OUTPUT_FOLDER 移到新的_posts目录下，
+    位于原博客目录下的状态文件（哈希记录、索引、缓存、锁目录等）移到新博客目录下，两套设置不会共用状态文件
+
+    Args:
+        overrides: 要覆盖的设置项，如 SOURCE_FOLDER="...", ENABLE_AUTO_SUMMARY=False
+
+    Returns:
+        设置字典 {设置名: 值}
+
+    Raises:
+        ValueError: 设置名不存在
+    """
+    base = {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+    unknown = [name for name in overrides if name not in base]
+    if unknown:
+        raise ValueError(f"未知的设置: {', '.join(unknown)}")
+
+    values = copy.deepcopy(base)
+    values.update(overrides)
+
+    moves = [
+        (base['POSTS_ROOT'], values['POSTS_ROOT']),
+        (os.path.dirname(base['POSTS_ROOT']), os.path.dirname(values['POSTS_ROOT'])),
+    ]
+    for name, value in base.items():
+        if name in overrides or not isinstance(value, str):
+            continue
+        for old, new in moves:
+            if old != new and value.startswith(old + os.sep):
+                values[name] = new + value[len(old):]
+                break
+    return values
+
+
+@contextmanager
+def use(values):
+    """
+    在 with 语句块中让当前线程使用给定的设置
+
+    Args:
+        values: snapshot() 返回的设置字典，语句块中对 settings 的修改写入此字典
+    """
+    token = _active.set(values)
+    try:
+        with _hooked():
+            yield values
+    finally:
+        _active.reset(token)
+
+
+class ScopedState:
+    """
+    模块级的可变状态，转换器调用期间使用转换器自己的一份，没有转换器时使用默认的一份
+    """
+
+    def __init__(self, factory):
+        """
+        Args:
+            factory: 创建初始状态的函数，如 dict
+        """
+        self.factory = factory
+        self.default = factory()
+
+    def get(self):
+        """
+        返回当前线程使用的状态，转换器的状态中还没有时创建
+        """
+        state = _state.get()
+        if state is None:
+            return self.default
+        value = state.get(self)
+        if value is None:
+            value = state.setdefault(self, self.factory())
+        return value
+
+
+@contextmanager
+def use_state(state):
+    """
+    在 with 语句块中让当前线程使用给定的模块状态
+
+    Args:
+        state: 状态字典，初始为空字典，各 ScopedState 用到时加入自己的状态
+    """
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def bind(func):
+    """
+    让函数在其他线程中执行时使用当前线程的设置，用于提交到线程池的任务
+    当前线程使用的模块状态（如转换器的步骤统计和AI用量记录）也一并传递
+
+    Args:
+        func: 要在其他线程中执行的函数
+
+    Returns:
+        包装后的函数；当前线程没有使用转换器的设置时返回原函数
+    """
+    if _active.get() is None and _state.get() is None:
+        return func
+    current = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # 同一个上下文不能在多个线程中同时进入，每次执行使用一份副本
+        with _hooked():
+            return current.copy().run(func, *args, **kwargs)
+    return run
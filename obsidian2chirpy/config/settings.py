@@ -4,21 +4,77 @@
 """
 
 import os
+import sys
 
 # 路径设置
 OUTPUT_FOLDER = "/Users/pleiades/Desktop/site/2863189117.github.io/_posts/Uncategorized"
 POSTS_ROOT = "/Users/pleiades/Desktop/site/2863189117.github.io/_posts"
 SOURCE_FOLDER = "/Users/pleiades/Library/Mobile Documents/iCloud~md~obsidian/Documents/Pleiades_02"
+PROFILES_PATH = ""  # 多站点配置文件（JSON），设置后自动处理时依次处理其中的每组 笔记库→博客，为空时只处理上面的路径
+SHARD = None  # 当前进程负责的分片 (序号, 总数)，由 --shard i/N 设置，为None时处理所有笔记
+SHARD_DIR = os.path.join(os.path.dirname(POSTS_ROOT), "shards")  # 分片清单和各分片状态文件的目录
 INVENTORY_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "md_files_inventory.txt")
 HASH_FILE_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "file_hash_record.txt")
+HASH_JOURNAL_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "file_hash_journal.txt")  # 哈希更新日志，运行结束时合并到哈希记录
 DECISIONS_FILE_PATH = 'callout_decisions.json'
+SUMMARY_JOURNAL_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "summary_journal.txt")  # 摘要进度日志
+POSTS_INDEX_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "posts_metadata_index.json")  # 文章元数据索引缓存
+NOTES_INDEX_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "notes_metadata_index.json")  # 笔记元数据索引缓存，用于按发布规则选择笔记
+BLOCK_CACHE_DIR = os.path.join(os.path.dirname(POSTS_ROOT), ".o2c_block_cache")  # 区块转换结果缓存目录，每篇笔记一个文件
+LOCK_DIR = os.path.join(os.path.dirname(POSTS_ROOT), ".o2c_locks")  # 文件锁目录，多个进程同时运行时保护状态文件和文章
+ENABLE_BLOCK_CACHE = True  # 是否按区块增量转换，只重新处理修改过的段落、公式块和callout
+DISABLED_STAGES = []  # 关闭的转换步骤，可选 separate_callouts、wiki_links、callouts、math、math_braces、math_newlines、math_blank_lines、math_dollars
+STAGE_ORDER = []  # 转换步骤的执行顺序，为空时使用默认顺序，未列出的步骤排在后面
+SHOW_STAGE_TIMING = True  # 运行结束时输出各转换步骤的执行次数和耗时
+CRAWL_IGNORE = [".*/"]  # 遍历笔记库时忽略的目录和文件（通配符，以/结尾只匹配目录），默认跳过.obsidian、.trash等隐藏目录；笔记库根目录的.o2cignore可追加规则
+CRAWL_WORKERS = 4  # 遍历目录时同时读取的子目录数，iCloud等较慢的文件系统上可以调大
+PIPELINED_IO = False  # 自动处理时由后台线程提前读取源文件、写入文章，与转换同时进行；默认关闭，依次读取、转换、写入
+IO_QUEUE_SIZE = 8  # 最多提前读取和等待写入的文件数
+IO_WORKERS = 4  # 同时读取源文件的线程数
+ICLOUD_DOWNLOAD_COMMAND = ["brctl", "download"] if sys.platform == "darwin" else []  # 请求下载iCloud笔记的命令（后面加笔记路径），为空时不下载
+ICLOUD_DOWNLOAD_TIMEOUT = 120  # 等待iCloud笔记下载的最长时间（秒），超时的笔记推迟到下次运行
+ICLOUD_DOWNLOAD_CONCURRENCY = 8  # 同时运行的下载命令数上限，结束的命令回收后再请求下载其他笔记
+SNAPSHOT_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "vault_snapshot.json")  # 笔记库快照，记录每个目录和文件的修改时间
+ENABLE_VAULT_SNAPSHOT = False  # 是否使用笔记库快照查找修改过的文件：修改时间和大小未变的文件不再计算哈希值，但每个目录和文件仍要 stat；默认关闭
+SNAPSHOT_TRUST_DIRECTORY_MTIME = False  # 目录修改时间未变时是否不再 stat 其中的文件（每个目录仍要 stat）；直接覆盖写入的修改会被漏掉，只适用于以"写临时文件再重命名"方式保存笔记的编辑器
+ENABLE_GIT_CHANGE_DETECTION = False  # 源文件夹在git仓库中时，由git判断哪些笔记自上次同步以来修改过；默认关闭，开启后每次运行都会调用git
+GIT_SYNC_STATE_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "git_sync_state.json")  # 上次同步时的提交和未提交的修改
+
+# 发布规则：开启后文件夹模式只转换符合规则的笔记，自动模式还会发布符合规则但还没有文章的新笔记
+PUBLISH_FILTER = False
+PUBLISH_REQUIRE_FLAG = True  # 是否要求笔记的YAML中有 publish: true
+PUBLISH_TAGS = []  # 笔记至少包含其中一个标签时才发布，为空时不限制
+PUBLISH_EXCLUDE_TAGS = ["private", "draft"]  # 包含其中任一标签的笔记不发布
+PUBLISH_INCLUDE = []  # 只发布路径（相对于源文件夹）匹配这些通配符的笔记，如 ["物理/*"]，为空时不限制
+PUBLISH_EXCLUDE = []  # 路径匹配这些通配符的笔记不发布，如 ["日记/*", "*/草稿*"]
 
 # AI API设置
 AI_API_KEY = os.environ.get("DASHSCOPE_API_KEY", "")  # 从环境变量获取API密钥
 AI_API_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"  # 阿里云API URL
 AI_MODEL = "qwen-max-latest"  
+# OpenAI兼容的摘要接口列表，为空时使用上面的 AI_API_URL 和 AI_MODEL
+# 每项可设置 url、model、api_key（本地服务可为空）、max_concurrency、name，例如：
+# AI_ENDPOINTS = [
+#     {"name": "dashscope", "url": AI_API_URL, "model": AI_MODEL, "api_key": AI_API_KEY, "max_concurrency": 4},
+#     {"name": "llama.cpp", "url": "http://localhost:8080/v1/chat/completions", "model": "qwen2.5-7b", "api_key": "", "max_concurrency": 2},
+# ]
+AI_ENDPOINTS = []
+AI_REQUEST_TIMEOUT = 60  # 单次请求的超时时间（秒）
+AI_ENDPOINT_COOLDOWN = 30  # 接口出错后暂停使用的时间（秒）
+AI_INPUT_PRICE_PER_1K = 0.0024  # 每千输入令牌的价格（元），用于估算费用
+AI_OUTPUT_PRICE_PER_1K = 0.0096  # 每千输出令牌的价格（元）
+MAX_TOKENS_BUDGET = None  # 单次运行的令牌上限，None表示不限制
+MAX_COST = None  # 单次运行的费用上限（元），None表示不限制
 ENABLE_AUTO_SUMMARY = True  # 是否启用自动摘要功能
+SUMMARY_ENGINE = "api"  # 摘要引擎：api（AI接口，未设置密钥时不生成摘要）、local（本地抽取）、auto（优先AI接口，失败时使用本地摘要）
 SUMMARY_MAX_LENGTH = 100  # 摘要最大长度
+SUMMARY_INPUT_TOKEN_BUDGET = 1500  # 每篇文章发送给AI的摘要输入令牌预算
+SUMMARY_BATCH_TOKEN_BUDGET = 6000  # 批量摘要模式下每次请求的输入令牌预算
+ASYNC_SUMMARY = False  # 两阶段发布：先写入文章，摘要由后台任务生成后补写；默认关闭，摘要生成后才写入文章
+SUMMARY_WORKERS = 4  # 后台摘要任务的并发数
+SUMMARY_PENDING_MARKER = "summary_pending: true"  # 摘要待生成时写入YAML的标记行
+SUMMARY_SIMILARITY_THRESHOLD = 0.9  # 正文与上次生成摘要时的SimHash相似度低于此值才重新生成摘要
+SUMMARY_CACHE_PATH = os.path.join(os.path.dirname(POSTS_ROOT), "summary_cache.jsonl")  # 按正文缓存的AI摘要，多站点配置共用，为空时不缓存
 
 # Callout类型映射
 CALLOUT_TYPE_MAPPING = {
@@ -30,6 +86,11 @@ CALLOUT_TYPE_MAPPING = {
     'question': 'tip',  # question映射到tip
     'caution': 'warning',  # caution映射到warning
 }
+CALLOUT_DEFAULT_DECISION = ""  # 未支持的callout类型的默认处理方式（I、Q或N），为空时询问用户；通过 Converter（包括守护进程）转换时为空按I处理
 
 # 默认标题
-DEFAULT_TITLE = "Untitled"
\ No newline at end of file
+DEFAULT_TITLE = "Untitled"
+
+# 守护进程设置
+DAEMON_SOCKET_PATH = os.path.join(os.path.dirname(POSTS_ROOT), ".o2c_daemon.sock")  # 守护进程监听的Unix套接字
+DAEMON_PORT = 8765  # 不支持Unix套接字的系统上监听的本机端口
@@ -0,0 +1,217 @@
+"""
+区块缓存模块
+把笔记按空行切分为区块（标题、段落、公式块、callout），每个区块的转换结果按内容哈希缓存，
+再次转换时只处理修改过的区块，再拼接成完整文档
+
+只在不影响前后文转换结果的位置切分：
+- 切分点前是空行，切分点后的第一个字符不是空白、>、$ 或反斜杠
+- 区块内 $$ 和单独的 $ 的数量都是偶数，没有空的公式块，也没有现成的 \\\\[ 等LaTeX分隔符
+- 区块内的callout和Wiki链接都在区块内结束，最后一行不以 > 结尾
+不满足条件的区块与下一个区块合并后再转换，因此拼接结果与整篇转换逐字节相同
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+from ..processors import callout_processor, markdown_processor
+from ..utils import lock_utils
+from ..config import settings
+from . import cache_key
+
+# 切分点：空行之后，且下一个字符不会与上一个区块的内容组成callout、引用或公式
+BOUNDARY_PATTERN = re.compile(r'\n\n(?=[^\s>$\\])')
+
+# callout（或引用中的方括号）的起始位置
+CALLOUT_START_PATTERN = re.compile(r'>\s*\[')
+
+# 源文件中现成的 \\[ \\] \\( \\) 分隔符，会与其他区块中的公式配对
+LATEX_DELIMITER_PATTERN = re.compile(r'\\\\[\[\]()]')
+
+
+class UnsealedBlock(Exception):
+    """
+    区块的转换结果可能依赖后面的内容，需要与下一个区块合并
+    """
+
+
+def split_blocks(text):
+    """
+    在空行处把文本切分为区块，每个区块包含其后的空行
+
+    Args:
+        text: 经过YAML处理的完整文本
+
+    Returns:
+        区块列表，拼接后等于原文本
+    """
+    bounds = [0] + [match.end() for match in BOUNDARY_PATTERN.finditer(text)] + [len(text)]
+    return [text[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def _stage_sealed(stage, text):
+    """
+    检查区块在某个转换步骤之前的文本，判断该步骤的结果是否只取决于区块本身
+    """
+    if stage == "separate_callouts":
+        # 以 > 结尾的行可能与下一个区块组成相邻的callout
+        if re.search(r'>\s*\Z', text):
+            return False
+        # callout类型的方括号必须在区块内闭合
+        starts = list(CALLOUT_START_PATTERN.finditer(text))
+        return not starts or ']' in text[starts[-1].end():]
+    if stage == "callouts":
+        # 未闭合的Wiki链接可能与后面的区块匹配
+        if '[[' in text:
+            return False
+        # 每个callout起始位置都必须属于区块内完整匹配的callout
+        spans = [match.span() for match in re.finditer(callout_processor.CALLOUT_PATTERN, text, re.DOTALL)]
+        for start in CALLOUT_START_PATTERN.finditer(text):
+            if not any(begin <= start.start() < end for begin, end in spans):
+                return False
+        return True
+    if stage == "math":
+        # 公式分隔符按出现次数的奇偶配对，区块内必须成对出现；
+        # 空的公式块 $$$$ 在修正花括号时会与后面的公式配对，也不能独立转换
+        if LATEX_DELIMITER_PATTERN.search(text) or '$$$$' in text:
+            return False
+        double_count = len(re.findall(r'\$\$', text))
+        single_count = text.count('$') - 2 * double_count
+        return double_count % 2 == 0 and single_count % 2 == 0
+    return True
+
+
+def convert_block(block, file_path=None, strict=True):
+    """
+    转换单个区块
+
+    Args:
+        block: 区块文本
+        file_path: 文件路径，用于记录callout决策
+        strict: 为True时，区块的转换结果依赖后面的内容则抛出 UnsealedBlock
+
+    Returns:
+        元组 (转换结果, 是否可以独立转换)
+    """
+    state = {"sealed": True}
+
+    def inspect(stage, text):
+        if state["sealed"] and not _stage_sealed(stage, text):
+            if strict:
+                raise UnsealedBlock()
+            state["sealed"] = False
+
+    return markdown_processor.convert_body(block, file_path, inspect), state["sealed"]
+
+
+class BlockCache:
+    """
+    区块转换结果缓存，每篇笔记的区块保存在 BLOCK_CACHE_DIR 中单独的文件里，
+    只在转换该笔记时读取，保存时只写入转换过的笔记，读写量与本次转换的笔记数成正比，不随笔记库增长
+    每次转换后只保留该笔记当前用到的区块；可以在多个线程中同时转换不同的笔记
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or settings.BLOCK_CACHE_DIR
+        self.entries = {}
+        self.changed_files = set()
+        self.lock = threading.Lock()
+
+    def _entry_path(self, file_key):
+        digest = hashlib.md5(file_key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _load(self, file_key):
+        """
+        返回笔记的区块缓存 {区块键: [转换结果, 是否可以独立转换]}，第一次用到时从文件读取
+        """
+        with self.lock:
+            if file_key in self.entries:
+                return self.entries[file_key]
+        entries = {}
+        path = self._entry_path(file_key)
+        try:
+            if os.path.exists(path):
+                with lock_utils.file_lock(path, shared=True):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        entries = json.load(f)
+        except Exception as e:
+            print(f"读取区块缓存失败: {e}")
+        with self.lock:
+            return self.entries.setdefault(file_key, entries)
+
+    def convert(self, text, file_path=None):
+        """
+        按区块转换经过YAML处理的文本，未修改的区块直接使用缓存
+
+        Args:
+            text: 经过YAML处理的完整文本
+            file_path: 文件路径
+
+        Returns:
+            转换后的文本，与 markdown_processor.convert_body 的结果相同
+        """
+        file_key = file_path or ""
+        digest = cache_key.pipeline_digest(cache_key.detect_features(text), file_path)
+        old_entries = self._load(file_key)
+        new_entries = {}
+        output = []
+        reused_count = 0
+
+        blocks = split_blocks(text)
+        pending = ""
+        for index, block in enumerate(blocks):
+            block = pending + block
+            is_last = index == len(blocks) - 1
+            block_key = f"{digest}:{hashlib.md5(block.encode('utf-8')).hexdigest()}"
+
+            # 可以独立转换的区块，或位于末尾的区块，可以直接使用缓存
+            entry = old_entries.get(block_key) or new_entries.get(block_key)
+            if entry and (entry[1] or is_last):
+                new_entries[block_key] = entry
+                output.append(entry[0])
+                reused_count += 1
+                pending = ""
+                continue
+
+            try:
+                converted, sealed = convert_block(block, file_path, strict=not is_last)
+            except UnsealedBlock:
+                pending = block
+                continue
+            new_entries[block_key] = [converted, sealed]
+            output.append(converted)
+            pending = ""
+
+        if new_entries != old_entries:
+            with self.lock:
+                self.entries[file_key] = new_entries
+                self.changed_files.add(file_key)
+        if len(output) > 1:
+            print(f"  - 复用 {reused_count}/{len(output)} 个区块的转换结果")
+        return "".join(output)
+
+    def save(self):
+        """
+        保存转换过的笔记的区块缓存，没有变化时不写入
+        """
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        if not self.changed_files:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for file_key in sorted(self.changed_files):
+                path = self._entry_path(file_key)
+                with lock_utils.file_lock(path):
+                    temp_path = path + ".tmp"
+                    with open(temp_path, 'w', encoding='utf-8') as f:
+                        json.dump(self.entries[file_key], f, ensure_ascii=False)
+                    os.replace(temp_path, path)
+            self.changed_files = set()
+        except Exception as e:
+            print(f"保存区块缓存失败: {e}")
@@ -0,0 +1,149 @@
+"""
+转换缓存键模块
+哈希记录除源文件哈希外，还保存转换时笔记用到的功能，以及由对应处理器版本和相关设置计算的摘要。
+修改设置或升级处理器后，只有用到受影响功能的笔记会被重新转换
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from ..processors import callout_processor, markdown_processor, math_processor, yaml_processor
+from ..utils import lock_utils
+from ..config import context, settings
+
+# 与 callout_processor.convert_callouts 相同的callout类型匹配规则
+CALLOUT_TYPE_PATTERN = re.compile(r'>\s*\[\s*!?\s*([^\]]+)\]')
+
+# 数学公式的各种分隔符
+MATH_PATTERN = re.compile(r'\$|\\\[|\\\(')
+
+
+def detect_features(text):
+    """
+    检测笔记用到的转换功能
+
+    Args:
+        text: 源笔记的完整文本
+
+    Returns:
+        排序后的功能标记列表，如 ['callout:tip', 'math']
+    """
+    features = set()
+    for match in CALLOUT_TYPE_PATTERN.finditer(text):
+        callout_type = match.group(1).lower().strip().split('|')[0].strip()
+        features.add(f"callout:{callout_type}")
+    if MATH_PATTERN.search(text):
+        features.add("math")
+    return sorted(features)
+
+
+# 按文件路径缓存的callout决策 {路径: (修改时间, 决策字典)}，每个转换器使用自己的一份
+_decisions_cache = context.ScopedState(dict)
+
+
+def _callout_decisions():
+    """
+    读取callout决策文件，文件未修改时使用缓存
+    """
+    decisions_path = settings.DECISIONS_FILE_PATH
+    try:
+        mtime = os.stat(decisions_path).st_mtime_ns
+    except OSError:
+        return {}
+    cache = _decisions_cache.get()
+    cached = cache.get(decisions_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with lock_utils.file_lock(decisions_path, shared=True):
+            with open(decisions_path, 'r', encoding='utf-8') as f:
+                decisions = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    cache[decisions_path] = (mtime, decisions)
+    return decisions
+
+
+def _feature_component(feature, file_path=None):
+    """
+    返回影响某个功能转换结果的处理器版本和设置
+    未支持的callout类型按决策文件中该笔记的决策或 CALLOUT_DEFAULT_DECISION 转换，决策也计入
+    """
+    if feature.startswith("callout:"):
+        callout_type = feature.split(':', 1)[1]
+        mapped_type = settings.CALLOUT_TYPE_MAPPING.get(callout_type)
+        if mapped_type is not None:
+            return [callout_processor.VERSION, mapped_type]
+        decision = _callout_decisions().get(f"{file_path}:{callout_type}") if file_path else None
+        decision = decision or settings.CALLOUT_DEFAULT_DECISION
+        return [callout_processor.VERSION, None, decision] if decision else [callout_processor.VERSION, None]
+    if feature == "math":
+        return [math_processor.VERSION]
+    return None
+
+
+def pipeline_digest(features, file_path=None):
+    """
+    根据笔记用到的功能计算转换流程摘要
+    所有笔记都经过的YAML处理和Markdown整体流程总是计入摘要
+
+    Args:
+        features: 功能标记列表
+        file_path: 源文件路径，用于查找该笔记的callout决策
+
+    Returns:
+        摘要字符串
+    """
+    components = {
+        "markdown": [markdown_processor.VERSION, settings.DEFAULT_TITLE],
+        "yaml": [yaml_processor.VERSION],
+    }
+    for feature in features:
+        components[feature] = _feature_component(feature, file_path)
+    # 关闭或调整了转换步骤时计入摘要，默认步骤不计入，不影响已有的记录
+    stages = markdown_processor.active_stages()
+    if stages != [stage.name for stage in markdown_processor.STAGES]:
+        components["stages"] = stages
+    digest = hashlib.md5(json.dumps(components, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def make_record(source_hash, features, file_path=None):
+    """
+    生成哈希记录的值：源文件哈希、转换流程摘要和功能标记
+
+    Args:
+        source_hash: 源文件的MD5哈希值
+        features: 功能标记列表
+        file_path: 源文件路径
+
+    Returns:
+        记录字符串，格式为 "源文件哈希 流程摘要 功能1|功能2"
+    """
+    return f"{source_hash} {pipeline_digest(features, file_path)} {'|'.join(features)}".rstrip()
+
+
+def record_status(record, source_hash, file_path=None):
+    """
+    判断哈希记录是否仍然有效
+
+    Args:
+        record: 哈希记录中保存的值
+        source_hash: 源文件当前的哈希值
+        file_path: 源文件路径
+
+    Returns:
+        'current' 表示无需转换，'legacy' 表示旧格式记录（只有源文件哈希且未修改），
+        'source' 表示源文件已修改，'pipeline' 表示设置或处理器版本已变化
+    """
+    parts = record.split(' ', 2)
+    if parts[0] != source_hash:
+        return 'source'
+    if len(parts) == 1:
+        return 'legacy'
+    features = parts[2].split('|') if len(parts) == 3 else []
+    if parts[1] != pipeline_digest(features, file_path):
+        return 'pipeline'
+    return 'current'
@@ -0,0 +1,176 @@
+"""
+转换器模块
+供其他工具导入使用的转换接口。每个转换器持有自己的设置、文章清单、区块缓存、后台摘要任务以及统计和AI接口池等状态，
+多次调用之间复用这些状态；同一进程中可以同时使用多个设置不同的转换器，多个线程也可以共用一个转换器
+
+用法：
+from obsidian2chirpy.core.converter import Converter
+
+with Converter(SOURCE_FOLDER="...", POSTS_ROOT="...", ENABLE_AUTO_SUMMARY=False) as converter:
+    text = converter.convert_text(markdown)
+    post_path = converter.convert_file("路径/到/笔记.md")
+    converter.sync()
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+from ..config import context, settings
+from ..processors import markdown_processor
+from ..utils import ai_utils, file_utils, text_utils
+from .block_cache import BlockCache
+from .file_processor import process_file, process_folder
+from .summary_worker import SummaryWorker
+
+
+class Converter:
+    """
+    持有一份设置和相应状态的转换器，方法可以在多个线程中同时调用
+    """
+
+    def __init__(self, **overrides):
+        """
+        Args:
+            overrides: 覆盖 settings 中的设置项，未指定的设置使用创建时 settings 中的值
+        """
+        self.settings = context.snapshot(**overrides)
+        # 作为库使用时无法询问用户，未支持的callout类型默认按I处理
+        if 'CALLOUT_DEFAULT_DECISION' not in overrides and not self.settings['CALLOUT_DEFAULT_DECISION']:
+            self.settings['CALLOUT_DEFAULT_DECISION'] = "I"
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        # 正在转换的笔记的锁 {路径: [锁, 持有和等待的调用数]}，没有调用使用时删除
+        self.file_locks = {}
+        self.summary_worker = None
+        # 步骤统计、AI用量、接口池和各种缓存只属于本转换器，不与其他转换器共用
+        self.state = {}
+        with self.configured():
+            self.stage_stats = markdown_processor.current_stage_stats()
+            self.usage_tracker = ai_utils.current_usage_tracker()
+            self._load_state()
+
+    @contextmanager
+    def configured(self):
+        """
+        在 with 语句块中让当前线程使用转换器的设置和状态，可用于调用其他模块的函数
+        """
+        with context.use(self.settings), context.use_state(self.state):
+            yield self.settings
+
+    def _load_state(self):
+        os.makedirs(settings.OUTPUT_FOLDER, exist_ok=True)
+        inventory = file_utils.scan_posts_directory(settings.POSTS_ROOT, os.path.basename(settings.INVENTORY_PATH))
+        block_cache = BlockCache() if settings.ENABLE_BLOCK_CACHE else None
+        with self.lock:
+            self.inventory = inventory
+            self.block_cache = block_cache
+            if self.summary_worker is None and settings.ENABLE_AUTO_SUMMARY and settings.ASYNC_SUMMARY:
+                self.summary_worker = SummaryWorker()
+
+    @contextmanager
+    def _file_lock(self, path):
+        # 同一篇笔记的转换依次执行
+        with self.lock:
+            entry = self.file_locks.setdefault(path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.file_locks[path]
+
+    def convert_text(self, text, file_path=None):
+        """
+        转换Markdown文本，不读写文件
+
+        Args:
+            text: Obsidian格式的Markdown文本
+            file_path: 笔记路径，用于生成标题；提供时使用区块缓存
+
+        Returns:
+            转换后的文本
+        """
+        with self.configured():
+            return markdown_processor.process_and_format_md(
+                text, file_path,
+                generate_summary=settings.ENABLE_AUTO_SUMMARY,
+                block_cache=self.block_cache if file_path else None,
+            )
+
+    def convert_file(self, path):
+        """
+        转换一篇笔记并写入_posts目录，已有文章时更新文章
+
+        Args:
+            path: 笔记路径
+
+        Returns:
+            文章路径
+
+        Raises:
+            RuntimeError: 转换失败
+        """
+        path = os.path.abspath(path)
+        with self._file_lock(path), self.configured():
+            with self.lock:
+                inventory = dict(self.inventory)
+            post_path = process_file(path, settings.OUTPUT_FOLDER, self.summary_worker, self.block_cache, inventory)
+            if not post_path:
+                raise RuntimeError(f"转换失败: {path}")
+            # 新建的文章加入清单，下次转换同一篇笔记时直接更新
+            title = text_utils.extract_original_title(os.path.basename(post_path))
+            if title:
+                with self.lock:
+                    self.inventory.setdefault(title, post_path)
+            return post_path
+
+    def sync(self):
+        """
+        自动处理源文件夹：转换修改过的笔记，统计信息输出到控制台
+        同一个转换器的多次同步依次执行
+        """
+        with self.sync_lock, self.configured():
+            process_folder("", self.summary_worker, self.block_cache)
+            inventory = file_utils.scan_posts_directory(settings.POSTS_ROOT, os.path.basename(settings.INVENTORY_PATH))
+            with self.lock:
+                self.inventory = inventory
+
+    def rebuild(self):
+        """
+        重新扫描_posts目录并重新加载区块缓存，用于在转换器之外修改了文章之后
+
+        Returns:
+            文章数
+        """
+        with self.configured():
+            self.save()
+            self._load_state()
+            return len(self.inventory)
+
+    def save(self):
+        """
+        保存区块缓存
+        """
+        if self.block_cache:
+            with self.configured():
+                self.block_cache.save()
+
+    def close(self):
+        """
+        保存缓存并等待后台摘要任务完成
+        """
+        self.save()
+        if self.summary_worker:
+            with self.configured():
+                self.summary_worker.wait()
+            self.summary_worker = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,247 @@
+"""
+转换守护进程
+常驻内存，保留文章清单、区块缓存和后台摘要任务，通过Unix套接字（或本机端口）提供JSON-RPC接口：
+- convert(path)：转换源文件夹中的一篇笔记，文章写入后立即返回文章路径，摘要在后台补写；
+  源文件夹之外的文件、被忽略规则排除的笔记，以及开启发布筛选时不符合发布规则的笔记会被拒绝
+- status()：运行状态
+- rebuild()：重新扫描_posts目录和缓存，用于在守护进程之外修改了文章之后
+每行一个JSON-RPC请求，每行一个响应。转换在一个线程中依次执行，
+同一篇笔记在排队期间收到的多个请求合并为一次转换
+"""
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from ..config import settings
+from ..client import use_unix_socket
+from ..utils import crawler
+from . import publish_filter
+from .converter import Converter
+
+# JSON-RPC 错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class _Job:
+    """
+    排队中的任务，合并的请求共用同一个任务的结果
+    """
+
+    def __init__(self, key, func, args):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ConversionDaemon:
+    """
+    守护进程的状态和方法
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.jobs = queue.Queue()
+        self.queued = {}
+        self.lock = threading.Lock()
+        self.converted_count = 0
+        self.failed_count = 0
+        self.coalesced_count = 0
+        self.last_error = ""
+        self.converter = Converter()
+        threading.Thread(target=self._work, name="converter", daemon=True).start()
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            # 开始执行后，新的请求不再合并到这个任务，保证转换的是最新的笔记内容
+            with self.lock:
+                if self.queued.get(job.key) is job:
+                    del self.queued[job.key]
+            try:
+                job.result = job.func(*job.args)
+            except Exception as e:
+                job.error = e
+            job.done.set()
+
+    def _submit(self, key, func, *args):
+        with self.lock:
+            job = self.queued.get(key)
+            if job:
+                self.coalesced_count += 1
+            else:
+                job = _Job(key, func, args)
+                self.queued[key] = job
+                self.jobs.put(job)
+        job.done.wait()
+        if job.error:
+            raise job.error
+        return job.result
+
+    def convert(self, path):
+        """
+        转换一篇笔记
+
+        Args:
+            path: 笔记路径
+
+        Returns:
+            字典 {post: 文章路径, elapsed_ms: 耗时}
+
+        Raises:
+            ValueError: 不是源文件夹中的Markdown文件，或不符合忽略规则、发布规则
+        """
+        path = os.path.abspath(path)
+        if not os.path.isfile(path) or not path.lower().endswith(crawler.MARKDOWN_EXTENSIONS):
+            raise ValueError(f"不是Markdown文件: {path}")
+        self._check_source(path)
+        return self._submit(("convert", path), self._convert, path)
+
+    def _check_source(self, path):
+        # 任何本机进程都可以连接守护进程，只转换自动处理时也会发布的笔记
+        with self.converter.configured():
+            source_folder = os.path.realpath(settings.SOURCE_FOLDER)
+            real_path = os.path.realpath(path)
+            if os.path.commonpath([source_folder, real_path]) != source_folder:
+                raise ValueError(f"笔记不在源文件夹中: {path}")
+            if crawler.is_path_ignored(real_path, source_folder):
+                raise ValueError(f"笔记被忽略规则排除: {path}")
+            if settings.PUBLISH_FILTER and not publish_filter.select_publishable([real_path], source_folder):
+                raise ValueError(f"笔记不符合发布规则: {path}")
+
+    def _convert(self, path):
+        start = time.perf_counter()
+        try:
+            post_path = self.converter.convert_file(path)
+        except Exception as e:
+            self.failed_count += 1
+            self.last_error = str(e)
+            raise
+        self.converter.save()
+        self.converted_count += 1
+        return {"post": post_path, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    def status(self):
+        """
+        返回守护进程的运行状态
+        """
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started_at),
+            "posts": len(self.converter.inventory),
+            "queued": self.jobs.qsize(),
+            "converted": self.converted_count,
+            "failed": self.failed_count,
+            "coalesced": self.coalesced_count,
+            "last_error": self.last_error,
+        }
+
+    def rebuild(self):
+        """
+        重新扫描_posts目录并重新加载缓存
+        """
+        return self._submit(("rebuild",), self._rebuild)
+
+    def _rebuild(self):
+        return {"posts": self.converter.rebuild()}
+
+    def dispatch(self, line):
+        """
+        处理一行JSON-RPC请求
+
+        Returns:
+            响应字典
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": "无法解析请求"}}
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": INVALID_REQUEST, "message": "无效的请求"}}
+
+        request_id = request.get('id')
+        method = {"convert": self.convert, "status": self.status, "rebuild": self.rebuild}.get(request['method'])
+        if method is None:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": METHOD_NOT_FOUND, "message": f"未知的方法: {request['method']}"}}
+
+        params = request.get('params') or []
+        try:
+            result = method(**params) if isinstance(params, dict) else method(*params)
+        except TypeError as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": INVALID_PARAMS, "message": str(e)}}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": SERVER_ERROR, "message": str(e)}}
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def close(self):
+        """
+        保存缓存并等待后台摘要任务完成
+        """
+        self.converter.close()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.conversion_daemon.dispatch(line)
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+def _remove_stale_socket(path):
+    """
+    删除上次异常退出留下的套接字文件；已有守护进程在运行时返回False
+    """
+    if not os.path.exists(path):
+        return True
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return False
+    except OSError:
+        os.remove(path)
+        return True
+    finally:
+        probe.close()
+
+
+def serve():
+    """
+    启动守护进程，按Ctrl-C退出
+    """
+    if use_unix_socket():
+        address = settings.DAEMON_SOCKET_PATH
+        if not _remove_stale_socket(address):
+            print(f"守护进程已在运行: {address}")
+            return
+        server = socketserver.ThreadingUnixStreamServer(address, _RequestHandler)
+    else:
+        address = ('127.0.0.1', settings.DAEMON_PORT)
+        server = socketserver.ThreadingTCPServer(address, _RequestHandler)
+    server.daemon_threads = True
+
+    print("正在加载文章清单和缓存...")
+    server.conversion_daemon = ConversionDaemon()
+    print(f"守护进程已启动，监听 {address}，按Ctrl-C退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在退出守护进程...")
+    finally:
+        server.server_close()
+        server.conversion_daemon.close()
+        if use_unix_socket() and os.path.exists(address):
+            os.remove(address)
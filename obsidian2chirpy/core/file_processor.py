@@ -3,26 +3,124 @@
 处理单个文件或多个文件
 """
 
+import itertools
 import os
 import re
-from ..processors import markdown_processor
-from ..utils import file_utils, text_utils
+from ..processors import markdown_processor, yaml_processor
+from ..utils import ai_utils, crawler, file_utils, icloud, io_pipeline, lock_utils, text_utils
 from ..config import settings
+from . import cache_key, publish_filter, sharding
+from .block_cache import BlockCache
+from .summary_worker import SummaryWorker, needs_new_summary, summarize_post
+from ..utils.git_utils import GitChangeSource
+from ..utils.vault_snapshot import VaultSnapshot
 
 
-def process_file(file_path, output_folder=settings.OUTPUT_FOLDER):
+def update_post_summary(post_path, post_meta, input_text, summary_worker=None):
+    """
+    为已存在的文章更新摘要
+    只有文章没有摘要，或正文相对上次生成摘要时有实质修改时才生成新摘要
+    
+    Args:
+        post_path: 文章路径
+        post_meta: 更新前文章的元数据字典
+        input_text: 源笔记的完整文本
+        summary_worker: 后台摘要任务队列，为None时同步生成
+    """
+    body = yaml_processor.extract_summary_source(input_text)
+    if not needs_new_summary(post_meta, body):
+        if post_meta['summary_simhash']:
+            print("  - 正文没有实质修改，保留现有摘要")
+        return
+    
+    if summary_worker:
+        summary_worker.submit(post_path, body)
+    elif summarize_post(post_path, body):
+        print("  - 已更新摘要")
+
+
+def merge_post_content(existing_content, input_text, new_content):
+    """
+    合并文章：保留现有的YAML元数据，用源笔记YAML中的updated字段更新last_modified_at，替换正文
+    
+    Args:
+        existing_content: 现有文章的完整文本
+        input_text: 源笔记的完整文本
+        new_content: 转换后的正文
+    
+    Returns:
+        元组 (合并后的文章文本, updated字段的值，没有时为None)
+    """
+    # 提取现有文件的YAML前置元数据和内容
+    yaml_part, _ = text_utils.extract_yaml_and_content(existing_content)
+    
+    # 从输入文本中提取YAML元数据，检查是否有updated字段
+    input_yaml_match = re.search(r'^---\s*\n(.*?)\n---\s*\n', input_text, re.DOTALL)
+    updated_value = None
+    
+    if input_yaml_match:
+        input_yaml_content = input_yaml_match.group(1)
+        # 从输入文件的YAML中提取updated字段
+        updated_match = re.search(r'updated:\s*(.*?)(?:\n|$)', input_yaml_content)
+        if updated_match:
+            updated_value = updated_match.group(1).strip()
+    
+    # 如果从输入文件中找到了updated值，则更新last_modified_at字段
+    if updated_value:
+        # 检查是否已有last_modified_at字段
+        if "last_modified_at:" in yaml_part:
+            # 替换last_modified_at字段值
+            yaml_part = re.sub(
+                r'last_modified_at:.*?\n', 
+                f'last_modified_at: {updated_value}\n', 
+                yaml_part
+            )
+        else:
+            # 如果没有last_modified_at字段，则在date字段后添加
+            yaml_part = re.sub(
+                r'(date:.*?\n)', 
+                f'\\1last_modified_at: {updated_value}\n', 
+                yaml_part
+            )
+    
+    # 合并：保留更新后的YAML元数据，更新内容部分
+    return f"{yaml_part}\n{new_content}", updated_value
+
+
+def file_processed_elsewhere(source_path, current_hash):
+    """
+    检查其他同时运行的进程是否已经按当前的源文件和设置处理过该文件
+    
+    Args:
+        source_path: 源文件路径
+        current_hash: 源文件当前的哈希值
+    
+    Returns:
+        是否已处理
+    """
+    record = file_utils.load_hash_journal(settings.HASH_JOURNAL_PATH).get(source_path)
+    if record is None:
+        record = file_utils.load_file_hashes(settings.HASH_FILE_PATH).get(source_path, "")
+    return cache_key.record_status(record, current_hash, source_path) == 'current'
+
+
+def process_file(file_path, output_folder=None, summary_worker=None, block_cache=None, existing_files=None):
     """
     处理单个Markdown文件
     
     Args:
         file_path: 要处理的文件路径
-        output_folder: 输出目录路径
+        output_folder: 输出目录路径，默认使用 settings.OUTPUT_FOLDER
+        summary_worker: 后台摘要任务队列，提供时先写入文章，摘要稍后补写
+        block_cache: 区块缓存，提供时只转换修改过的区块
+        existing_files: 已存在文章的清单 {原始标题: 路径}，为None时扫描_posts目录
     
     Returns:
-        是否成功处理
+        成功时返回文章路径，失败时返回False
     """
     # 移除路径两端可能存在的引号
     file_path = file_path.strip('\'"')
+    output_folder = output_folder or settings.OUTPUT_FOLDER
     
     print(f"正在处理：{file_path}")
     
@@ -34,8 +132,12 @@ def process_file(file_path, output_folder=settings.OUTPUT_FOLDER):
         # 获取原始文件名（无路径）
         original_filename = os.path.basename(file_path)
         
+        # 是否采用两阶段发布（先写入文章，摘要稍后补写）
+        defer_summary = summary_worker is not None and settings.ENABLE_AUTO_SUMMARY
+        
         # 扫描_posts目录，获取已存在文件的清单
-        existing_files = file_utils.scan_posts_directory(settings.POSTS_ROOT)
+        if existing_files is None:
+            existing_files = file_utils.scan_posts_directory(settings.POSTS_ROOT)
         
         # 检查文件是否已存在（通过原始标题匹配）
         file_exists = False
@@ -52,64 +154,38 @@ def process_file(file_path, output_folder=settings.OUTPUT_FOLDER):
         if file_exists and existing_path:
             print(f"文件已存在于: {existing_path}")
             
-            # 读取现有文件
-            with open(existing_path, 'r', encoding='utf-8') as f:
-                existing_content = f.read()
-            
-            # 提取现有文件的YAML前置元数据和内容
-            yaml_part, _ = text_utils.extract_yaml_and_content(existing_content)
-            
-            # 检查是否包含 final_version: true
-            if re.search(r'final_version\s*:\s*true', yaml_part, re.IGNORECASE):
+            # 只读取YAML头部，检查是否包含 final_version: true
+            existing_meta = text_utils.parse_frontmatter_fields(text_utils.read_frontmatter(existing_path))
+            if existing_meta['final_version']:
                 print(f"⚠️ 文件标记为最终版本，跳过更新: {existing_path}")
-                return True  # 返回True表示处理成功，但实际上是跳过了更新
+                return existing_path  # 表示处理成功，但实际上是跳过了更新
             
-            # 从输入文本中提取YAML元数据，检查是否有updated字段
-            input_yaml_match = re.search(r'^---\s*\n(.*?)\n---\s*\n', input_text, re.DOTALL)
-            updated_value = None
-            
-            if input_yaml_match:
-                input_yaml_content = input_yaml_match.group(1)
-                # 从输入文件的YAML中提取updated字段
-                updated_match = re.search(r'updated:\s*(.*?)(?:\n|$)', input_yaml_content)
-                if updated_match:
-                    updated_value = updated_match.group(1).strip()
-            
-            # 如果从输入文件中找到了updated值，则更新last_modified_at字段
-            if updated_value:
-                # 检查是否已有last_modified_at字段
-                if "last_modified_at:" in yaml_part:
-                    # 替换last_modified_at字段值
-                    yaml_part = re.sub(
-                        r'last_modified_at:.*?\n', 
-                        f'last_modified_at: {updated_value}\n', 
-                        yaml_part
-                    )
-                else:
-                    # 如果没有last_modified_at字段，则在date字段后添加
-                    yaml_part = re.sub(
-                        r'(date:.*?\n)', 
-                        f'\\1last_modified_at: {updated_value}\n', 
-                        yaml_part
-                    )
+            # 读取和写回文章期间持有文章锁，多个进程不会同时改写同一篇文章
+            with lock_utils.file_lock(existing_path):
+                # 读取现有文件
+                with open(existing_path, 'r', encoding='utf-8') as f:
+                    existing_content = f.read()
             
-            # 处理输入文本内容
-            processed_text = markdown_processor.process_and_format_md(input_text, file_path, generate_summary=settings.ENABLE_AUTO_SUMMARY)
-            _, new_content = text_utils.extract_yaml_and_content(processed_text)
+                # 处理输入文本内容
+                # 保留现有的YAML元数据，摘要在写入后单独更新
+                processed_text = markdown_processor.process_and_format_md(input_text, file_path, block_cache=block_cache)
+                _, new_content = text_utils.extract_yaml_and_content(processed_text)
+                output_text, updated_value = merge_post_content(existing_content, input_text, new_content)
             
-            # 合并：保留更新后的YAML元数据，更新内容部分
-            output_text = f"{yaml_part}\n{new_content}"
+                # 更新现有文件
+                with open(existing_path, 'w', encoding='utf-8') as f:
+                    f.write(output_text)
             
-            # 更新现有文件
-            with open(existing_path, 'w', encoding='utf-8') as f:
-                f.write(output_text)
+            # 没有摘要或正文有实质修改时，更新摘要
+            if settings.ENABLE_AUTO_SUMMARY:
+                update_post_summary(existing_path, existing_meta, input_text, summary_worker)
             
             print(f"✓ 已更新现有文件：{existing_path}")
             if updated_value:
                 print(f"  - 已更新last_modified_at字段为: {updated_value}")
         else:
             # 文件不存在，按原逻辑处理
-            processed_text = markdown_processor.process_and_format_md(input_text, file_path, generate_summary=settings.ENABLE_AUTO_SUMMARY)
+            processed_text = markdown_processor.process_and_format_md(input_text, file_path, generate_summary=settings.ENABLE_AUTO_SUMMARY, defer_summary=defer_summary, block_cache=block_cache)
             
             # 从处理后的内容中提取日期，用于文件名
             date_str = text_utils.extract_date_from_content(processed_text)
@@ -126,22 +202,32 @@ def process_file(file_path, output_folder=settings.OUTPUT_FOLDER):
             output_file_path = os.path.join(output_folder, output_filename)
             
             # 写入处理后的内容到新文件
-            with open(output_file_path, 'w', encoding='utf-8') as f:
+            with lock_utils.file_lock(output_file_path), open(output_file_path, 'w', encoding='utf-8') as f:
                 f.write(processed_text)
             
+            # 提交后台摘要任务，生成后补写到description字段
+            if defer_summary:
+                summary_worker.submit(output_file_path, yaml_processor.extract_summary_source(input_text))
+            
             print(f"✓ 新建文件：{output_file_path}")
+            existing_path = output_file_path
         
-        return True
+        return existing_path
         
     except Exception as e:
         print(f"× 处理失败：{file_path} - {str(e)}")
         return False
 
 
-def process_folder(file_name_or_path):
+def process_folder(file_name_or_path, summary_worker=None, block_cache=None):
     """
     根据文件名或文件夹名处理匹配的文件，或处理指定的路径
     当输入为空时，自动处理特定目录
+    
+    Args:
+        file_name_or_path: 文件名、文件夹名或路径，为空时自动处理源文件夹
+        summary_worker: 调用方持有的后台摘要任务队列，提供时不等待摘要完成
+        block_cache: 调用方持有的区块缓存，为None时从缓存文件加载
     """
     processed_count = 0
     failed_count = 0
@@ -149,6 +235,7 @@ def process_folder(file_name_or_path):
     updated_count = 0
     unchanged_count = 0
     summary_count = 0  # 添加摘要计数器
+    deferred_paths = []  # 尚未从iCloud下载、推迟到下次运行的笔记
     
     # 确保输出文件夹存在
     if not os.path.exists(settings.OUTPUT_FOLDER):
@@ -161,273 +248,320 @@ def process_folder(file_name_or_path):
     
     # 加载文件哈希记录
     file_hashes = file_utils.load_file_hashes(settings.HASH_FILE_PATH)
-    updated_hashes = {}  # 用于记录本次处理后的哈希值
     
-    # 检查输入是否为空
-    if not file_name_or_path.strip():
-        print("输入为空，自动处理源文件夹中的文件...")
+    # 合并上次中途退出的运行留下的哈希更新日志
+    journal_hashes = file_utils.load_hash_journal(settings.HASH_JOURNAL_PATH)
+    if journal_hashes:
+        print(f"从哈希更新日志恢复了 {len(journal_hashes)} 条记录")
+        file_hashes.update(journal_hashes)
+    
+    # 分片运行时，上次转换过但尚未合并到全局记录的笔记以分片清单为准
+    if settings.SHARD:
+        os.makedirs(settings.SHARD_DIR, exist_ok=True)
+        file_hashes.update(sharding.load_manifest_records())
+    
+    def record_hash(source_path, record):
+        # 每处理完一个文件就写入更新日志，中途退出时不会丢失已完成的进度
+        file_hashes[source_path] = record
+        file_utils.append_hash_journal(settings.HASH_JOURNAL_PATH, source_path, record)
+    
+    # 两阶段发布：摘要在后台生成，转换不必等待API返回
+    own_summary_worker = summary_worker is None and settings.ENABLE_AUTO_SUMMARY and settings.ASYNC_SUMMARY
+    if own_summary_worker:
+        summary_worker = SummaryWorker()
+    
+    # 区块缓存：长笔记只转换修改过的区块
+    if block_cache is None and settings.ENABLE_BLOCK_CACHE:
+        block_cache = BlockCache()
+    
+    # 中途返回或出错时也要保存区块缓存、等待后台摘要任务完成，否则已提交的摘要会丢失
+    try:
+        def process_directory(folder_path):
+            # 遍历文件夹中的所有文件，跳过被忽略的目录，非Markdown文件计入跳过数
+            nonlocal processed_count, failed_count, skipped_count
+            note_paths = []
+            for entry in crawler.crawl(folder_path, extensions=None):
+                # iCloud占位文件按对应的笔记处理
+                target = icloud.placeholder_target(entry.path)
+                if target and target.lower().endswith(('.md', '.markdown')):
+                    note_paths.append(target)
+                elif entry.name.lower().endswith(('.md', '.markdown')):
+                    note_paths.append(entry.path)
+                else:
+                    skipped_count += 1
         
-        # 从源文件夹查找对应的源文件
-        source_files = file_utils.find_source_files_from_inventory(settings.INVENTORY_PATH, settings.SOURCE_FOLDER)
+            # 只转换符合发布规则的笔记，文件夹在源文件夹中时规则中的路径相对于源文件夹
+            if settings.PUBLISH_FILTER:
+                source_root = os.path.abspath(settings.SOURCE_FOLDER)
+                in_source = os.path.commonpath([source_root, os.path.abspath(folder_path)]) == source_root
+                publishable = publish_filter.select_publishable(note_paths, source_root if in_source else folder_path)
+                print(f"符合发布规则的笔记：{len(publishable)}/{len(note_paths)}")
+                note_paths = publishable
         
-        if not source_files:
-            print("没有找到匹配的源文件，请检查源文件夹和索引文件")
-            return
+            # 先请求下载所有未下载的笔记，处理本地的笔记，再处理下载完成的笔记
+            evicted = {path for path in note_paths if icloud.is_evicted(path)}
+            waiter = icloud.DownloadWaiter(sorted(evicted))
+            batches = itertools.chain([[path for path in note_paths if path not in evicted]], waiter.batches())
+            for batch in batches:
+                for file_path in batch:
+                    result = process_file(file_path, settings.OUTPUT_FOLDER, summary_worker, block_cache)
+                    if result:
+                        processed_count += 1
+                    else:
+                        failed_count += 1
+            deferred_paths.extend(waiter.pending)
+    
+        # 检查输入是否为空
+        if not file_name_or_path.strip():
+            print("输入为空，自动处理源文件夹中的文件...")
         
-        print(f"找到 {len(source_files)} 个匹配的源文件")
+            # 笔记库快照：只读取修改过的目录，找出新增或修改过的文件
+            snapshot = None
+            changed_paths = None  # 为None时计算所有文件的哈希值
+            source_paths = None
+            if settings.ENABLE_VAULT_SNAPSHOT:
+                snapshot = VaultSnapshot(settings.SOURCE_FOLDER)
+                source_paths, changed_paths = snapshot.refresh()
         
-        # 处理每个源文件
-        for source_path, post_path in source_files.items():
-            # 计算源文件的哈希值
-            try:
-                current_hash = file_utils.calculate_file_hash(source_path)
-                
-                # 检查文件是否已经处理过且未修改
-                if source_path in file_hashes and file_hashes[source_path] == current_hash:
-                    print(f"跳过未修改的文件：{source_path}")
-                    unchanged_count += 1
-                    # 保存当前哈希值
-                    updated_hashes[source_path] = current_hash
-                    continue
-                
-                print(f"处理源文件：{source_path} -> {post_path}")
-                
-                # 处理文件并更新对应的文章
-                with open(source_path, 'r', encoding='utf-8') as f:
-                    input_text = f.read()
-                
-                # 读取目标文章
-                with open(post_path, 'r', encoding='utf-8') as f:
-                    existing_content = f.read()
-                
-                # 提取YAML前置元数据和内容
-                yaml_part, _ = text_utils.extract_yaml_and_content(existing_content)
-                
-                # 检查是否包含 final_version: true
-                if re.search(r'final_version\s*:\s*true', yaml_part, re.IGNORECASE):
-                    print(f"⚠️ 文件标记为最终版本，跳过更新: {post_path}")
-                    unchanged_count += 1
-                    # 仍然保存当前哈希值，避免重复提示
-                    updated_hashes[source_path] = current_hash
-                    continue
-                
-                # 从输入文本中提取YAML元数据，检查是否有updated字段
-                input_yaml_match = re.search(r'^---\s*\n(.*?)\n---\s*\n', input_text, re.DOTALL)
-                updated_value = None
-                
-                if input_yaml_match:
-                    input_yaml_content = input_yaml_match.group(1)
-                    # 从输入文件的YAML中提取updated字段
-                    updated_match = re.search(r'updated:\s*(.*?)(?:\n|$)', input_yaml_content)
-                    if updated_match:
-                        updated_value = updated_match.group(1).strip()
-                
-                # 如果从输入文件中找到了updated值，则更新last_modified_at字段
-                if updated_value:
-                    # 检查是否已有last_modified_at字段
-                    if "last_modified_at:" in yaml_part:
-                        # 替换last_modified_at字段值
-                        yaml_part = re.sub(
-                            r'last_modified_at:.*?\n', 
-                            f'last_modified_at: {updated_value}\n', 
-                            yaml_part
-                        )
-                    else:
-                        # 如果没有last_modified_at字段，则在date字段后添加
-                        yaml_part = re.sub(
-                            r'(date:.*?\n)', 
-                            f'\\1last_modified_at: {updated_value}\n', 
-                            yaml_part
-                        )
-                
-                # 处理输入文本内容
-                processed_text = markdown_processor.process_and_format_md(input_text, source_path, generate_summary=settings.ENABLE_AUTO_SUMMARY)
-                _, new_content = text_utils.extract_yaml_and_content(processed_text)
-                
-                # 合并：保留更新后的YAML元数据，更新内容部分
-                output_text = f"{yaml_part}\n{new_content}"
-                
-                # 更新文章文件
-                with open(post_path, 'w', encoding='utf-8') as f:
-                    f.write(output_text)
+            # 笔记库在git仓库中时，由git判断哪些文件修改过
+            git_source = None
+            if settings.ENABLE_GIT_CHANGE_DETECTION:
+                git_source = GitChangeSource(settings.SOURCE_FOLDER)
+                git_detected = git_source.detect()
+        
+            # 从源文件夹查找对应的源文件
+            source_files = file_utils.find_source_files_from_inventory(settings.INVENTORY_PATH, settings.SOURCE_FOLDER, source_paths)
+        
+            if not source_files and not settings.PUBLISH_FILTER:
+                print("没有找到匹配的源文件，请检查源文件夹和索引文件")
+                if snapshot:
+                    snapshot.save()
+                if git_source:
+                    git_source.save()
+                return
+        
+            # 分片运行时只处理属于本分片的笔记
+            if settings.SHARD:
+                source_files = {path: post for path, post in source_files.items() if sharding.in_shard(path)}
+                print(f"分片 {settings.SHARD[0]}/{settings.SHARD[1]}：负责其中 {len(source_files)} 个源文件")
+            shard_posts = dict(source_files)
+        
+            if git_source and git_detected:
+                changed_paths = git_source.changed_among(source_files)
+        
+            print(f"找到 {len(source_files)} 个匹配的源文件")
+        
+            # 上次运行中没有补写摘要、仍带有待生成标记的文章，源文件未修改时也要重新生成摘要
+            pending_posts = set()
+            if settings.ENABLE_AUTO_SUMMARY:
+                posts_index = file_utils.load_posts_metadata_index(settings.POSTS_ROOT)
+                pending_posts = {path for path, meta in posts_index.items() if meta['summary_pending']}
+        
+            # 源文件和文章头部由后台线程提前读取，文章由后台线程写入，转换与读写同时进行
+            depth = settings.IO_QUEUE_SIZE if settings.PIPELINED_IO else 0
+        
+            def load_source(item):
+                source_path, post_path = item
+                # 计算源文件的哈希值
+                if changed_paths is not None and source_path not in changed_paths and source_path in file_hashes:
+                    # 快照或git显示文件未修改，沿用记录中的哈希值，不必读取文件
+                    current_hash = file_hashes[source_path].split(' ', 1)[0]
+                else:
+                    current_hash = file_utils.calculate_file_hash(source_path)
+            
+                # 检查文件是否已经处理过且未修改，同时检查转换时用到的处理器版本和设置是否变化
+                record_status = cache_key.record_status(file_hashes[source_path], current_hash, source_path) if source_path in file_hashes else 'source'
+                input_text = None
+                post_meta = None
+                if record_status != 'current':
+                    with open(source_path, 'r', encoding='utf-8') as f:
+                        input_text = f.read()
+                    if record_status != 'legacy':
+                        # 只读取目标文章的YAML头部，检查是否包含 final_version: true
+                        post_meta = text_utils.parse_frontmatter_fields(text_utils.read_frontmatter(post_path))
+                return current_hash, record_status, input_text, post_meta
+        
+            def write_post(source_path, post_path, post_meta, input_text, current_hash, current_record, new_content):
+                # 读取和写回文章期间持有文章锁，多个进程不会同时改写同一篇文章
+                with lock_utils.file_lock(post_path) as waited:
+                    # 等待期间其他进程可能已经处理完这个文件
+                    if waited and file_processed_elsewhere(source_path, current_hash):
+                        print(f"跳过其他进程已处理的文件：{source_path}")
+                        return 'elsewhere'
                 
-                # 更新哈希值记录
-                updated_hashes[source_path] = current_hash
+                    # 读取目标文章，保留YAML元数据，更新内容部分
+                    with open(post_path, 'r', encoding='utf-8') as f:
+                        existing_content = f.read()
+                    output_text, updated_value = merge_post_content(existing_content, input_text, new_content)
                 
+                    # 更新文章文件
+                    with open(post_path, 'w', encoding='utf-8') as f:
+                        f.write(output_text)
+            
+                # 没有摘要或正文有实质修改时，更新摘要
+                if settings.ENABLE_AUTO_SUMMARY:
+                    update_post_summary(post_path, post_meta, input_text, summary_worker)
+            
+                # 写入完成后才更新哈希值记录
+                record_hash(source_path, current_record)
+            
                 print(f"✓ 已更新文章：{post_path}")
                 if updated_value:
                     print(f"  - 已更新last_modified_at字段为: {updated_value}")
-                
-                updated_count += 1
-                processed_count += 1
-                
-            except Exception as e:
-                print(f"× 处理失败：{source_path} - {str(e)}")
+                return 'updated'
+        
+            def resubmit_summary(post_path, source_path=None):
+                # 没有对应的源文件时按文章正文生成摘要
+                if source_path:
+                    with open(source_path, 'r', encoding='utf-8') as f:
+                        body = yaml_processor.extract_summary_source(f.read())
+                else:
+                    with open(post_path, 'r', encoding='utf-8') as f:
+                        body = text_utils.extract_yaml_and_content(f.read())[1]
+                print(f"  - 文章的摘要尚未生成，重新生成摘要：{post_path}")
+                if summary_worker:
+                    summary_worker.submit(post_path, body)
+                elif summarize_post(post_path, body):
+                    print("  - 已补写摘要")
+        
+            def record_failure(source_path, error):
+                nonlocal failed_count
+                print(f"× 处理失败：{source_path} - {str(error)}")
                 failed_count += 1
+                # 从快照中移除，下次运行时重新处理
+                if snapshot:
+                    snapshot.forget(source_path)
+                if git_source:
+                    git_source.forget(source_path)
         
-        # 保存更新后的哈希值记录
-        file_utils.save_file_hashes(settings.HASH_FILE_PATH, updated_hashes)
-    
-    else:
-        # 先移除输入路径两端可能存在的引号
-        path = file_name_or_path.strip('\'"')
+            def process_batch(items):
+                nonlocal unchanged_count
+                for (source_path, post_path), loaded, error in io_pipeline.prefetch(items, load_source, depth, settings.IO_WORKERS):
+                    try:
+                        if error:
+                            raise error
+                        current_hash, record_status, input_text, post_meta = loaded
+                        if record_status in ('current', 'legacy'):
+                            print(f"跳过未修改的文件：{source_path}")
+                            unchanged_count += 1
+                            if record_status == 'legacy':
+                                # 旧格式记录只有源文件哈希，补充记录笔记用到的功能
+                                record_hash(source_path, cache_key.make_record(current_hash, cache_key.detect_features(input_text), source_path))
+                            if post_path in pending_posts:
+                                resubmit_summary(post_path, source_path)
+                            continue
+                    
+                        print(f"处理源文件：{source_path} -> {post_path}")
+                        if record_status == 'pipeline':
+                            print("  - 相关设置或处理器版本已变化，重新转换")
+                        features = cache_key.detect_features(input_text)
+                    
+                        if post_meta['final_version']:
+                            print(f"⚠️ 文件标记为最终版本，跳过更新: {post_path}")
+                            unchanged_count += 1
+                            # 仍然保存当前哈希值，避免重复提示
+                            record_hash(source_path, cache_key.make_record(current_hash, features, source_path))
+                            continue
+                    
+                        # 处理输入文本内容，保留现有的YAML元数据，摘要在写入后单独更新
+                        processed_text = markdown_processor.process_and_format_md(input_text, source_path, block_cache=block_cache)
+                        # 转换后才生成记录，转换时询问用户得到的callout决策也计入记录
+                        current_record = cache_key.make_record(current_hash, features, source_path)
+                        _, new_content = text_utils.extract_yaml_and_content(processed_text)
+                        writer.submit(source_path, write_post, source_path, post_path, post_meta, input_text, current_hash, current_record, new_content)
+                    
+                    except Exception as e:
+                        record_failure(source_path, e)
+        
+            # iCloud中尚未下载、又需要读取的笔记：运行开始时一次性请求下载，先处理本地的笔记
+            evicted = {path for path in source_files
+                       if (changed_paths is None or path in changed_paths or path not in file_hashes) and icloud.is_evicted(path)}
+            waiter = icloud.DownloadWaiter(sorted(evicted))
+        
+            # 处理每个源文件
+            writer = io_pipeline.BackgroundWriter(depth)
+            try:
+                process_batch([(path, post) for path, post in source_files.items() if path not in evicted])
+                # 处理下载完成的笔记
+                for ready in waiter.batches():
+                    process_batch([(path, source_files[path]) for path in ready])
+            finally:
+                # 回收下载命令，等待所有文章写入完成
+                waiter.close()
+                write_results = writer.close()
+        
+            for source_path, status, error in write_results:
+                if error:
+                    record_failure(source_path, error)
+                elif status == 'updated':
+                    updated_count += 1
+                    processed_count += 1
+                else:
+                    unchanged_count += 1
         
-        # 检查输入是否是完整路径
-        if os.path.exists(path):
-            # 是完整路径，按原来的逻辑处理
+            # 文件名中没有日期、无法与源文件对应的文章不会在上面处理，直接补写摘要
+            # 分片运行时各分片都看不到这些文章的源文件，留给不分片的运行处理
+            if not settings.SHARD:
+                for post_path in sorted(pending_posts - set(source_files.values())):
+                    try:
+                        resubmit_summary(post_path)
+                    except Exception as e:
+                        print(f"⚠️ 补写摘要失败：{post_path} - {str(e)}")
             
-            # 处理单个文件
-            if os.path.isfile(path):
-                if path.lower().endswith(('.md', '.markdown')):
-                    result = process_file(path, settings.OUTPUT_FOLDER)
-                    if result:
+            # 超时仍未下载的笔记从快照中移除，下次运行时重新检查
+            for path in waiter.pending:
+                deferred_paths.append(path)
+                if snapshot:
+                    snapshot.forget(path)
+                if git_source:
+                    git_source.forget(path)
+        
+            # 发布符合规则但还没有对应文章的新笔记
+            if settings.PUBLISH_FILTER:
+                if source_paths is None:
+                    source_paths = [entry.path for entry in crawler.crawl(settings.SOURCE_FOLDER)]
+                # 已有哈希记录的笔记发布过，即使文章名中没有日期、无法与索引匹配，也不重复发布
+                new_notes = publish_filter.select_publishable([path for path in source_paths if path not in source_files and path not in file_hashes and sharding.in_shard(path)])
+                if new_notes:
+                    print(f"找到 {len(new_notes)} 篇符合发布规则的新笔记")
+                for note_path in new_notes:
+                    post_path = process_file(note_path, settings.OUTPUT_FOLDER, summary_worker, block_cache)
+                    if post_path:
                         processed_count += 1
+                        shard_posts[note_path] = post_path
+                        # 记录哈希值，下次运行时未修改的新文章不会再次转换
+                        with open(note_path, 'r', encoding='utf-8') as f:
+                            record_hash(note_path, cache_key.make_record(file_utils.calculate_file_hash(note_path), cache_key.detect_features(f.read()), note_path))
                     else:
                         failed_count += 1
-                else:
-                    print(f"跳过非Markdown文件：{path}")
-                    skipped_count += 1
-            
-            # 处理文件夹
-            elif os.path.isdir(path):
-                # 遍历文件夹中的所有文件
-                for root, _, files in os.walk(path):
-                    for file in files:
-                        # 只处理Markdown文件
-                        file_path = os.path.join(root, file)
-                        if file.lower().endswith(('.md', '.markdown')):
-                            result = process_file(file_path, settings.OUTPUT_FOLDER)
-                            if result:
-                                processed_count += 1
-                            else:
-                                failed_count += 1
-                        else:
-                            skipped_count += 1
+                # process_file 在写入文章前扫描索引，最后一篇新文章要重新扫描才会加入索引
+                if new_notes:
+                    file_utils.scan_posts_directory(settings.POSTS_ROOT, os.path.basename(settings.INVENTORY_PATH))
+
+            # 把更新日志合并到哈希记录，未在本次运行中出现的文件的记录也会保留
+            # 分片运行时合并到分片清单，由 --merge 统一合并到全局记录
+            if settings.SHARD:
+                sharding.write_manifest(shard_posts)
+            else:
+                file_utils.compact_file_hashes(settings.HASH_FILE_PATH, settings.HASH_JOURNAL_PATH)
+            # 所有文件处理完后才保存快照，中途退出时下次运行仍会检查本次发现的修改
+            if snapshot:
+                snapshot.save()
+            if git_source:
+                git_source.save()
+    
         else:
-            # 首先尝试作为文件夹名搜索
-            matching_folders = file_utils.search_folders_by_name(path, settings.SOURCE_FOLDER)
-            
-            # 再尝试作为文件名搜索
-            matching_files = file_utils.search_files_by_name(path, settings.SOURCE_FOLDER)
-            
-            # 如果既找到了文件夹又找到了文件，询问用户想要处理哪种类型
-            if matching_folders and matching_files:
-                print(f"找到匹配'{path}'的文件和文件夹:")
-                print("文件夹:")
-                for i, folder_path in enumerate(matching_folders, 1):
-                    print(f"F{i}. {folder_path}")
-                print("\n文件:")
-                for i, file_path in enumerate(matching_files, 1):
-                    print(f"M{i}. {file_path}")
-                
-                # 获取用户选择
-                while True:
-                    try:
-                        choice = input("请选择要处理的项目类型和编号（如F1处理第1个文件夹, M2处理第2个文件，输入q退出）: ").strip()
-                        if choice.lower() == 'q':
-                            return
-                        if not (choice.startswith('F') or choice.startswith('f') or choice.startswith('M') or choice.startswith('m')):
-                            print("无效的选择，请以F或M开头")
-                            continue
-                        
-                        item_type = choice[0].upper()
-                        try:
-                            choice_index = int(choice[1:]) - 1
-                            if item_type == 'F' and 0 <= choice_index < len(matching_folders):
-                                # 处理选择的文件夹
-                                folder_path = matching_folders[choice_index]
-                                print(f"处理文件夹: {folder_path}")
-                                for root, _, files in os.walk(folder_path):
-                                    for file in files:
-                                        file_path = os.path.join(root, file)
-                                        if file.lower().endswith(('.md', '.markdown')):
-                                            result = process_file(file_path, settings.OUTPUT_FOLDER)
-                                            if result:
-                                                processed_count += 1
-                                            else:
-                                                failed_count += 1
-                                        else:
-                                            skipped_count += 1
-                                break
-                            elif item_type == 'M' and 0 <= choice_index < len(matching_files):
-                                # 处理选择的文件
-                                file_path = matching_files[choice_index]
-                                print(f"处理文件: {file_path}")
-                                result = process_file(file_path, settings.OUTPUT_FOLDER)
-                                if result:
-                                    processed_count += 1
-                                else:
-                                    failed_count += 1
-                                break
-                            else:
-                                print("无效的选择，请重新输入")
-                        except ValueError:
-                            print("请在类型字母后输入有效的数字")
-                    except ValueError:
-                        print("请输入有效的选择")
-            
-            # 只找到文件夹
-            elif matching_folders:
-                if len(matching_folders) == 1:
-                    # 只有一个匹配的文件夹，直接处理
-                    folder_path = matching_folders[0]
-                    print(f"找到匹配的文件夹: {folder_path}")
-                    # 处理文件夹中的所有Markdown文件
-                    for root, _, files in os.walk(folder_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            if file.lower().endswith(('.md', '.markdown')):
-                                result = process_file(file_path, settings.OUTPUT_FOLDER)
-                                if result:
-                                    processed_count += 1
-                                else:
-                                    failed_count += 1
-                            else:
-                                skipped_count += 1
-                else:
-                    # 多个匹配的文件夹，询问用户选择
-                    print(f"找到多个匹配'{path}'的文件夹:")
-                    for i, folder_path in enumerate(matching_folders, 1):
-                        print(f"{i}. {folder_path}")
-                    
-                    # 获取用户选择
-                    while True:
-                        try:
-                            choice = input("请选择要处理的文件夹编号（输入q退出）: ").strip()
-                            if choice.lower() == 'q':
-                                return
-                            choice_index = int(choice) - 1
-                            if 0 <= choice_index < len(matching_folders):
-                                folder_path = matching_folders[choice_index]
-                                break
-                            else:
-                                print("无效的选择，请重新输入")
-                        except ValueError:
-                            print("请输入有效的数字")
-                    
-                    # 处理选择的文件夹
-                    print(f"处理文件夹: {folder_path}")
-                    for root, _, files in os.walk(folder_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            if file.lower().endswith(('.md', '.markdown')):
-                                result = process_file(file_path, settings.OUTPUT_FOLDER)
-                                if result:
-                                    processed_count += 1
-                                else:
-                                    failed_count += 1
-                            else:
-                                skipped_count += 1
+            # 先移除输入路径两端可能存在的引号
+            path = file_name_or_path.strip('\'"')
+        
+            # 检查输入是否是完整路径
+            if os.path.exists(path):
+                # 是完整路径，按原来的逻辑处理
             
-            # 只找到文件
-            elif matching_files:
-                # 已有的文件处理逻辑
-                if len(matching_files) == 1:
-                    # 只有一个匹配项，直接处理
-                    path = matching_files[0]
-                    print(f"找到匹配文件: {path}")
+                # 处理单个文件
+                if os.path.isfile(path):
                     if path.lower().endswith(('.md', '.markdown')):
-                        result = process_file(path, settings.OUTPUT_FOLDER)
+                        result = process_file(path, settings.OUTPUT_FOLDER, summary_worker, block_cache)
                         if result:
                             processed_count += 1
                         else:
@@ -435,43 +569,163 @@ def process_folder(file_name_or_path):
                     else:
                         print(f"跳过非Markdown文件：{path}")
                         skipped_count += 1
-                else:
-                    # 多个匹配项，询问用户选择
-                    print(f"找到多个匹配'{path}'的文件:")
+            
+                # 处理文件夹
+                elif os.path.isdir(path):
+                    process_directory(path)
+            else:
+                # 首先尝试作为文件夹名搜索
+                matching_folders = file_utils.search_folders_by_name(path, settings.SOURCE_FOLDER)
+            
+                # 再尝试作为文件名搜索
+                matching_files = file_utils.search_files_by_name(path, settings.SOURCE_FOLDER)
+            
+                # 如果既找到了文件夹又找到了文件，询问用户想要处理哪种类型
+                if matching_folders and matching_files:
+                    print(f"找到匹配'{path}'的文件和文件夹:")
+                    print("文件夹:")
+                    for i, folder_path in enumerate(matching_folders, 1):
+                        print(f"F{i}. {folder_path}")
+                    print("\n文件:")
                     for i, file_path in enumerate(matching_files, 1):
-                        print(f"{i}. {file_path}")
-                    
+                        print(f"M{i}. {file_path}")
+                
                     # 获取用户选择
                     while True:
                         try:
-                            choice = input("请选择要处理的文件编号（输入q退出）: ").strip()
+                            choice = input("请选择要处理的项目类型和编号（如F1处理第1个文件夹, M2处理第2个文件，输入q退出）: ").strip()
                             if choice.lower() == 'q':
                                 return
-                            choice_index = int(choice) - 1
-                            if 0 <= choice_index < len(matching_files):
-                                path = matching_files[choice_index]
-                                break
-                            else:
-                                print("无效的选择，请重新输入")
+                            if not (choice.startswith('F') or choice.startswith('f') or choice.startswith('M') or choice.startswith('m')):
+                                print("无效的选择，请以F或M开头")
+                                continue
+                        
+                            item_type = choice[0].upper()
+                            try:
+                                choice_index = int(choice[1:]) - 1
+                                if item_type == 'F' and 0 <= choice_index < len(matching_folders):
+                                    # 处理选择的文件夹
+                                    folder_path = matching_folders[choice_index]
+                                    print(f"处理文件夹: {folder_path}")
+                                    process_directory(folder_path)
+                                    break
+                                elif item_type == 'M' and 0 <= choice_index < len(matching_files):
+                                    # 处理选择的文件
+                                    file_path = matching_files[choice_index]
+                                    print(f"处理文件: {file_path}")
+                                    result = process_file(file_path, settings.OUTPUT_FOLDER, summary_worker, block_cache)
+                                    if result:
+                                        processed_count += 1
+                                    else:
+                                        failed_count += 1
+                                    break
+                                else:
+                                    print("无效的选择，请重新输入")
+                            except ValueError:
+                                print("请在类型字母后输入有效的数字")
                         except ValueError:
-                            print("请输入有效的数字")
+                            print("请输入有效的选择")
+            
+                # 只找到文件夹
+                elif matching_folders:
+                    if len(matching_folders) == 1:
+                        # 只有一个匹配的文件夹，直接处理
+                        folder_path = matching_folders[0]
+                        print(f"找到匹配的文件夹: {folder_path}")
+                        process_directory(folder_path)
+                    else:
+                        # 多个匹配的文件夹，询问用户选择
+                        print(f"找到多个匹配'{path}'的文件夹:")
+                        for i, folder_path in enumerate(matching_folders, 1):
+                            print(f"{i}. {folder_path}")
                     
-                    # 处理选择的文件
-                    print(f"处理文件: {path}")
-                    if path.lower().endswith(('.md', '.markdown')):
-                        result = process_file(path, settings.OUTPUT_FOLDER)
-                        if result:
-                            processed_count += 1
+                        # 获取用户选择
+                        while True:
+                            try:
+                                choice = input("请选择要处理的文件夹编号（输入q退出）: ").strip()
+                                if choice.lower() == 'q':
+                                    return
+                                choice_index = int(choice) - 1
+                                if 0 <= choice_index < len(matching_folders):
+                                    folder_path = matching_folders[choice_index]
+                                    break
+                                else:
+                                    print("无效的选择，请重新输入")
+                            except ValueError:
+                                print("请输入有效的数字")
+                    
+                        # 处理选择的文件夹
+                        print(f"处理文件夹: {folder_path}")
+                        process_directory(folder_path)
+            
+                # 只找到文件
+                elif matching_files:
+                    # 已有的文件处理逻辑
+                    if len(matching_files) == 1:
+                        # 只有一个匹配项，直接处理
+                        path = matching_files[0]
+                        print(f"找到匹配文件: {path}")
+                        if path.lower().endswith(('.md', '.markdown')):
+                            result = process_file(path, settings.OUTPUT_FOLDER, summary_worker, block_cache)
+                            if result:
+                                processed_count += 1
+                            else:
+                                failed_count += 1
                         else:
-                            failed_count += 1
+                            print(f"跳过非Markdown文件：{path}")
+                            skipped_count += 1
                     else:
-                        print(f"跳过非Markdown文件：{path}")
-                        skipped_count += 1
+                        # 多个匹配项，询问用户选择
+                        print(f"找到多个匹配'{path}'的文件:")
+                        for i, file_path in enumerate(matching_files, 1):
+                            print(f"{i}. {file_path}")
+                    
+                        # 获取用户选择
+                        while True:
+                            try:
+                                choice = input("请选择要处理的文件编号（输入q退出）: ").strip()
+                                if choice.lower() == 'q':
+                                    return
+                                choice_index = int(choice) - 1
+                                if 0 <= choice_index < len(matching_files):
+                                    path = matching_files[choice_index]
+                                    break
+                                else:
+                                    print("无效的选择，请重新输入")
+                            except ValueError:
+                                print("请输入有效的数字")
+                    
+                        # 处理选择的文件
+                        print(f"处理文件: {path}")
+                        if path.lower().endswith(('.md', '.markdown')):
+                            result = process_file(path, settings.OUTPUT_FOLDER, summary_worker, block_cache)
+                            if result:
+                                processed_count += 1
+                            else:
+                                failed_count += 1
+                        else:
+                            print(f"跳过非Markdown文件：{path}")
+                            skipped_count += 1
             
-            # 没有找到匹配项
-            else:
-                print(f"没有找到匹配'{path}'的文件或文件夹")
-                return
+                # 没有找到匹配项
+                else:
+                    print(f"没有找到匹配'{path}'的文件或文件夹")
+                    return
+    finally:
+        # 保存区块缓存
+        if block_cache:
+            block_cache.save()
+        
+        # 等待后台摘要任务完成
+        if own_summary_worker:
+            summary_worker.wait()
+    
+    # 输出AI用量统计
+    if settings.ENABLE_AUTO_SUMMARY:
+        ai_utils.current_usage_tracker().print_report()
+    
+    # 输出转换步骤的耗时统计
+    markdown_processor.print_stage_report()
     
     # 输出处理统计
     print(f"\n处理完成！统计信息：")
@@ -481,4 +735,8 @@ def process_folder(file_name_or_path):
     if unchanged_count > 0:
         print(f"- 未修改的文件数：{unchanged_count}")
     print(f"- 处理失败的文件数：{failed_count}")
-    print(f"- 跳过的非Markdown文件数：{skipped_count}")
\ No newline at end of file
+    print(f"- 跳过的非Markdown文件数：{skipped_count}")
+    if deferred_paths:
+        print(f"- 尚未从iCloud下载、推迟到下次运行的文件数：{len(deferred_paths)}")
+        for path in deferred_paths:
+            print(f"  - {path}")
\ No newline at end of file
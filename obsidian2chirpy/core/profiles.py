@@ -0,0 +1,92 @@
+"""
+多站点配置模块
+从配置文件读取多组 笔记库→博客 的对应关系，在一次运行中依次自动处理
+各配置的哈希记录、索引、区块缓存等状态文件放在各自的博客目录下，
+后台摘要任务和摘要缓存（SUMMARY_CACHE_PATH）由所有配置共用
+
+配置文件为JSON格式，shared 中的设置应用于所有配置，profiles 中每一项覆盖 settings 中的同名设置：
+{
+    "shared": {"ENABLE_BLOCK_CACHE": true},
+    "profiles": [
+        {"name": "physics", "SOURCE_FOLDER": "/path/to/vault1", "POSTS_ROOT": "/path/to/site1/_posts"},
+        {"name": "notes", "SOURCE_FOLDER": "/path/to/vault2", "POSTS_ROOT": "/path/to/site2/_posts"}
+    ]
+}
+"""
+
+import json
+
+from ..config import context, settings
+from ..utils import ai_utils
+from .file_processor import process_folder
+from .summary_worker import SummaryWorker
+
+# 每个配置必须指定的设置
+REQUIRED_SETTINGS = ("SOURCE_FOLDER", "POSTS_ROOT")
+
+
+def load_profiles(profiles_path):
+    """
+    读取配置文件，生成各配置的设置
+
+    Args:
+        profiles_path: 配置文件路径
+
+    Returns:
+        列表 [(配置名, 设置字典)]
+
+    Raises:
+        ValueError: 配置文件格式错误、缺少必需的设置或包含未知的设置
+    """
+    with open(profiles_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("profiles"), list) or not data["profiles"]:
+        raise ValueError("配置文件中没有 profiles 列表")
+
+    shared = data.get("shared", {})
+    # 摘要缓存默认所有配置共用，不随 POSTS_ROOT 移到各自的博客目录
+    shared.setdefault("SUMMARY_CACHE_PATH", settings.SUMMARY_CACHE_PATH)
+
+    profiles = []
+    for index, profile in enumerate(data["profiles"], 1):
+        overrides = dict(shared)
+        overrides.update(profile)
+        name = overrides.pop("name", f"配置{index}")
+        missing = [key for key in REQUIRED_SETTINGS if not overrides.get(key)]
+        if missing:
+            raise ValueError(f"配置 {name} 缺少设置: {', '.join(missing)}")
+        try:
+            profiles.append((name, context.snapshot(**overrides)))
+        except ValueError as e:
+            raise ValueError(f"配置 {name}: {e}") from e
+    return profiles
+
+
+def process_profiles(profiles_path):
+    """
+    依次自动处理配置文件中的所有配置
+
+    Args:
+        profiles_path: 配置文件路径
+    """
+    try:
+        profiles = load_profiles(profiles_path)
+    except (OSError, ValueError) as e:
+        print(f"× 读取配置文件失败：{profiles_path} - {e}")
+        return
+
+    # 所有配置共用一个后台摘要任务队列，前一个配置的摘要在处理后一个配置时继续生成
+    summary_worker = None
+    if settings.ENABLE_AUTO_SUMMARY and settings.ASYNC_SUMMARY:
+        summary_worker = SummaryWorker()
+
+    for index, (name, values) in enumerate(profiles, 1):
+        print(f"\n===== [{index}/{len(profiles)}] {name}：{values['SOURCE_FOLDER']} -> {values['POSTS_ROOT']} =====")
+        with context.use(values):
+            process_folder("", summary_worker)
+
+    if summary_worker:
+        summary_worker.wait()
+        if settings.ENABLE_AUTO_SUMMARY:
+            ai_utils.current_usage_tracker().print_report()
+    print(f"\n已处理 {len(profiles)} 个配置")
@@ -0,0 +1,63 @@
+"""
+发布规则模块
+根据笔记YAML中的 publish 标记、标签以及路径通配符决定哪些笔记需要发布
+笔记的元数据来自缓存的笔记元数据索引，只读取修改过的笔记的YAML头部
+"""
+
+import fnmatch
+import os
+
+from ..config import settings
+from ..utils import file_utils
+
+
+def path_allowed(note_path, root=None):
+    """
+    按 PUBLISH_INCLUDE 和 PUBLISH_EXCLUDE 判断笔记路径是否可以发布
+
+    Args:
+        note_path: 笔记路径
+        root: 计算相对路径的根目录，默认使用 settings.SOURCE_FOLDER
+
+    Returns:
+        是否可以发布
+    """
+    relative_path = os.path.relpath(note_path, root or settings.SOURCE_FOLDER).replace(os.sep, '/')
+    if settings.PUBLISH_INCLUDE and not any(fnmatch.fnmatch(relative_path, pattern) for pattern in settings.PUBLISH_INCLUDE):
+        return False
+    return not any(fnmatch.fnmatch(relative_path, pattern) for pattern in settings.PUBLISH_EXCLUDE)
+
+
+def meta_allowed(meta):
+    """
+    按 publish 标记和标签判断笔记是否可以发布
+
+    Args:
+        meta: 笔记元数据（text_utils.parse_frontmatter_fields 的结果）
+
+    Returns:
+        是否可以发布
+    """
+    if settings.PUBLISH_REQUIRE_FLAG and not meta.get('publish'):
+        return False
+    tags = {tag.lower() for tag in meta.get('tags', [])}
+    if settings.PUBLISH_TAGS and not tags & {tag.lower() for tag in settings.PUBLISH_TAGS}:
+        return False
+    return not tags & {tag.lower() for tag in settings.PUBLISH_EXCLUDE_TAGS}
+
+
+def select_publishable(note_paths, root=None):
+    """
+    从笔记中选出符合发布规则的笔记
+    先按路径规则筛选，被路径排除的笔记不会读取YAML头部
+
+    Args:
+        note_paths: 笔记路径
+        root: 计算相对路径的根目录，默认使用 settings.SOURCE_FOLDER
+
+    Returns:
+        符合规则的笔记路径列表，保持原顺序
+    """
+    candidates = [path for path in note_paths if path_allowed(path, root)]
+    index = file_utils.load_notes_metadata_index(candidates)
+    return [path for path in candidates if path in index and meta_allowed(index[path])]
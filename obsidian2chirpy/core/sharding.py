@@ -0,0 +1,232 @@
+"""
+分片转换模块
+把自动处理的笔记按笔记库相对路径的稳定哈希值分成N片，由多台机器（或同一台机器上的多个进程）同时转换
+每个分片只转换属于自己的笔记，文章照常写入_posts目录，哈希记录不写入全局记录，而是写入分片清单；
+各分片的文章同步到一起后，用 --merge 把所有分片清单合并到全局哈希记录和文章索引，合并前检查冲突
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+from ..config import settings
+from ..utils import file_utils, lock_utils, text_utils
+
+
+def parse_shard(value):
+    """
+    解析 i/N 格式的分片参数，i 从1开始
+
+    Args:
+        value: 分片参数，如 "2/4"
+
+    Returns:
+        元组 (分片序号, 分片总数)
+
+    Raises:
+        ValueError: 格式错误
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value)
+    if not match:
+        raise ValueError(f"分片参数应为 i/N 格式，如 2/4: {value}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"分片序号应在1到{count}之间: {value}")
+    return index, count
+
+
+def shard_of(relative_path, count):
+    """
+    返回笔记所属的分片序号（从1开始）
+    按相对路径的MD5计算，在不同机器和操作系统上结果相同
+
+    Args:
+        relative_path: 笔记相对于源文件夹的路径
+        count: 分片总数
+    """
+    digest = hashlib.md5(relative_path.replace(os.sep, '/').encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def relative_source(path):
+    """
+    返回笔记相对于源文件夹的路径，以/分隔
+    """
+    return os.path.relpath(path, settings.SOURCE_FOLDER).replace(os.sep, '/')
+
+
+def in_shard(path):
+    """
+    笔记是否属于当前进程负责的分片（settings.SHARD），未分片时总是返回True
+    """
+    if not settings.SHARD:
+        return True
+    index, count = settings.SHARD
+    return shard_of(relative_source(path), count) == index
+
+
+def manifest_path(index, count):
+    """
+    返回分片清单的路径
+    """
+    return os.path.join(settings.SHARD_DIR, f"manifest.shard-{index}-of-{count}.json")
+
+
+def shard_settings(index, count):
+    """
+    返回转换一个分片需要修改的设置，由调用方应用到自己的设置中
+    哈希更新日志、笔记库快照和git同步状态改用分片自己的文件：各分片只检查自己的笔记，共用这些文件会互相影响
+
+    Args:
+        index: 分片序号（从1开始）
+        count: 分片总数
+
+    Returns:
+        字典 {设置名: 值}
+    """
+    suffix = f"shard-{index}-of-{count}"
+    return {
+        "SHARD": (index, count),
+        "HASH_JOURNAL_PATH": os.path.join(settings.SHARD_DIR, f"file_hash_journal.{suffix}.txt"),
+        "SNAPSHOT_PATH": os.path.join(settings.SHARD_DIR, f"vault_snapshot.{suffix}.json"),
+        "GIT_SYNC_STATE_PATH": os.path.join(settings.SHARD_DIR, f"git_sync_state.{suffix}.json"),
+    }
+
+
+def _read_manifest(path):
+    with lock_utils.file_lock(path, shared=True):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    if not isinstance(manifest.get("shard"), list) or len(manifest["shard"]) != 2:
+        raise ValueError("缺少分片信息")
+    manifest.setdefault("records", {})
+    manifest.setdefault("posts", {})
+    return manifest
+
+
+def load_manifest_records():
+    """
+    读取当前分片清单中尚未合并的哈希记录，避免重复转换上次已转换、但还没有合并的笔记
+
+    Returns:
+        字典 {源文件路径: 记录值}
+    """
+    path = manifest_path(*settings.SHARD)
+    if not os.path.exists(path):
+        return {}
+    try:
+        records = _read_manifest(path)["records"]
+    except (OSError, ValueError) as e:
+        print(f"读取分片清单失败: {e}")
+        return {}
+    return {os.path.join(settings.SOURCE_FOLDER, *relative.split('/')): record for relative, record in records.items()}
+
+
+def write_manifest(posts):
+    """
+    把分片的哈希更新日志合并到分片清单，并删除日志
+
+    Args:
+        posts: 字典 {源文件路径: 文章路径}，本分片负责的笔记及其文章
+    """
+    index, count = settings.SHARD
+    path = manifest_path(index, count)
+    records = file_utils.load_hash_journal(settings.HASH_JOURNAL_PATH)
+    try:
+        with lock_utils.file_lock(path):
+            manifest = {"records": {}, "posts": {}}
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            manifest["shard"] = [index, count]
+            manifest["updated"] = text_utils.format_time_with_limited_seconds()
+            manifest["records"].update({relative_source(source): record for source, record in records.items()})
+            manifest["posts"].update({
+                relative_source(source): os.path.relpath(post, settings.POSTS_ROOT).replace(os.sep, '/')
+                for source, post in posts.items()
+            })
+            temp_path = path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(temp_path, path)
+        if os.path.exists(settings.HASH_JOURNAL_PATH):
+            os.remove(settings.HASH_JOURNAL_PATH)
+        print(f"分片 {index}/{count} 的清单已更新：{path}（{len(manifest['records'])} 条记录，{len(manifest['posts'])} 篇文章）")
+    except Exception as e:
+        print(f"写入分片清单失败: {e}")
+
+
+def merge_manifests(manifest_paths=None):
+    """
+    合并分片清单到全局哈希记录和文章索引，成功后删除清单
+    发现以下冲突时不做任何修改：
+    - 各清单的分片总数不一致，或清单中的笔记不属于该分片（分片时源文件夹不同）
+    - 同一篇笔记在多个清单中的记录不同
+    - 多篇笔记对应同一篇文章（不同文件夹中的同名笔记）
+    - 清单中的文章不在 POSTS_ROOT 中（各分片的文章还没有同步过来）
+
+    Args:
+        manifest_paths: 清单路径列表，默认使用 SHARD_DIR 中的所有清单
+
+    Returns:
+        是否成功合并
+    """
+    manifest_paths = manifest_paths or sorted(glob.glob(os.path.join(settings.SHARD_DIR, "manifest.shard-*-of-*.json")))
+    if not manifest_paths:
+        print(f"没有找到分片清单：{settings.SHARD_DIR}")
+        return False
+
+    problems = []
+    manifests = []
+    for path in manifest_paths:
+        try:
+            manifests.append(_read_manifest(path))
+        except (OSError, ValueError) as e:
+            problems.append(f"无法读取分片清单 {path}: {e}")
+
+    counts = {manifest["shard"][1] for manifest in manifests}
+    if len(counts) > 1:
+        problems.append(f"各清单的分片总数不一致: {sorted(counts)}")
+
+    records = {}
+    record_shards = {}
+    post_sources = {}
+    for manifest in manifests:
+        index, count = manifest["shard"]
+        label = f"{index}/{count}"
+        for relative, record in manifest["records"].items():
+            if shard_of(relative, count) != index:
+                problems.append(f"笔记 {relative} 不属于分片 {label}")
+            if relative in records and records[relative] != record:
+                problems.append(f"笔记 {relative} 在分片 {record_shards[relative]} 和 {label} 中的记录不同")
+            records[relative] = record
+            record_shards[relative] = label
+        for relative, post in manifest["posts"].items():
+            other = post_sources.get(post)
+            if other and other[0] != relative:
+                problems.append(f"笔记 {other[0]}（分片 {other[1]}）和 {relative}（分片 {label}）对应同一篇文章 {post}")
+            post_sources[post] = (relative, label)
+            if not os.path.exists(os.path.join(settings.POSTS_ROOT, *post.split('/'))):
+                problems.append(f"文章不存在：{post}（分片 {label}），请先把各分片的文章同步到 {settings.POSTS_ROOT}")
+
+    if problems:
+        print(f"× 合并失败，发现 {len(problems)} 个问题：")
+        for problem in problems:
+            print(f"  - {problem}")
+        return False
+
+    for count in counts:
+        missing = sorted(set(range(1, count + 1)) - {manifest["shard"][0] for manifest in manifests})
+        if missing:
+            print(f"⚠️ 缺少分片 {', '.join(f'{index}/{count}' for index in missing)} 的清单，这些分片中笔记的记录保持不变")
+
+    file_hashes = {os.path.join(settings.SOURCE_FOLDER, *relative.split('/')): record for relative, record in records.items()}
+    if not file_utils.merge_file_hashes(settings.HASH_FILE_PATH, file_hashes):
+        return False
+    inventory = file_utils.scan_posts_directory(settings.POSTS_ROOT, os.path.basename(settings.INVENTORY_PATH))
+    for path in manifest_paths:
+        os.remove(path)
+    print(f"✓ 已合并 {len(manifests)} 个分片清单：{len(records)} 条哈希记录，{len(post_sources)} 篇文章，索引共收录 {len(inventory)} 篇文章")
+    return True
@@ -0,0 +1,102 @@
+"""
+后台摘要任务模块
+转换时先写入文章，摘要在后台线程中生成后再补写到文章的description字段
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ..utils import ai_utils, file_utils, summary_input, text_utils
+from ..config import context, settings
+
+
+def needs_new_summary(post_meta, body):
+    """
+    判断文章是否需要重新生成摘要
+    没有摘要时需要生成；已有摘要时，只有正文与上次生成摘要时的相似度低于阈值才重新生成
+
+    Args:
+        post_meta: 文章的元数据字典（parse_frontmatter_fields 的返回值）
+        body: 当前的文章正文（不含YAML前置元数据）
+
+    Returns:
+        是否需要生成摘要
+    """
+    if not post_meta['has_description']:
+        return True
+    # 没有签名的旧摘要保持不变
+    if not post_meta['summary_simhash']:
+        return False
+    similarity = text_utils.simhash_similarity(post_meta['summary_simhash'], summary_input.summary_signature(body))
+    return similarity < settings.SUMMARY_SIMILARITY_THRESHOLD
+
+
+def summarize_post(post_path, body):
+    """
+    生成摘要并写入文章的description字段，同时记录正文签名
+
+    Args:
+        post_path: 文章路径
+        body: 文章正文（不含YAML前置元数据）
+
+    Returns:
+        是否成功写入摘要
+    """
+    summary = ai_utils.summarize(body, settings.SUMMARY_MAX_LENGTH)
+    if not summary:
+        return False
+    try:
+        return file_utils.patch_post_description(
+            post_path, summary, summary_input.summary_signature(body), replace_existing=True
+        )
+    except Exception as e:
+        print(f"⚠️ 写入摘要失败：{post_path} - {str(e)}")
+        return False
+
+
+class SummaryWorker:
+    """
+    后台摘要任务队列
+    转换流程调用 submit 提交任务后立即返回，API请求按 max_workers 的并发数在后台执行
+    """
+
+    def __init__(self, max_workers=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or settings.SUMMARY_WORKERS, thread_name_prefix="summary")
+        self.futures = []
+        self.lock = threading.Lock()
+        self.success_count = 0
+        self.failed_paths = []
+
+    def submit(self, post_path, body):
+        """
+        提交一个摘要任务
+
+        Args:
+            post_path: 已写入的文章路径
+            body: 文章正文（不含YAML前置元数据）
+        """
+        self.futures.append(self.executor.submit(context.bind(self._run), post_path, body))
+
+    def _run(self, post_path, body):
+        patched = summarize_post(post_path, body)
+        with self.lock:
+            if patched:
+                self.success_count += 1
+                print(f"✓ 已补写摘要：{os.path.basename(post_path)}")
+            else:
+                self.failed_paths.append(post_path)
+
+    def wait(self):
+        """
+        等待所有摘要任务完成并输出统计信息
+        """
+        if not self.futures:
+            self.executor.shutdown()
+            return
+        print(f"\n等待 {len(self.futures)} 个后台摘要任务完成...")
+        self.executor.shutdown(wait=True)
+        print(f"- 已补写摘要的文章数：{self.success_count}")
+        if self.failed_paths:
+            print(f"- 摘要生成失败的文章数：{len(self.failed_paths)}（保留待生成标记）")
+            for path in self.failed_paths:
+                print(f"  {path}")
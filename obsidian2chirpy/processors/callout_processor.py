@@ -7,8 +7,14 @@ import re
 from ..utils import file_utils
 from ..config import settings
 
+# 处理器版本，修改转换结果时递增，用到此处理器的笔记会在下次运行时重新转换
+VERSION = 1
 
-def convert_callouts(text, file_path=None, decisions_file_path=settings.DECISIONS_FILE_PATH):
+# 用于识别callout区块的正则表达式，注意>和[之间可能有空格，[和!之间可能有空格
+CALLOUT_PATTERN = r'(>\s*\[\s*!?\s*([^\]]+)\](.*?)(?=\n\s*>|\n\s*$)(?:\n(?:>[^\n]*\n)+))'
+
+
+def convert_callouts(text, file_path=None, decisions_file_path=None):
     """
     转换Markdown中的callout格式
     
@@ -25,7 +31,7 @@ def convert_callouts(text, file_path=None, decisions_file_path=settings.DECISION
     Args:
         text: 要处理的文本内容
         file_path: 当前处理的文件路径（用于记录特定文件的决策）
-        decisions_file_path: 决策文件路径
+        decisions_file_path: 决策文件路径，默认使用 settings.DECISIONS_FILE_PATH
     
     Returns:
         处理后的文本
@@ -36,9 +42,6 @@ def convert_callouts(text, file_path=None, decisions_file_path=settings.DECISION
     # 用于存储本次运行中的用户决策（避免重复询问）
     session_decisions = {}
     
-    # 用于识别callout区块的正则表达式，注意>和[之间可能有空格，[和!之间可能有空格
-    pattern = r'(>\s*\[\s*!?\s*([^\]]+)\](.*?)(?=\n\s*>|\n\s*$)(?:\n(?:>[^\n]*\n)+))'
-    
     def replace_callout(match):
         full_callout = match.group(1)
         callout_type = match.group(2).lower().strip() if match.group(2) else 'quote'
@@ -77,6 +80,11 @@ def convert_callouts(text, file_path=None, decisions_file_path=settings.DECISION
         # 检查是否在本次会话中已做决策
         elif callout_type in session_decisions:
             decision = session_decisions[callout_type]
+        elif settings.CALLOUT_DEFAULT_DECISION:
+            # 不询问用户（如守护进程中），按设置处理，不写入决策文件
+            decision = settings.CALLOUT_DEFAULT_DECISION
+            print(f"发现未支持的callout类型: [{callout_type}]，按设置处理为 {decision}")
+            session_decisions[callout_type] = decision
         else:
             # 询问用户如何处理此类型的callout
             print(f"\n发现未支持的callout类型: [{callout_type}]")
@@ -145,7 +153,7 @@ def convert_callouts(text, file_path=None, decisions_file_path=settings.DECISION
             return new_callout
     
     # 替换所有匹配的callout
-    return re.sub(pattern, replace_callout, text, flags=re.DOTALL)
+    return re.sub(CALLOUT_PATTERN, replace_callout, text, flags=re.DOTALL)
 
 
 def ensure_blank_lines_before_callouts(text):
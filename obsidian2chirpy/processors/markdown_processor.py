@@ -4,12 +4,128 @@ Markdown处理模块
 """
 
 import os
+import re
+import threading
+import time
 from ..processors import yaml_processor, math_processor, callout_processor
 from ..utils import text_utils
-from ..config import settings
+from ..config import context, settings
 
+# 处理器版本，修改转换结果时递增，用到此处理器的笔记会在下次运行时重新转换
+VERSION = 1
 
-def process_and_format_md(text, file_path=None, generate_summary=False):
+
+class Stage:
+    """
+    转换步骤
+    
+    Args:
+        name: 步骤名，用于 settings.DISABLED_STAGES、settings.STAGE_ORDER 和耗时统计
+        func: 转换函数 func(文本, 文件路径)
+        prefilter: 快速检查函数 prefilter(文本)，返回False时该步骤不会修改文本，直接跳过
+    """
+    
+    def __init__(self, name, func, prefilter):
+        self.name = name
+        self.func = func
+        self.prefilter = prefilter
+
+
+# 默认的转换步骤及顺序
+STAGES = [
+    # 确保相邻callout之间有空行分隔
+    Stage("separate_callouts", lambda text, file_path: callout_processor.separate_adjacent_callouts(text),
+          lambda text: '>' in text),
+    # 转换Wiki链接格式
+    Stage("wiki_links", lambda text, file_path: text_utils.convert_wiki_links(text),
+          lambda text: '[[' in text),
+    # 转换callout格式（传递文件路径用于记录特定文件的决策）
+    Stage("callouts", callout_processor.convert_callouts,
+          lambda text: re.search(r'>\s*\[', text) is not None),
+    # 处理数学公式，把 $ 和 $$ 转换为LaTeX分隔符
+    Stage("math", lambda text, file_path: math_processor.process_md(text),
+          lambda text: '$' in text),
+    # 处理数学公式中的连续花括号和绝对值符号
+    Stage("math_braces", lambda text, file_path: math_processor.fix_double_braces_and_vertical_bars(text),
+          lambda text: '\\\\' in text),
+    # 添加换行
+    Stage("math_newlines", lambda text, file_path: math_processor.add_newlines(text),
+          lambda text: '\\\\' in text),
+    # 确保数学块周围有完整的空行，同时合并多余的空行
+    Stage("math_blank_lines", lambda text, file_path: math_processor.ensure_blank_lines_around_math_blocks(text),
+          lambda text: '\\\\' in text or '\n\n\n' in text),
+    # 最后将所有LaTeX分隔符替换为$$
+    Stage("math_dollars", lambda text, file_path: math_processor.replace_with_dollars(text),
+          lambda text: '\\\\' in text),
+]
+
+# 各步骤的统计 {步骤名: [执行次数, 跳过次数, 总耗时（秒）]}，转换器使用各自的统计
+_stage_stats = context.ScopedState(dict)
+stage_stats = _stage_stats.default
+_stage_stats_lock = threading.Lock()
+
+
+def current_stage_stats():
+    """
+    返回当前线程使用的步骤统计，没有使用转换器时返回全局的 stage_stats
+    """
+    return _stage_stats.get()
+
+
+def _record_stage(name, ran, seconds=0.0):
+    # 多个线程可能同时转换，统计在锁内更新
+    with _stage_stats_lock:
+        stats = current_stage_stats().setdefault(name, [0, 0, 0.0])
+        if ran:
+            stats[0] += 1
+            stats[2] += seconds
+        else:
+            stats[1] += 1
+
+
+def ordered_stages():
+    """
+    按 settings.STAGE_ORDER 排列转换步骤，未列出的步骤保持默认顺序排在后面
+    
+    Returns:
+        Stage 列表
+    """
+    if not settings.STAGE_ORDER:
+        return STAGES
+    positions = {name: index for index, name in enumerate(settings.STAGE_ORDER)}
+    return sorted(STAGES, key=lambda stage: positions.get(stage.name, len(positions)))
+
+
+def active_stages():
+    """
+    返回实际执行的步骤名列表，用于计算转换流程摘要
+    """
+    return [stage.name for stage in ordered_stages() if stage.name not in settings.DISABLED_STAGES]
+
+
+def uses_default_order():
+    """
+    是否按默认顺序执行步骤；区块缓存的切分规则依赖默认顺序，关闭部分步骤不影响
+    """
+    return ordered_stages() == STAGES
+
+
+def print_stage_report():
+    """
+    输出各转换步骤的执行次数、跳过次数和耗时
+    """
+    with _stage_stats_lock:
+        stats = {name: list(values) for name, values in current_stage_stats().items()}
+    if not settings.SHOW_STAGE_TIMING or not stats:
+        return
+    print("\n转换步骤统计：")
+    for stage in ordered_stages():
+        runs, skips, seconds = stats.get(stage.name, [0, 0, 0.0])
+        state = "（已关闭）" if stage.name in settings.DISABLED_STAGES else ""
+        print(f"- {stage.name}{state}：执行 {runs} 次，跳过 {skips} 次，耗时 {seconds * 1000:.1f} ms")
+
+
+def process_and_format_md(text, file_path=None, generate_summary=False, defer_summary=False, block_cache=None):
     """
     处理Markdown文件中的数学公式、callout等内容并格式化
     
@@ -17,6 +133,8 @@ def process_and_format_md(text, file_path=None, generate_summary=False):
         text: 要处理的文本内容
         file_path: 文件路径，用于提取文件名作为标题
         generate_summary: 是否使用AI生成文章摘要
+        defer_summary: 是否只写入待生成标记，摘要由后台任务补写
+        block_cache: 区块缓存（core.block_cache.BlockCache），提供时只转换修改过的区块
     
     Returns:
         处理后的文本
@@ -28,33 +146,40 @@ def process_and_format_md(text, file_path=None, generate_summary=False):
         title = os.path.splitext(os.path.basename(file_path))[0]
     
     # 先处理YAML前置元数据
-    text = yaml_processor.process_yaml_frontmatter(text, title, generate_summary)
+    text = yaml_processor.process_yaml_frontmatter(text, title, generate_summary, defer_summary)
     
     # 将占位符标题替换为实际文件名
     text = text.replace(f'title: "{settings.DEFAULT_TITLE}"', f'title: "{title}"', 1)
     
-    # 确保相邻callout之间有空行分隔
-    text = callout_processor.separate_adjacent_callouts(text)
+    # 按区块增量转换，结果与整篇转换完全相同；调整过步骤顺序时整篇转换
+    if block_cache is not None and uses_default_order():
+        return block_cache.convert(text, file_path)
     
-    # 转换Wiki链接格式
-    text = text_utils.convert_wiki_links(text)
-    
-    # 转换callout格式（传递文件路径用于记录特定文件的决策）
-    text = callout_processor.convert_callouts(text, file_path)
-    
-    # 处理数学公式
-    text = math_processor.process_md(text)
-    
-    # 处理数学公式中的连续花括号和绝对值符号
-    text = math_processor.fix_double_braces_and_vertical_bars(text)
-    
-    # 添加换行
-    text = math_processor.add_newlines(text)
+    return convert_body(text, file_path)
+
+
+def convert_body(text, file_path=None, inspect=None):
+    """
+    YAML前置元数据处理之后的转换步骤：callout、Wiki链接和数学公式
+    按 active_stages() 的顺序执行各步骤，预筛选不通过的步骤直接跳过
     
-    # 确保数学块周围有完整的空行
-    text = math_processor.ensure_blank_lines_around_math_blocks(text)
+    Args:
+        text: 要处理的文本内容
+        file_path: 文件路径，用于记录callout决策
+        inspect: 可选的检查函数 inspect(步骤名, 当前文本)，在各步骤之前调用（包括被跳过和关闭的步骤）
     
-    # 最后将所有LaTeX分隔符替换为$$
-    text = math_processor.replace_with_dollars(text)
+    Returns:
+        处理后的文本
+    """
+    disabled = set(settings.DISABLED_STAGES)
+    for stage in ordered_stages():
+        if inspect:
+            inspect(stage.name, text)
+        if stage.name in disabled or not stage.prefilter(text):
+            _record_stage(stage.name, ran=False)
+            continue
+        start = time.perf_counter()
+        text = stage.func(text, file_path)
+        _record_stage(stage.name, ran=True, seconds=time.perf_counter() - start)
     
-    return text
\ No newline at end of file
+    return text
@@ -5,6 +5,9 @@
 
 import re
 
+# 处理器版本，修改转换结果时递增，用到此处理器的笔记会在下次运行时重新转换
+VERSION = 1
+
 
 def process_md(text):
     """
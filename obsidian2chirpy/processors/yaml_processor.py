@@ -6,10 +6,27 @@ YAML前置元数据处理模块
 import re
 import os
 from ..config import settings
-from ..utils import ai_utils
+from ..utils import ai_utils, summary_input
 
+# 处理器版本，修改转换结果时递增，用到此处理器的笔记会在下次运行时重新转换
+VERSION = 1
 
-def process_yaml_frontmatter(text, title=settings.DEFAULT_TITLE, generate_summary=False):
+
+def extract_summary_source(text):
+    """
+    去掉YAML前置元数据，得到用于生成摘要的正文
+    
+    Args:
+        text: 完整的Markdown文本
+    
+    Returns:
+        不含YAML前置元数据的正文
+    """
+    yaml_match = re.match(r'^---\s*\n(.*?)\n---\s*\n', text, re.DOTALL)
+    return text[yaml_match.end():] if yaml_match else text
+
+
+def process_yaml_frontmatter(text, title=None, generate_summary=False, defer_summary=False):
     """
     处理YAML前置元数据:
     1. 提取标题 (使用文件名)
@@ -23,12 +40,15 @@ def process_yaml_frontmatter(text, title=settings.DEFAULT_TITLE, generate_summar
     
     Args:
         text: 要处理的文本
-        title: 文件标题，默认为"Untitled"
+        title: 文件标题，默认为 settings.DEFAULT_TITLE
         generate_summary: 是否生成文章摘要
+        defer_summary: 是否只写入待生成标记，由后台任务稍后补写摘要
         
     Returns:
         处理后的文本
     """
+    title = title or settings.DEFAULT_TITLE
+    
     # 检查文档是否有YAML前置元数据
     yaml_match = re.match(r'^---\s*\n(.*?)\n---\s*\n', text, re.DOTALL)
     
@@ -95,28 +115,20 @@ def process_yaml_frontmatter(text, title=settings.DEFAULT_TITLE, generate_summar
     
     # 生成并添加摘要
     if generate_summary and settings.ENABLE_AUTO_SUMMARY:
-        # 获取正文内容用于生成摘要
-        content_for_summary = rest_of_doc
-        
-        # 从正文内容中删除Markdown特殊格式，以便生成更好的摘要
-        # 删除代码块
-        content_for_summary = re.sub(r'```.*?```', '', content_for_summary, flags=re.DOTALL)
-        # 删除HTML标签
-        content_for_summary = re.sub(r'<.*?>', '', content_for_summary)
-        # 删除图片链接
-        content_for_summary = re.sub(r'!\[.*?\]\(.*?\)', '', content_for_summary)
-        # 删除URL链接，保留链接文本
-        content_for_summary = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', content_for_summary)
-        
-        # 生成摘要
-        summary = ai_utils.generate_summary(content_for_summary, settings.SUMMARY_MAX_LENGTH)
-        
-        # 添加摘要到YAML
-        if summary:
-            # 处理摘要中可能包含的引号，确保YAML格式正确
-            summary = summary.replace('"', '\\"')
-            new_yaml += f'description: "{summary}"\n'
-            print(f"✓ 已自动生成摘要: {summary[:50]}...")
+        if defer_summary:
+            # 两阶段发布：先写入待生成标记，摘要由后台任务补写
+            new_yaml += f"{settings.SUMMARY_PENDING_MARKER}\n"
+        else:
+            # 生成摘要
+            summary = ai_utils.summarize(rest_of_doc, settings.SUMMARY_MAX_LENGTH)
+            
+            # 添加摘要到YAML，同时记录正文签名，正文只有细微修改时不再重新生成
+            if summary:
+                # 处理摘要中可能包含的引号，确保YAML格式正确
+                summary = summary.replace('"', '\\"')
+                new_yaml += f'description: "{summary}"\n'
+                new_yaml += f'summary_simhash: {summary_input.summary_signature(rest_of_doc)}\n'
+                print(f"✓ 已自动生成摘要: {summary[:50]}...")
     
     new_yaml += "categories: \nmath: true\ntags: \n---\n\n"
     
@@ -3,63 +3,596 @@ AI工具模块
 提供AI相关功能，如生成摘要等
 """
 
-import requests
+import hashlib
 import json
 import os
-from ..config import settings
+import re
+import threading
+import time
+from ..config import context, settings
+from ..utils import local_summary, lock_utils, summary_input
 
-def generate_summary(content, max_length=150):
+SUMMARY_SYSTEM_PROMPT = "你是一个专业的文章摘要生成器。你的任务是将给定的文章内容转换为简短的摘要，摘要应该清晰简洁地概括文章的主要内容。"
+
+SUMMARY_NOTICE = "\n <---此摘要由AI生成，可能完全不准确。--->"
+
+
+def _percentile(sorted_values, percent):
     """
-    使用AI生成文章摘要
+    按最近秩法计算百分位数
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(-(-percent * len(sorted_values) // 100)))
+    return sorted_values[rank - 1]
+
+
+class UsageTracker:
+    """
+    记录每次AI请求的令牌用量和耗时，汇总本次运行的总量、费用和延迟分布
+    后台摘要任务在多个线程中调用，所有记录都在锁内完成
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        清空记录，开始新的一次运行
+        """
+        with self.lock:
+            self.request_count = 0
+            self.failed_count = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.latencies = []
+            self.budget_notice_printed = False
+
+    def record(self, latency, usage=None, success=True):
+        """
+        记录一次请求
+
+        Args:
+            latency: 请求耗时（秒）
+            usage: 响应中的usage字段，包含prompt_tokens和completion_tokens
+            success: 请求是否成功
+        """
+        usage = usage or {}
+        with self.lock:
+            self.request_count += 1
+            if not success:
+                self.failed_count += 1
+            self.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+            self.completion_tokens += usage.get("completion_tokens", 0) or 0
+            self.latencies.append(latency)
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self):
+        """
+        按设置中的单价估算费用
+        """
+        return (self.prompt_tokens * settings.AI_INPUT_PRICE_PER_1K
+                + self.completion_tokens * settings.AI_OUTPUT_PRICE_PER_1K) / 1000
+
+    def budget_exceeded(self):
+        """
+        检查是否已达到令牌或费用上限
+        """
+        if settings.MAX_TOKENS_BUDGET and self.total_tokens >= settings.MAX_TOKENS_BUDGET:
+            return True
+        if settings.MAX_COST and self.cost >= settings.MAX_COST:
+            return True
+        return False
+
+    def print_report(self):
+        """
+        输出本次运行的AI用量统计
+        """
+        if not self.request_count:
+            return
+        with self.lock:
+            latencies = sorted(self.latencies)
+        print("\nAI用量统计：")
+        print(f"- 请求数：{self.request_count}（失败 {self.failed_count}）")
+        print(f"- 令牌数：输入 {self.prompt_tokens}，输出 {self.completion_tokens}，合计 {self.total_tokens}")
+        print(f"- 估算费用：{self.cost:.4f} 元")
+        print(f"- 延迟：总计 {sum(latencies):.1f} 秒，"
+              f"p50 {_percentile(latencies, 50):.2f} 秒，"
+              f"p95 {_percentile(latencies, 95):.2f} 秒，"
+              f"p99 {_percentile(latencies, 99):.2f} 秒")
+        for pool in list(_endpoint_pools.get().values()):
+            pool.print_report()
+
+
+# 本次运行的AI用量记录，转换器使用各自的记录
+_usage_tracker = context.ScopedState(UsageTracker)
+usage_tracker = _usage_tracker.default
+
+
+def current_usage_tracker():
+    """
+    返回当前线程使用的AI用量记录，没有使用转换器时返回全局的 usage_tracker
+    """
+    return _usage_tracker.get()
+
+
+def _budget_exhausted(fallback=False):
+    """
+    检查是否已达到AI用量上限，第一次达到时输出提示
+
+    Args:
+        fallback: 达到上限后是否改用本地摘要，用于提示信息
+    """
+    tracker = current_usage_tracker()
+    if not tracker.budget_exceeded():
+        return False
+    with tracker.lock:
+        if not tracker.budget_notice_printed:
+            notice = "，之后的摘要改用本地摘要" if fallback else ""
+            print(f"⚠️ AI用量预算已用完（达到令牌或费用上限），不再发送摘要请求{notice}")
+            tracker.budget_notice_printed = True
+    return True
+
+
+class Endpoint:
+    """
+    一个OpenAI兼容的聊天补全接口，记录最近的延迟和错误率
+    """
+
+    def __init__(self, url, model, api_key="", max_concurrency=4, name=None):
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.name = name or url
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.latency = None  # 延迟的指数移动平均（秒）
+        self.error_rate = 0.0  # 错误率的指数移动平均
+        self.cooldown_until = 0.0  # 出错后暂停使用的截止时间
+        self.request_count = 0
+        self.failed_count = 0
+        # 保护上面的统计字段，加入接口池后替换为接口池的锁，更新与选择接口互斥
+        self.lock = threading.Lock()
+
+    def score(self):
+        """
+        路由得分，越小越优先：延迟越高、错误率越高得分越高，冷却期内的接口排在最后
+        """
+        latency = self.latency if self.latency is not None else 0.0
+        score = latency * (1 + 4 * self.error_rate)
+        if time.time() < self.cooldown_until:
+            score += 1000
+        return score
+
+    def update(self, latency, success):
+        """
+        根据一次请求的结果更新延迟和错误率，多个摘要线程同时调用
+        """
+        with self.lock:
+            self.request_count += 1
+            if success:
+                self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+                self.error_rate *= 0.7
+            else:
+                self.failed_count += 1
+                self.error_rate = 0.7 * self.error_rate + 0.3
+                self.cooldown_until = time.time() + settings.AI_ENDPOINT_COOLDOWN
+
+
+class EndpointPool:
+    """
+    摘要接口池：按最近延迟和错误率选择接口，每个接口有各自的并发上限，
+    请求失败时自动切换到下一个接口
+    """
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+        self.lock = threading.Lock()
+        for endpoint in endpoints:
+            endpoint.lock = self.lock
+
+    def _ordered(self):
+        with self.lock:
+            return sorted(self.endpoints, key=lambda endpoint: endpoint.score())
+
+    def _acquire(self, candidates):
+        """
+        优先选择有空闲并发名额的接口；都在忙时等待得分最好的接口
+        """
+        for endpoint in candidates:
+            if endpoint.slots.acquire(blocking=False):
+                return endpoint
+        candidates[0].slots.acquire()
+        return candidates[0]
+
+    def request(self, messages, max_tokens):
+        """
+        依次尝试各个接口，直到有一个返回结果
+
+        Returns:
+            AI返回的文本内容，所有接口都失败时返回None
+        """
+        candidates = self._ordered()
+        while candidates:
+            endpoint = self._acquire(candidates)
+            candidates.remove(endpoint)
+            try:
+                result = _send_request(endpoint, messages, max_tokens)
+            finally:
+                endpoint.slots.release()
+            if result is not None:
+                return result
+            if candidates:
+                print(f"⚠️ 接口 {endpoint.name} 请求失败，切换到下一个接口")
+        return None
+
+    def print_report(self):
+        """
+        输出各接口的请求统计
+        """
+        if len(self.endpoints) < 2:
+            return
+        with self.lock:
+            stats = [(endpoint.name, endpoint.request_count, endpoint.failed_count, endpoint.latency) for endpoint in self.endpoints]
+        for name, request_count, failed_count, latency in stats:
+            latency = f"{latency:.2f} 秒" if latency is not None else "-"
+            print(f"  {name}：请求 {request_count}，失败 {failed_count}，平均延迟 {latency}")
+
+
+# 按接口设置缓存的接口池 {接口设置: EndpointPool}，每个转换器使用自己的一份
+_endpoint_pools = context.ScopedState(dict)
+_endpoint_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool():
+    """
+    根据设置创建接口池；未配置 AI_ENDPOINTS 时使用 AI_API_URL 和 AI_MODEL
+    设置变化（如运行时输入了API密钥）后会重新创建
+    """
+    config = (
+        json.dumps(settings.AI_ENDPOINTS, sort_keys=True),
+        settings.AI_API_URL, settings.AI_MODEL, settings.AI_API_KEY, settings.SUMMARY_WORKERS
+    )
+    with _endpoint_pools_lock:
+        pools = _endpoint_pools.get()
+        if config in pools:
+            return pools[config]
+        endpoint_configs = settings.AI_ENDPOINTS or [{"url": settings.AI_API_URL}]
+        pools[config] = EndpointPool([
+            Endpoint(
+                url=item["url"],
+                model=item.get("model", settings.AI_MODEL),
+                api_key=item.get("api_key", settings.AI_API_KEY),
+                max_concurrency=item.get("max_concurrency", settings.SUMMARY_WORKERS),
+                name=item.get("name"),
+            )
+            for item in endpoint_configs
+        ])
+        return pools[config]
+
+
+class SummaryCache:
+    """
+    按文章正文缓存AI生成的摘要，多个站点发布同一篇笔记，或正文改回以前的内容时不再重复请求
+    缓存文件每行一条JSON记录，新摘要追加到末尾，多个进程可以同时使用
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.entries = None
+
+    @staticmethod
+    def key(content, max_length):
+        return hashlib.md5(f"{max_length}\n{content}".encode('utf-8')).hexdigest()
+
+    def _load(self):
+        entries = {}
+        try:
+            if os.path.exists(self.cache_path):
+                with lock_utils.file_lock(self.cache_path, shared=True):
+                    with open(self.cache_path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line)
+                                entries[record["key"]] = record["summary"]
+                            except (ValueError, KeyError, TypeError):
+                                continue
+        except OSError as e:
+            print(f"读取摘要缓存失败: {e}")
+        return entries
+
+    def get(self, content, max_length):
+        """
+        返回缓存的摘要，没有缓存时返回None
+        """
+        with self.lock:
+            if self.entries is None:
+                self.entries = self._load()
+            return self.entries.get(self.key(content, max_length))
+
+    def put(self, content, max_length, summary):
+        """
+        缓存摘要并追加到缓存文件
+        """
+        key = self.key(content, max_length)
+        with self.lock:
+            if self.entries is None:
+                self.entries = self._load()
+            self.entries[key] = summary
+        try:
+            with lock_utils.file_lock(self.cache_path):
+                with open(self.cache_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"key": key, "summary": summary}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入摘要缓存失败: {e}")
+
+
+# 按缓存文件路径保存的摘要缓存 {路径: SummaryCache}，每个转换器使用自己的一份
+_summary_caches = context.ScopedState(dict)
+_summary_caches_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """
+    返回 settings.SUMMARY_CACHE_PATH 对应的摘要缓存，未设置路径时返回None
+    """
+    if not settings.SUMMARY_CACHE_PATH:
+        return None
+    with _summary_caches_lock:
+        caches = _summary_caches.get()
+        if settings.SUMMARY_CACHE_PATH not in caches:
+            caches[settings.SUMMARY_CACHE_PATH] = SummaryCache(settings.SUMMARY_CACHE_PATH)
+        return caches[settings.SUMMARY_CACHE_PATH]
+
+
+def api_available():
+    """
+    是否可以使用AI接口：设置了API密钥，或配置了接口列表（本地服务可能不需要密钥）
+    """
+    return bool(settings.AI_API_KEY or settings.AI_ENDPOINTS)
+
+
+def _send_request(endpoint, messages, max_tokens):
+    """
+    向单个接口发送聊天补全请求，并记录用量和延迟
+
+    Returns:
+        AI返回的文本内容，如果请求失败则返回None
+    """
+    headers = {"Content-Type": "application/json"}
+    if endpoint.api_key:
+        headers["Authorization"] = f"Bearer {endpoint.api_key}"
+    data = {
+        "model": endpoint.model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": 0.5
+    }
+
+    # requests 导入较慢，只在实际请求AI接口时导入，不生成摘要的运行不必加载
+    import requests
     
+    # 发送API请求并记录耗时
+    tracker = current_usage_tracker()
+    start_time = time.perf_counter()
+    try:
+        response = requests.post(endpoint.url, headers=headers, json=data, timeout=settings.AI_REQUEST_TIMEOUT)
+    except Exception as e:
+        latency = time.perf_counter() - start_time
+        tracker.record(latency, success=False)
+        endpoint.update(latency, success=False)
+        print(f"⚠️ 摘要请求出错: {str(e)}")
+        return None
+    latency = time.perf_counter() - start_time
+
+    # 检查响应状态
+    if response.status_code == 200:
+        try:
+            result = response.json()
+            # 根据API的返回格式提取内容
+            content = result["choices"][0]["message"]["content"].strip()
+        except (ValueError, KeyError, IndexError, TypeError):
+            tracker.record(latency, success=False)
+            endpoint.update(latency, success=False)
+            print("⚠️ 摘要接口返回格式无法解析")
+            return None
+        tracker.record(latency, result.get("usage"))
+        endpoint.update(latency, success=True)
+        return content
+
+    tracker.record(latency, success=False)
+    endpoint.update(latency, success=False)
+    print(f"⚠️ 摘要生成失败: {response.status_code}")
+    print(response.text)
+    return None
+
+
+def _request_completion(messages, max_tokens):
+    """
+    通过接口池发送聊天补全请求
+
     Args:
-        content: 要生成摘要的文章内容
+        messages: 消息列表
+        max_tokens: 最大输出令牌数
+
+    Returns:
+        AI返回的文本内容，如果请求失败或已达到用量上限则返回None
+    """
+    # 达到令牌或费用上限后不再发送请求
+    if _budget_exhausted():
+        return None
+    return get_endpoint_pool().request(messages, max_tokens)
+
+
+def _finalize_summary(summary, max_length):
+    """
+    为摘要添加AI生成提示，并确保不超过最大长度
+    """
+    summary = summary.strip() + SUMMARY_NOTICE
+    if len(summary) > max_length+50:
+        summary = summary[:max_length-3] + "..."
+    return summary
+
+
+def generate_summary(content, max_length=150, prepared_input=None):
+    """
+    使用AI生成文章摘要
+
+    Args:
+        content: 要生成摘要的文章正文（不含YAML前置元数据）
         max_length: 摘要最大长度(字符数)
-    
+        prepared_input: summary_input.prepare_summary_input(content) 的结果，已经准备过时传入，避免重复处理
+
     Returns:
         生成的摘要字符串，如果生成失败则返回None
     """
     # 检查API密钥是否存在
-    if not settings.AI_API_KEY:
+    if not api_available():
         print("⚠️ 未设置AI API密钥，无法生成摘要")
         return None
-    
+
+    if _budget_exhausted():
+        return None
+
     try:
-        # 准备请求数据
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.AI_API_KEY}"
-        }
-        
-        # 构建请求体，根据您使用的AI服务调整格式
-        data = {
-            "model": settings.AI_MODEL,
-            "messages": [
-                {"role": "system", "content": "你是一个专业的文章摘要生成器。你的任务是将给定的文章内容转换为简短的摘要，摘要应该清晰简洁地概括文章的主要内容。"},
-                {"role": "user", "content": f"请为以下文章内容生成一个大约{max_length}字符的简短摘要，不要使用'这篇文章'、'本文'等指代词开头，非汉字或英文字符不计入字符数：\n\n{content[:4000]}"}
-            ],
-            "max_tokens": 100,
-            "temperature": 0.5
-        }
+        # 清理正文并按令牌预算挑选段落
+        prepared, original_tokens, input_tokens = prepared_input or summary_input.prepare_summary_input(content)
+        print(f"  - 摘要输入约 {input_tokens} 令牌（原文约 {original_tokens} 令牌，节省 {original_tokens - input_tokens}）")
         
-        # 发送API请求
-        response = requests.post(settings.AI_API_URL, headers=headers, json=data)
-        
-        # 检查响应状态
-        if response.status_code == 200:
-            result = response.json()
-            # 根据API的返回格式提取摘要内容
-            summary = result["choices"][0]["message"]["content"].strip()
-            summary += "\n <---此摘要由AI生成，可能完全不准确。--->"
-            # 确保摘要不超过最大长度
-            if len(summary) > max_length+50:
-                summary = summary[:max_length-3] + "..."
-            
-            return summary
-        else:
-            print(f"⚠️ 摘要生成失败: {response.status_code}")
-            print(response.text)
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": f"请为以下文章内容生成一个大约{max_length}字符的简短摘要，不要使用'这篇文章'、'本文'等指代词开头，非汉字或英文字符不计入字符数：\n\n{prepared}"}
+        ]
+        summary = _request_completion(messages, 100)
+        if summary is None:
             return None
+        return _finalize_summary(summary, max_length)
     except Exception as e:
         print(f"⚠️ 摘要生成过程中出错: {str(e)}")
         return None
+
+
+def summarize(content, max_length=150, engine=None):
+    """
+    按摘要引擎设置生成摘要
+    - local: 只使用本地抽取式摘要，不访问网络
+    - api: 只使用AI接口
+    - auto: 有API密钥时优先使用AI接口，失败或未设置密钥时回退到本地摘要
+
+    Args:
+        content: 要生成摘要的文章内容
+        max_length: 摘要最大长度(字符数)
+        engine: 摘要引擎，默认使用 settings.SUMMARY_ENGINE
+
+    Returns:
+        生成的摘要字符串，如果生成失败则返回None
+    """
+    engine = engine or settings.SUMMARY_ENGINE
+
+    if engine == "local":
+        return local_summary.generate_local_summary(content, max_length)
+
+    if engine == "api" or api_available():
+        cache = get_summary_cache()
+        summary = cache.get(content, max_length) if cache else None
+        if summary:
+            print("  - 使用缓存的AI摘要")
+            return summary
+        # 达到用量上限后不再请求AI接口，auto模式直接使用本地摘要，不逐篇提示生成失败
+        if _budget_exhausted(fallback=engine != "api"):
+            if engine == "api":
+                return None
+            return local_summary.generate_local_summary(content, max_length)
+        summary = generate_summary(content, max_length)
+        if summary and cache:
+            cache.put(content, max_length, summary)
+        if summary or engine == "api":
+            return summary
+        print("⚠️ AI摘要生成失败，改用本地摘要")
+
+    return local_summary.generate_local_summary(content, max_length)
+
+
+def parse_summary_array(text, expected_count):
+    """
+    解析批量请求返回的JSON摘要数组，并校验其格式
+
+    Args:
+        text: AI返回的文本
+        expected_count: 期望的摘要数量
+
+    Returns:
+        摘要字符串列表，如果格式不正确则返回None
+    """
+    # 去掉可能包裹在外面的代码块标记
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text.strip())
+    try:
+        summaries = json.loads(text)
+    except ValueError:
+        return None
+
+    if not isinstance(summaries, list) or len(summaries) != expected_count:
+        return None
+    if not all(isinstance(summary, str) and summary.strip() for summary in summaries):
+        return None
+    return summaries
+
+
+def generate_summaries_batch(contents, max_length=150, prepared_inputs=None):
+    """
+    将多篇文章合并为一次请求生成摘要，要求AI以JSON数组返回
+    如果返回结果无法解析，则回退为逐篇请求；请求本身失败（网络错误或HTTP错误）时整批失败，
+    不逐篇重试，避免接口不可用时每批发出N+1个注定失败的请求
+
+    Args:
+        contents: 文章内容列表
+        max_length: 摘要最大长度(字符数)
+        prepared_inputs: 与contents一一对应的 summary_input.prepare_summary_input 结果，已经准备过时传入
+
+    Returns:
+        与contents一一对应的摘要列表，生成失败的位置为None
+    """
+    if not api_available():
+        print("⚠️ 未设置AI API密钥，无法生成摘要")
+        return [None] * len(contents)
+
+    if _budget_exhausted():
+        return [None] * len(contents)
+
+    # 清理每篇文章并按令牌预算挑选段落
+    prepared_inputs = prepared_inputs or [summary_input.prepare_summary_input(content) for content in contents]
+
+    if len(contents) == 1:
+        return [generate_summary(contents[0], max_length, prepared_inputs[0])]
+
+    try:
+        original_tokens = sum(item[1] for item in prepared_inputs)
+        input_tokens = sum(item[2] for item in prepared_inputs)
+        print(f"  - 摘要输入约 {input_tokens} 令牌（原文约 {original_tokens} 令牌，节省 {original_tokens - input_tokens}）")
+        
+        articles = "\n\n".join(
+            f"=== 文章 {i} ===\n{item[0]}" for i, item in enumerate(prepared_inputs, 1)
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": f"下面有{len(contents)}篇文章，请分别为每篇文章生成一个大约{max_length}字符的简短摘要，不要使用'这篇文章'、'本文'等指代词开头，非汉字或英文字符不计入字符数。"
+                                        f"只返回一个包含{len(contents)}个字符串的JSON数组，按文章顺序排列，不要输出其他内容：\n\n{articles}"}
+        ]
+        response_text = _request_completion(messages, 100 * len(contents))
+        if response_text is None:
+            print(f"⚠️ 批量摘要请求失败，本批 {len(contents)} 篇文章均未生成摘要")
+            return [None] * len(contents)
+        summaries = parse_summary_array(response_text, len(contents))
+        if summaries is not None:
+            return [_finalize_summary(summary, max_length) for summary in summaries]
+        print("⚠️ 批量摘要结果解析失败，改为逐篇生成")
+    except Exception as e:
+        print(f"⚠️ 批量摘要生成过程中出错: {str(e)}，改为逐篇生成")
+
+    return [generate_summary(content, max_length, prepared_input) for content, prepared_input in zip(contents, prepared_inputs)]
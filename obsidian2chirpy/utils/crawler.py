@@ -0,0 +1,173 @@
+"""
+目录遍历模块
+基于 os.scandir 遍历笔记库，按忽略规则跳过 .obsidian、.trash、附件等目录，
+并以生成器的形式逐个返回文件，超大的笔记库也不会占用过多内存
+在iCloud等较慢的文件系统上，多个子目录由线程池同时读取
+"""
+
+import fnmatch
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ..config import settings
+from ..utils import icloud
+
+# 笔记库根目录中的忽略规则文件
+IGNORE_FILE_NAME = ".o2cignore"
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+
+def load_ignore_patterns(root):
+    """
+    读取忽略规则：settings.CRAWL_IGNORE 加上根目录中 .o2cignore 文件的规则
+    规则使用通配符，以 / 结尾的规则只匹配目录，包含 / 的规则匹配相对于根目录的路径，
+    其他规则匹配文件或目录名，以 # 开头的行是注释
+
+    Args:
+        root: 遍历的根目录
+
+    Returns:
+        规则列表
+    """
+    patterns = list(settings.CRAWL_IGNORE)
+    ignore_file = os.path.join(root, IGNORE_FILE_NAME)
+    try:
+        if os.path.exists(ignore_file):
+            with open(ignore_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        patterns.append(line)
+    except Exception as e:
+        print(f"读取忽略规则失败: {e}")
+    return patterns
+
+
+def is_ignored(name, relative_path, is_dir, patterns):
+    """
+    判断文件或目录是否被忽略规则匹配
+
+    Args:
+        name: 文件或目录名
+        relative_path: 相对于根目录的路径（使用 / 分隔）
+        is_dir: 是否为目录
+        patterns: 忽略规则列表
+
+    Returns:
+        是否忽略
+    """
+    for pattern in patterns:
+        if pattern.endswith('/'):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip('/')
+        if '/' in pattern:
+            if fnmatch.fnmatch(relative_path, pattern.lstrip('/')):
+                return True
+        elif fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def is_path_ignored(path, root, patterns=None):
+    """
+    判断根目录下的某个文件是否被忽略规则排除，文件本身或它所在的任一目录被匹配都算排除
+    与 crawl 的结果一致，用于检查不经过遍历直接传入的路径
+
+    Args:
+        path: 文件路径，应位于 root 之下
+        root: 遍历的根目录
+        patterns: 忽略规则，默认使用 load_ignore_patterns(root)
+
+    Returns:
+        是否忽略
+    """
+    patterns = load_ignore_patterns(root) if patterns is None else patterns
+    parts = os.path.relpath(path, root).replace(os.sep, '/').split('/')
+    for index, name in enumerate(parts):
+        if is_ignored(name, '/'.join(parts[:index + 1]), index < len(parts) - 1, patterns):
+            return True
+    return False
+
+
+def _scan_directory(directory):
+    """
+    读取一个目录的所有条目，DirEntry 会缓存类型信息，判断是否为目录时不需要额外的系统调用
+    """
+    try:
+        with os.scandir(directory) as iterator:
+            return list(iterator)
+    except OSError as e:
+        print(f"无法读取目录: {directory} - {e}")
+        return []
+
+
+def crawl(root, extensions=MARKDOWN_EXTENSIONS, include_dirs=False, ignore_patterns=None, workers=None, include_placeholders=False):
+    """
+    遍历目录树，跳过被忽略的目录，逐个返回文件（和目录）
+
+    Args:
+        root: 根目录
+        extensions: 只返回这些扩展名的文件（不区分大小写），为None时返回所有文件
+        include_dirs: 是否同时返回目录
+        ignore_patterns: 忽略规则，默认使用 load_ignore_patterns(root)
+        workers: 同时读取目录的线程数，默认使用 settings.CRAWL_WORKERS，为1时在当前线程中遍历
+        include_placeholders: 是否同时返回扩展名匹配的iCloud占位文件（.笔记名.md.icloud）
+
+    Yields:
+        os.DirEntry 对象，可以直接使用其 path、name 和缓存的 stat() 结果
+    """
+    patterns = load_ignore_patterns(root) if ignore_patterns is None else ignore_patterns
+    workers = workers or settings.CRAWL_WORKERS
+    root_length = len(os.path.join(root, ''))
+
+    def expand(entries):
+        # 返回需要继续遍历的子目录，以及需要交给调用方的条目
+        subdirectories = []
+        results = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+                # 与 os.walk 一样不进入指向目录的符号链接，避免循环
+                if is_dir and entry.is_symlink():
+                    continue
+            except OSError:
+                continue
+            relative_path = entry.path[root_length:].replace(os.sep, '/')
+            if is_ignored(entry.name, relative_path, is_dir, patterns):
+                continue
+            if is_dir:
+                subdirectories.append(entry.path)
+                if include_dirs:
+                    results.append(entry)
+            elif extensions is None or entry.name.lower().endswith(extensions):
+                results.append(entry)
+            elif include_placeholders and entry.name.lower()[:-len(icloud.PLACEHOLDER_SUFFIX)].endswith(extensions) \
+                    and icloud.placeholder_target(entry.name):
+                results.append(entry)
+        return subdirectories, results
+
+    if workers <= 1:
+        stack = [root]
+        while stack:
+            subdirectories, results = expand(_scan_directory(stack.pop()))
+            stack.extend(reversed(subdirectories))
+            yield from results
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawler")
+    pending = {executor.submit(_scan_directory, root)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirectories, results = expand(future.result())
+                for directory in subdirectories:
+                    pending.add(executor.submit(_scan_directory, directory))
+                yield from results
+    finally:
+        # 调用方提前结束遍历时，取消尚未开始的目录读取
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -9,7 +9,7 @@ import json
 import re
 
 from ..config import settings
-from ..utils import text_utils
+from ..utils import crawler, icloud, lock_utils, text_utils
 
 
 def calculate_file_hash(file_path):
@@ -37,7 +37,7 @@ def load_file_hashes(hash_file_path):
         hash_file_path: 哈希记录文件路径
     
     Returns:
-        字典 {文件路径: 哈希值}
+        字典 {文件路径: 记录值}，记录值格式见 core.cache_key.make_record
     """
     file_hashes = {}
     
@@ -48,13 +48,8 @@ def load_file_hashes(hash_file_path):
             os.makedirs(hash_file_dir)
             
         if os.path.exists(hash_file_path):
-            with open(hash_file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if ':' in line and not line.startswith('#'):
-                        parts = line.strip().split(':', 1)
-                        file_path = parts[0].strip()
-                        hash_value = parts[1].strip()
-                        file_hashes[file_path] = hash_value
+            with lock_utils.file_lock(hash_file_path, shared=True):
+                file_hashes = _read_file_hashes(hash_file_path)
         else:
             # 文件不存在，创建空文件
             with open(hash_file_path, 'w', encoding='utf-8') as f:
@@ -65,23 +60,278 @@ def load_file_hashes(hash_file_path):
     return file_hashes
 
 
+def _read_file_hashes(hash_file_path):
+    """
+    读取哈希记录文件（调用方负责加锁）
+    """
+    file_hashes = {}
+    with open(hash_file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if ':' in line and not line.startswith('#'):
+                parts = line.strip().split(':', 1)
+                file_path = parts[0].strip()
+                hash_value = parts[1].strip()
+                file_hashes[file_path] = hash_value
+    return file_hashes
+
+
+def _write_file_hashes(hash_file_path, file_hashes):
+    """
+    写入哈希记录文件（调用方负责加锁），先写入临时文件再替换，写入中途出错不会破坏原有记录
+    """
+    temp_path = hash_file_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(f"# 文件哈希值记录 - 更新时间: {text_utils.format_time_with_limited_seconds()}\n\n")
+        for file_path, hash_value in sorted(file_hashes.items()):
+            f.write(f"{file_path}: {hash_value}\n")
+    os.replace(temp_path, hash_file_path)
+
+
 def save_file_hashes(hash_file_path, file_hashes):
     """
     将文件路径和对应的哈希值保存到记录文件中
     
     Args:
         hash_file_path: 哈希记录文件路径
-        file_hashes: 字典 {文件路径: 哈希值}
+        file_hashes: 字典 {文件路径: 记录值}
     """
     try:
-        with open(hash_file_path, 'w', encoding='utf-8') as f:
-            f.write(f"# 文件哈希值记录 - 更新时间: {text_utils.format_time_with_limited_seconds()}\n\n")
-            for file_path, hash_value in sorted(file_hashes.items()):
-                f.write(f"{file_path}: {hash_value}\n")
+        with lock_utils.file_lock(hash_file_path):
+            _write_file_hashes(hash_file_path, file_hashes)
     except Exception as e:
         print(f"保存哈希记录失败: {e}")
 
 
+def load_hash_journal(journal_path):
+    """
+    读取哈希更新日志中尚未合并到哈希记录的条目
+    上次运行中途退出时，已处理完的文件仍记录在日志中
+    
+    Args:
+        journal_path: 日志文件路径
+    
+    Returns:
+        字典 {文件路径: 记录值}，同一文件以最后一条为准
+    """
+    try:
+        with lock_utils.file_lock(journal_path, shared=True):
+            return _read_hash_journal(journal_path)
+    except Exception as e:
+        print(f"读取哈希更新日志失败: {e}")
+        return {}
+
+
+def _read_hash_journal(journal_path):
+    """
+    读取哈希更新日志（调用方负责加锁）
+    """
+    journal_hashes = {}
+    if os.path.exists(journal_path):
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                # 忽略崩溃时只写了一半的最后一行
+                if not line.endswith('\n') or ':' not in line or line.startswith('#'):
+                    continue
+                file_path, hash_value = line.strip().split(':', 1)
+                journal_hashes[file_path.strip()] = hash_value.strip()
+    return journal_hashes
+
+
+def append_hash_journal(journal_path, file_path, hash_value):
+    """
+    向哈希更新日志追加一条记录，并立即同步到磁盘
+    每处理完一个文件就写入一条，程序中途退出时已处理的文件不必重新处理
+    
+    Args:
+        journal_path: 日志文件路径
+        file_path: 源文件路径
+        hash_value: 记录值
+    """
+    try:
+        with lock_utils.file_lock(journal_path):
+            with open(journal_path, 'a', encoding='utf-8') as f:
+                f.write(f"{file_path}: {hash_value}\n")
+                f.flush()
+                os.fsync(f.fileno())
+    except Exception as e:
+        print(f"写入哈希更新日志失败: {e}")
+
+
+def compact_file_hashes(hash_file_path, journal_path):
+    """
+    把更新日志合并到哈希记录文件并删除日志，源文件已不存在的条目会被移除
+    iCloud移出本地、只剩占位文件的笔记仍然存在，保留其记录
+    合并时重新读取磁盘上的记录，同时运行的其他进程写入的记录不会被覆盖
+    
+    Args:
+        hash_file_path: 哈希记录文件路径
+        journal_path: 日志文件路径
+    """
+    try:
+        with lock_utils.file_lock(hash_file_path), lock_utils.file_lock(journal_path):
+            file_hashes = _read_file_hashes(hash_file_path) if os.path.exists(hash_file_path) else {}
+            file_hashes.update(_read_hash_journal(journal_path))
+            existing_hashes = {path: value for path, value in file_hashes.items()
+                               if os.path.exists(path) or icloud.is_evicted(path)}
+            _write_file_hashes(hash_file_path, existing_hashes)
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+    except Exception as e:
+        print(f"合并哈希更新日志失败: {e}")
+
+
+def merge_file_hashes(hash_file_path, file_hashes):
+    """
+    把一批记录合并到哈希记录文件，其他条目保持不变
+    合并时重新读取磁盘上的记录，同时运行的其他进程写入的记录不会被覆盖
+    
+    Args:
+        hash_file_path: 哈希记录文件路径
+        file_hashes: 字典 {文件路径: 记录值}
+    
+    Returns:
+        是否成功写入
+    """
+    try:
+        with lock_utils.file_lock(hash_file_path):
+            merged_hashes = _read_file_hashes(hash_file_path) if os.path.exists(hash_file_path) else {}
+            merged_hashes.update(file_hashes)
+            _write_file_hashes(hash_file_path, merged_hashes)
+        return True
+    except Exception as e:
+        print(f"合并哈希记录失败: {e}")
+        return False
+
+
+def load_summary_journal(journal_path):
+    """
+    读取摘要进度日志，获取已完成摘要的文章内容哈希值
+    
+    Args:
+        journal_path: 日志文件路径
+    
+    Returns:
+        已完成文章的内容哈希值集合
+    """
+    completed_hashes = set()
+    try:
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if ':' in line and not line.startswith('#'):
+                        completed_hashes.add(line.split(':', 1)[0].strip())
+    except Exception as e:
+        print(f"读取摘要进度日志失败: {e}")
+    return completed_hashes
+
+
+def reset_summary_journal(journal_path):
+    """
+    清空摘要进度日志，开始新的一轮处理
+    
+    Args:
+        journal_path: 日志文件路径
+    """
+    try:
+        with open(journal_path, 'w', encoding='utf-8') as f:
+            f.write(f"# 摘要进度日志 - 创建时间: {text_utils.format_time_with_limited_seconds()}\n\n")
+    except Exception as e:
+        print(f"创建摘要进度日志失败: {e}")
+
+
+def append_summary_journal(journal_path, content_hash, file_path):
+    """
+    向摘要进度日志追加一条已完成记录，并立即同步到磁盘
+    这样即使程序中途崩溃，已完成的文章也不会被重复处理
+    
+    Args:
+        journal_path: 日志文件路径
+        content_hash: 文章正文的哈希值
+        file_path: 文章路径
+    """
+    try:
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write(f"{content_hash}: {file_path}\n")
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception as e:
+        print(f"写入摘要进度日志失败: {e}")
+
+
+def patch_post_description(post_path, summary, signature=None, replace_existing=False, marker=None):
+    """
+    只修改文章YAML前置元数据中的description行（以及摘要签名行），正文保持不变
+    有待生成标记时替换该标记，否则追加到第一个YAML块末尾
+    
+    Args:
+        post_path: 文章路径
+        summary: 生成的摘要
+        signature: 生成摘要时正文的SimHash签名，写入summary_simhash字段
+        replace_existing: 文章已有摘要时是否替换，否则不做修改
+        marker: 待生成标记行，默认使用 settings.SUMMARY_PENDING_MARKER
+    
+    Returns:
+        是否成功写入摘要
+    """
+    # 读取和写回之间持有文章锁，避免与转换流程或其他进程同时改写同一篇文章
+    with lock_utils.file_lock(post_path):
+        return _patch_post_description(post_path, summary, signature, replace_existing, marker or settings.SUMMARY_PENDING_MARKER)
+
+
+def _patch_post_description(post_path, summary, signature, replace_existing, marker):
+    with open(post_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    
+    if not lines or lines[0].strip() != '---':
+        return False
+    
+    # 找到第一个YAML块的结束位置，并记录需要替换的行
+    header = []
+    insert_index = None
+    in_description = False
+    end_index = None
+    for i in range(1, len(lines)):
+        line = lines[i]
+        stripped = line.strip()
+        if stripped == '---':
+            end_index = i
+            break
+        # 摘要可能跨多行，缩进的续行属于description字段
+        if in_description and line[:1] in (' ', '\t'):
+            continue
+        in_description = False
+        if stripped == marker:
+            insert_index = len(header)
+            continue
+        if stripped.startswith('description:'):
+            if not replace_existing:
+                return False
+            insert_index = len(header)
+            in_description = True
+            continue
+        if stripped.startswith('summary_simhash:'):
+            continue
+        header.append(line)
+    if end_index is None:
+        return False
+    
+    # 处理摘要中可能包含的引号，确保YAML格式正确
+    summary = summary.replace('"', '\\"')
+    new_lines = [f'description: "{summary}"\n']
+    if signature:
+        new_lines.append(f'summary_simhash: {signature}\n')
+    if insert_index is None:
+        insert_index = len(header)
+    header[insert_index:insert_index] = new_lines
+    
+    # 先写入临时文件再替换，避免写入中途出错损坏文章
+    temp_path = post_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.writelines([lines[0]] + header + lines[end_index:])
+    os.replace(temp_path, post_path)
+    return True
+
+
 def search_files_by_name(search_name, source_folder):
     """
     在源文件夹中搜索匹配给定文件名的文件
@@ -95,14 +345,12 @@ def search_files_by_name(search_name, source_folder):
     """
     matching_files = []
     
-    for root, _, files in os.walk(source_folder):
-        for file in files:
-            if file.lower().endswith(('.md', '.markdown')):
-                # 不区分大小写进行匹配
-                if search_name.lower() in file.lower():
-                    matching_files.append(os.path.join(root, file))
+    for entry in crawler.crawl(source_folder):
+        # 不区分大小写进行匹配
+        if search_name.lower() in entry.name.lower():
+            matching_files.append(entry.path)
     
-    return matching_files
+    return sorted(matching_files)
 
 
 def search_folders_by_name(search_name, source_folder):
@@ -118,13 +366,12 @@ def search_folders_by_name(search_name, source_folder):
     """
     matching_folders = []
     
-    for root, dirs, _ in os.walk(source_folder):
-        for dir_name in dirs:
-            # 不区分大小写进行匹配
-            if search_name.lower() in dir_name.lower():
-                matching_folders.append(os.path.join(root, dir_name))
+    for entry in crawler.crawl(source_folder, extensions=(), include_dirs=True):
+        # 不区分大小写进行匹配
+        if search_name.lower() in entry.name.lower():
+            matching_folders.append(entry.path)
     
-    return matching_folders
+    return sorted(matching_folders)
 
 
 def scan_posts_directory(root_path, output_file='md_files_inventory.txt'):
@@ -146,26 +393,132 @@ def scan_posts_directory(root_path, output_file='md_files_inventory.txt'):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # 遍历目录
-    for root, _, files in os.walk(root_path):
-        for file in files:
-            if file.lower().endswith(('.md', '.markdown')):
-                file_path = os.path.join(root, file)
-                # 提取原始标题（移除日期前缀）
-                original_title = text_utils.extract_original_title(file)
-                if original_title:
-                    inventory[original_title] = file_path
-    
-    # 将信息写入txt文件
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(f"# 文档索引 - 更新时间: {text_utils.format_time_with_limited_seconds()}\n\n")
-        for title, path in inventory.items():
-            f.write(f"* {title}: {path}\n")
+    # 遍历目录，多线程遍历返回的顺序不固定，按路径排序，重名的文章每次都对应同一个路径，索引文件的顺序也保持不变
+    for entry in sorted(crawler.crawl(root_path), key=lambda entry: entry.path):
+        # 提取原始标题（移除日期前缀）
+        original_title = text_utils.extract_original_title(entry.name)
+        if original_title:
+            inventory[original_title] = entry.path
+    
+    # 将信息写入txt文件，先写入临时文件再替换，读取方不会读到写了一半的索引
+    with lock_utils.file_lock(output_path):
+        temp_path = output_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(f"# 文档索引 - 更新时间: {text_utils.format_time_with_limited_seconds()}\n\n")
+            for title, path in inventory.items():
+                f.write(f"* {title}: {path}\n")
+        os.replace(temp_path, output_path)
     
     return inventory
 
 
-def find_source_files_from_inventory(inventory_path, source_folder):
+def _update_metadata_index(file_stats, index_path, keep_others=False):
+    """
+    更新元数据索引，只有修改时间或大小变化的文件才会重新读取其YAML头部
+    
+    Args:
+        file_stats: 可迭代对象，元素为 (文件路径, stat结果)
+        index_path: 索引缓存文件路径
+        keep_others: 是否保留本次没有出现的文件的条目，否则视为已删除
+    
+    Returns:
+        字典 {文件路径: 元数据字典}，只包含本次出现的文件
+    """
+    cached_index = {}
+    try:
+        if os.path.exists(index_path):
+            with lock_utils.file_lock(index_path, shared=True):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    cached_index = json.load(f)
+    except Exception as e:
+        print(f"读取元数据索引失败: {e}")
+    
+    index = {}
+    changed = False
+    for file_path, stat in file_stats:
+        cached = cached_index.get(file_path)
+        # 旧版本的索引条目缺少后来增加的字段，重新读取
+        if cached and cached.get('mtime') == stat.st_mtime and cached.get('size') == stat.st_size and 'summary_pending' in cached:
+            index[file_path] = cached
+            continue
+        
+        try:
+            meta = text_utils.parse_frontmatter_fields(text_utils.read_frontmatter(file_path))
+        except Exception as e:
+            print(f"读取元数据失败: {file_path} - {e}")
+            continue
+        meta['mtime'] = stat.st_mtime
+        meta['size'] = stat.st_size
+        index[file_path] = meta
+        changed = True
+    
+    # 有文件新增、修改或删除时才写回缓存
+    if changed or (not keep_others and len(index) != len(cached_index)):
+        try:
+            with lock_utils.file_lock(index_path):
+                saved_index = index
+                if keep_others:
+                    # 重新读取磁盘上的索引，保留其他进程和其他文件夹的条目
+                    saved_index = {}
+                    if os.path.exists(index_path):
+                        with open(index_path, 'r', encoding='utf-8') as f:
+                            saved_index = json.load(f)
+                    saved_index.update(index)
+                temp_path = index_path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(saved_index, f, ensure_ascii=False)
+                os.replace(temp_path, index_path)
+        except Exception as e:
+            print(f"保存元数据索引失败: {e}")
+    
+    return index
+
+
+def load_posts_metadata_index(posts_root, index_path=None):
+    """
+    加载_posts目录的文章元数据索引（标题、日期、分类、是否有摘要、是否最终版本）
+    索引缓存在JSON文件中，只有修改时间或大小变化的文章才会重新读取其YAML头部
+    
+    Args:
+        posts_root: _posts目录的根路径
+        index_path: 索引缓存文件路径
+    
+    Returns:
+        字典 {文章路径: 元数据字典}
+    """
+    def file_stats():
+        for entry in crawler.crawl(posts_root):
+            try:
+                yield entry.path, entry.stat()
+            except OSError:
+                continue
+    
+    return _update_metadata_index(file_stats(), index_path or settings.POSTS_INDEX_PATH)
+
+
+def load_notes_metadata_index(note_paths, index_path=None):
+    """
+    加载笔记的元数据索引（是否标记publish、标签等），用于按发布规则选择笔记
+    只读取修改时间或大小变化的笔记的YAML头部，其他笔记的条目保留在索引中
+    
+    Args:
+        note_paths: 笔记路径
+        index_path: 索引缓存文件路径
+    
+    Returns:
+        字典 {笔记路径: 元数据字典}
+    """
+    def file_stats():
+        for note_path in note_paths:
+            try:
+                yield note_path, os.stat(note_path)
+            except OSError:
+                continue
+    
+    return _update_metadata_index(file_stats(), index_path or settings.NOTES_INDEX_PATH, keep_others=True)
+
+
+def find_source_files_from_inventory(inventory_path, source_folder, source_paths=None):
     """
     根据索引文件找到源文件夹中对应的源文件
     使用正则表达式从文章路径中提取标题
@@ -173,6 +526,7 @@ def find_source_files_from_inventory(inventory_path, source_folder):
     Args:
         inventory_path: 文章索引文件路径
         source_folder: 源文件文件夹路径
+        source_paths: 源文件夹中的Markdown文件路径（如笔记库快照的结果），为None时遍历源文件夹
     
     Returns:
         字典 {源文件路径: 对应的文章路径}
@@ -180,7 +534,7 @@ def find_source_files_from_inventory(inventory_path, source_folder):
     # 从索引文件中读取文章路径
     post_paths = {}
     if os.path.exists(inventory_path):
-        with open(inventory_path, 'r', encoding='utf-8') as f:
+        with lock_utils.file_lock(inventory_path, shared=True), open(inventory_path, 'r', encoding='utf-8') as f:
             for line in f:
                 if line.startswith('* '):  # 匹配"* 标题: 路径"格式的行
                     parts = line[2:].split(':', 1)
@@ -194,20 +548,21 @@ def find_source_files_from_inventory(inventory_path, source_folder):
     
     # 在源文件夹中查找对应的源文件
     source_files = {}
-    for root, _, files in os.walk(source_folder):
-        for file in files:
-            if file.lower().endswith(('.md', '.markdown')):
-                file_path = os.path.join(root, file)
-                file_name_no_ext = os.path.splitext(file)[0].lower()
-                
-                # 检查是否匹配任何文章标题
-                if file_name_no_ext in post_paths:
-                    source_files[file_path] = post_paths[file_name_no_ext]
+    if source_paths is None:
+        # iCloud占位文件按对应的笔记路径匹配
+        source_paths = (icloud.placeholder_target(entry.path) or entry.path
+                        for entry in crawler.crawl(source_folder, include_placeholders=True))
+    for source_path in source_paths:
+        file_name_no_ext = os.path.splitext(os.path.basename(source_path))[0].lower()
+        
+        # 检查是否匹配任何文章标题
+        if file_name_no_ext in post_paths:
+            source_files[source_path] = post_paths[file_name_no_ext]
     
     return source_files
 
 
-def load_user_decisions(decisions_file_path=settings.DECISIONS_FILE_PATH):
+def load_user_decisions(decisions_file_path=None):
     """
     从JSON文件中加载用户对callout类型的处理决策
     
@@ -217,6 +572,7 @@ def load_user_decisions(decisions_file_path=settings.DECISIONS_FILE_PATH):
     Returns:
         包含用户决策的字典: {callout_type: decision}
     """
+    decisions_file_path = decisions_file_path or settings.DECISIONS_FILE_PATH
     user_decisions = {}
     
     # 确保文件所在目录存在
@@ -226,8 +582,9 @@ def load_user_decisions(decisions_file_path=settings.DECISIONS_FILE_PATH):
     
     try:
         if os.path.exists(decisions_file_path):
-            with open(decisions_file_path, 'r', encoding='utf-8') as f:
-                user_decisions = json.load(f)
+            with lock_utils.file_lock(decisions_file_path, shared=True):
+                with open(decisions_file_path, 'r', encoding='utf-8') as f:
+                    user_decisions = json.load(f)
             print(f"已加载 {len(user_decisions)} 个callout类型的处理决策")
         else:
             # 文件不存在，创建空文件
@@ -240,7 +597,7 @@ def load_user_decisions(decisions_file_path=settings.DECISIONS_FILE_PATH):
     return user_decisions
 
 
-def save_user_decisions(user_decisions, decisions_file_path=settings.DECISIONS_FILE_PATH):
+def save_user_decisions(user_decisions, decisions_file_path=None):
     """
     将用户对callout类型的处理决策保存到JSON文件
     
@@ -248,14 +605,24 @@ def save_user_decisions(user_decisions, decisions_file_path=settings.DECISIONS_F
         user_decisions: 包含用户决策的字典
         decisions_file_path: 决策文件路径
     """
+    decisions_file_path = decisions_file_path or settings.DECISIONS_FILE_PATH
     try:
         # 确保文件所在目录存在
         decisions_dir = os.path.dirname(decisions_file_path)
         if decisions_dir and not os.path.exists(decisions_dir):
             os.makedirs(decisions_dir)
             
-        with open(decisions_file_path, 'w', encoding='utf-8') as f:
-            json.dump(user_decisions, f, ensure_ascii=False, indent=2)
-        print(f"已保存 {len(user_decisions)} 个callout类型的处理决策")
+        # 重新读取磁盘上的决策再合并，不覆盖其他进程同时保存的决策
+        with lock_utils.file_lock(decisions_file_path):
+            merged_decisions = {}
+            if os.path.exists(decisions_file_path):
+                with open(decisions_file_path, 'r', encoding='utf-8') as f:
+                    merged_decisions = json.load(f)
+            merged_decisions.update(user_decisions)
+            temp_path = decisions_file_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(merged_decisions, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, decisions_file_path)
+        print(f"已保存 {len(merged_decisions)} 个callout类型的处理决策")
     except Exception as e:
         print(f"保存用户决策失败: {e}")
\ No newline at end of file
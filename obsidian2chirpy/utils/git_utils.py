@@ -0,0 +1,139 @@
+"""
+Git变更检测模块
+笔记库在git仓库中时，直接询问git自上次同步以来修改过哪些笔记，不必逐个计算文件哈希
+每次运行结束后记录当时的提交和未提交的修改，下次运行时与之比较
+源文件夹不在git仓库中（或没有安装git）时不使用git，由调用方改用哈希记录判断
+"""
+
+import json
+import os
+
+from ..config import settings
+from ..utils import lock_utils
+
+
+def _run_git(directory, *args):
+    """
+    在指定目录中运行git命令
+
+    Returns:
+        命令输出，命令失败或没有安装git时返回None
+    """
+    # 只在自动处理时用到，不在导入时加载
+    import subprocess
+    
+    try:
+        result = subprocess.run(
+            ['git', '-C', directory, *args],
+            capture_output=True, timeout=60, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.decode('utf-8', errors='replace')
+
+
+def _split_paths(output):
+    """
+    拆分 -z 格式的路径列表
+    """
+    return {path for path in output.split('\0') if path}
+
+
+class GitChangeSource:
+    """
+    基于git的变更检测
+    """
+
+    def __init__(self, source_folder, state_path=None):
+        self.source_folder = os.path.normpath(source_folder)
+        self.state_path = state_path or settings.GIT_SYNC_STATE_PATH
+        self.head = None
+        self.dirty = set()
+        self.changed = set()
+        self.tracked = set()
+
+    def _load_state(self):
+        try:
+            if os.path.exists(self.state_path):
+                with lock_utils.file_lock(self.state_path, shared=True):
+                    with open(self.state_path, 'r', encoding='utf-8') as f:
+                        state = json.load(f)
+                if state.get('root') == self.source_folder:
+                    return state
+        except Exception as e:
+            print(f"读取git同步记录失败: {e}")
+        return {}
+
+    def detect(self):
+        """
+        找出自上次同步以来修改过的文件
+
+        Returns:
+            是否可以使用git判断文件是否修改；返回False时应改用哈希记录
+        """
+        head = _run_git(self.source_folder, 'rev-parse', '--verify', '-q', 'HEAD')
+        if not head:
+            return False
+        self.head = head.strip()
+
+        # 当前未提交的修改和未跟踪的文件，路径相对于源文件夹
+        untracked = _split_paths(_run_git(self.source_folder, 'ls-files', '-z', '--others', '--exclude-standard') or '')
+        modified = _run_git(self.source_folder, 'diff', '--name-only', '-z', '--relative', 'HEAD', '--')
+        if modified is None:
+            return False
+        self.dirty = _split_paths(modified) | untracked
+        self.tracked = _split_paths(_run_git(self.source_folder, 'ls-files', '-z') or '')
+
+        state = self._load_state()
+        synced_commit = state.get('commit')
+        if not synced_commit:
+            print("没有git同步记录，本次使用哈希记录判断文件是否修改")
+            return False
+        # 与上次同步的提交比较工作区，包括之后的提交和未提交的修改；
+        # 上次同步时未提交的文件可能已被还原，也视为修改过
+        changed = _run_git(self.source_folder, 'diff', '--name-only', '-z', '--relative', synced_commit, '--')
+        if changed is None:
+            print(f"找不到上次同步的提交 {synced_commit[:8]}，本次使用哈希记录判断文件是否修改")
+            return False
+        self.changed = _split_paths(changed) | untracked | set(state.get('dirty', []))
+        print(f"git变更检测：自 {synced_commit[:8]} 以来有 {len(self.changed)} 个文件修改过")
+        return True
+
+    def changed_among(self, paths):
+        """
+        从文件路径中选出需要重新计算哈希值的文件
+        只有被git跟踪且自上次同步以来没有修改的文件视为未修改，被忽略的文件始终重新计算
+
+        Args:
+            paths: 源文件路径
+
+        Returns:
+            需要重新计算哈希值的文件路径集合
+        """
+        result = set()
+        for path in paths:
+            relative_path = os.path.relpath(os.path.normpath(path), self.source_folder).replace(os.sep, '/')
+            if relative_path not in self.tracked or relative_path in self.changed:
+                result.add(path)
+        return result
+
+    def forget(self, file_path):
+        """
+        把处理失败的文件记为未同步，下次运行时重新处理
+        """
+        self.dirty.add(os.path.relpath(os.path.normpath(file_path), self.source_folder).replace(os.sep, '/'))
+
+    def save(self):
+        """
+        记录本次同步时的提交和未提交的修改
+        """
+        if not self.head:
+            return
+        try:
+            with lock_utils.file_lock(self.state_path):
+                temp_path = self.state_path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'root': self.source_folder, 'commit': self.head, 'dirty': sorted(self.dirty)}, f, ensure_ascii=False)
+                os.replace(temp_path, self.state_path)
+        except Exception as e:
+            print(f"保存git同步记录失败: {e}")
@@ -0,0 +1,149 @@
+"""
+iCloud占位文件模块
+iCloud可能把不常用的笔记移出本地，只留下 .笔记名.md.icloud 占位文件（或macOS新版本中未下载内容的dataless文件），
+直接读取这类文件会等待下载。运行开始时请求下载所有需要读取的笔记，先处理已在本地的笔记，
+下载完成的笔记随后处理，超时仍未下载的笔记推迟到下次运行
+下载命令由 settings.ICLOUD_DOWNLOAD_COMMAND 指定，非macOS系统上默认不下载；
+同时运行的下载命令不超过 settings.ICLOUD_DOWNLOAD_CONCURRENCY 个，结束的命令及时回收
+"""
+
+import os
+import time
+
+from ..config import settings
+
+PLACEHOLDER_SUFFIX = ".icloud"
+
+# macOS的 st_flags 中表示文件内容未下载的标志
+SF_DATALESS = 0x40000000
+
+
+def placeholder_target(path):
+    """
+    返回占位文件对应的笔记路径
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        笔记路径，不是占位文件时返回None
+    """
+    directory, name = os.path.split(path)
+    if name.startswith('.') and name.endswith(PLACEHOLDER_SUFFIX) and len(name) > len(PLACEHOLDER_SUFFIX) + 1:
+        return os.path.join(directory, name[1:-len(PLACEHOLDER_SUFFIX)])
+    return None
+
+
+def placeholder_path(path):
+    """
+    返回笔记对应的占位文件路径
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}{PLACEHOLDER_SUFFIX}")
+
+
+def is_evicted(path):
+    """
+    判断笔记是否尚未下载到本地
+
+    Args:
+        path: 笔记路径
+
+    Returns:
+        只有占位文件，或文件内容未下载时返回True
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return os.path.exists(placeholder_path(path))
+    return bool(getattr(stat, 'st_flags', 0) & SF_DATALESS)
+
+
+def start_download(path):
+    """
+    请求下载笔记，不等待下载完成
+
+    Args:
+        path: 笔记路径
+
+    Returns:
+        下载命令的进程（subprocess.Popen），没有设置下载命令或启动失败时返回None
+    """
+    command = settings.ICLOUD_DOWNLOAD_COMMAND
+    if not command:
+        return None
+    # 只在有笔记需要下载时用到，不在导入时加载
+    import subprocess
+    
+    try:
+        return subprocess.Popen([*command, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        print(f"请求下载失败: {path} - {e}")
+        return None
+
+
+class DownloadWaiter:
+    """
+    请求下载多个笔记，并按下载完成的先后分批返回
+    同时运行的下载命令不超过 max_processes 个，结束的命令回收后再请求下载其他笔记
+    """
+
+    def __init__(self, paths, max_processes=None):
+        self.pending = list(paths)
+        self.max_processes = max_processes or settings.ICLOUD_DOWNLOAD_CONCURRENCY
+        self.queue = list(self.pending)  # 尚未请求下载的笔记
+        self.processes = []  # 正在运行的下载命令
+        self.requested = 0
+        self._request_more()
+        if self.pending:
+            print(f"有 {len(self.pending)} 篇笔记尚未从iCloud下载，已开始请求下载，先处理本地的笔记")
+
+    def _request_more(self):
+        # 回收已结束的下载命令，再启动新的命令补足并发数
+        self.processes = [process for process in self.processes if process.poll() is None]
+        while self.queue and len(self.processes) < self.max_processes:
+            process = start_download(self.queue.pop(0))
+            if process:
+                self.processes.append(process)
+                self.requested += 1
+
+    def close(self):
+        """
+        结束仍在运行的下载命令并回收进程，尚未请求下载的笔记不再请求
+        """
+        self.queue = []
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        self.processes = []
+
+    def batches(self, timeout=None, interval=1.0):
+        """
+        等待下载，每次有笔记下载完成时返回这一批笔记路径
+        没有成功发出任何下载请求时不等待
+
+        Args:
+            timeout: 最长等待时间（秒），默认使用 settings.ICLOUD_DOWNLOAD_TIMEOUT
+            interval: 检查间隔（秒）
+
+        Yields:
+            下载完成的笔记路径列表
+        """
+        timeout = settings.ICLOUD_DOWNLOAD_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            while self.pending:
+                self._request_more()
+                ready = [path for path in self.pending if not is_evicted(path)]
+                if ready:
+                    ready_set = set(ready)
+                    self.pending = [path for path in self.pending if path not in ready_set]
+                    yield ready
+                    continue
+                if not self.requested or time.monotonic() >= deadline:
+                    return
+                # 还有笔记等待请求下载时缩短间隔，尽快补足并发数
+                time.sleep(min(interval, 0.05) if self.queue else interval)
+        finally:
+            self.close()
@@ -0,0 +1,123 @@
+"""
+流水线读写模块
+在iCloud等延迟较高的存储上，源文件的读取和文章的写入由后台线程完成，与转换同时进行
+预读和待写入的队列都有上限，内存占用不随笔记数量增长
+"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import context
+
+
+def prefetch(items, loader, depth, workers=4):
+    """
+    按原顺序逐个返回 loader(item) 的结果，后面的项目由线程池提前读取
+
+    Args:
+        items: 项目列表
+        loader: 读取函数，在后台线程中调用
+        depth: 最多提前读取的项目数，为0时在当前线程中逐个读取
+        workers: 同时读取的线程数
+
+    Yields:
+        元组 (项目, 读取结果, 异常)，读取失败时结果为None
+    """
+    # 后台线程使用调用方的设置
+    loader = context.bind(loader)
+    if depth <= 0:
+        for item in items:
+            try:
+                result, error = loader(item), None
+            except Exception as e:
+                result, error = None, e
+            yield item, result, error
+        return
+
+    iterator = iter(items)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, depth)), thread_name_prefix="prefetch")
+    try:
+        for item in iterator:
+            pending.append((item, executor.submit(loader, item)))
+            if len(pending) >= depth:
+                break
+        while pending:
+            item, future = pending.popleft()
+            # 取走一个结果后再提交下一个，保持预读数量不变
+            for next_item in iterator:
+                pending.append((next_item, executor.submit(loader, next_item)))
+                break
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+            yield item, result, error
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class BackgroundWriter:
+    """
+    后台写入队列，按提交顺序在一个线程中执行写入任务
+    队列已满时 submit 会等待，避免转换速度超过写入速度时占用过多内存
+    """
+
+    def __init__(self, depth):
+        """
+        Args:
+            depth: 队列长度，为0时在调用 submit 的线程中直接执行
+        """
+        self.depth = depth
+        self.results = []
+        self.queue = None
+        self.thread = None
+        if depth > 0:
+            self.queue = queue.Queue(maxsize=depth)
+            self.thread = threading.Thread(target=self._run, name="post-writer", daemon=True)
+            self.thread.start()
+
+    def _execute(self, key, func, args):
+        try:
+            self.results.append((key, func(*args), None))
+        except Exception as e:
+            self.results.append((key, None, e))
+
+    def _run(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                return
+            self._execute(*task)
+
+    def submit(self, key, func, *args):
+        """
+        提交写入任务
+
+        Args:
+            key: 任务标识，与结果一起返回
+            func: 写入函数
+            args: 写入函数的参数
+        """
+        if self.queue is None:
+            self._execute(key, func, args)
+        else:
+            self.queue.put((key, context.bind(func), args))
+
+    def close(self):
+        """
+        等待所有任务完成
+
+        Returns:
+            列表 [(任务标识, 返回值, 异常)]
+        """
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        results, self.results = self.results, []
+        return results
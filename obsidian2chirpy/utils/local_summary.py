@@ -0,0 +1,173 @@
+"""
+本地摘要模块
+不依赖网络，使用TF-IDF和TextRank从正文中抽取关键句作为摘要
+安装了NumPy时使用向量化计算，否则使用纯Python实现
+"""
+
+import math
+import re
+
+from ..utils import text_utils
+from ..utils import summary_input
+
+# 参与排序的最大句子数，避免超长笔记的相似度矩阵过大
+MAX_SENTENCES = 200
+
+# TextRank的阻尼系数和迭代次数
+DAMPING = 0.85
+ITERATIONS = 30
+
+
+def split_sentences(text):
+    """
+    按中英文句末标点和换行切分句子，过滤掉过短的片段
+    """
+    sentences = []
+    for line in text.split('\n'):
+        # 去掉公式等内容后会留下连续的空白，合并为一个空格
+        line = re.sub(r'\s+', ' ', line).strip()
+        if not line:
+            continue
+        for sentence in re.split(r'(?<=[。！？!?；;])|(?<=\.)\s+', line):
+            sentence = sentence.strip()
+            if len(sentence) >= 8:
+                sentences.append(sentence)
+    return sentences
+
+
+def _tfidf_vectors(token_lists):
+    """
+    计算每个句子的TF-IDF向量（稀疏字典形式）
+    """
+    doc_freq = {}
+    for tokens in token_lists:
+        for token in set(tokens):
+            doc_freq[token] = doc_freq.get(token, 0) + 1
+
+    count = len(token_lists)
+    vectors = []
+    for tokens in token_lists:
+        vector = {}
+        for token in tokens:
+            vector[token] = vector.get(token, 0) + 1
+        for token in vector:
+            vector[token] *= math.log((1 + count) / (1 + doc_freq[token])) + 1
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        vectors.append({token: v / norm for token, v in vector.items()})
+    return vectors
+
+
+def _rank_numpy(np, vectors):
+    vocabulary = {}
+    for vector in vectors:
+        for token in vector:
+            vocabulary.setdefault(token, len(vocabulary))
+
+    matrix = np.zeros((len(vectors), max(len(vocabulary), 1)))
+    for i, vector in enumerate(vectors):
+        for token, value in vector.items():
+            matrix[i, vocabulary[token]] = value
+
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0.0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    row_sums[row_sums == 0] = 1.0
+    transition = similarity / row_sums
+
+    count = len(vectors)
+    scores = np.full(count, 1.0 / count)
+    for _ in range(ITERATIONS):
+        scores = (1 - DAMPING) / count + DAMPING * transition.T @ scores
+    return scores.tolist()
+
+
+def _rank_python(vectors):
+    count = len(vectors)
+
+    # 通过倒排索引只计算有共同词的句子对的相似度
+    postings = {}
+    for i, vector in enumerate(vectors):
+        for token, value in vector.items():
+            postings.setdefault(token, []).append((i, value))
+    similarity = [{} for _ in range(count)]
+    for entries in postings.values():
+        for i, value_i in entries:
+            row = similarity[i]
+            for j, value_j in entries:
+                if i != j:
+                    row[j] = row.get(j, 0.0) + value_i * value_j
+
+    # 预先计算每个句子的入边权重（已按出边总和归一化）
+    incoming = [[] for _ in range(count)]
+    for j, row in enumerate(similarity):
+        row_sum = sum(row.values())
+        for i, value in row.items():
+            incoming[i].append((j, value / row_sum))
+
+    scores = [1.0 / count] * count
+    for _ in range(ITERATIONS):
+        scores = [
+            (1 - DAMPING) / count + DAMPING * sum(weight * scores[j] for j, weight in edges)
+            for edges in incoming
+        ]
+    return scores
+
+
+def rank_sentences(sentences):
+    """
+    使用TextRank对句子排序
+
+    Args:
+        sentences: 句子列表
+
+    Returns:
+        与句子一一对应的得分列表
+    """
+    vectors = _tfidf_vectors([text_utils.tokenize(sentence) for sentence in sentences])
+    # NumPy 导入较慢，只在实际生成本地摘要时导入，不影响程序启动
+    try:
+        import numpy as np
+    except ImportError:
+        return _rank_python(vectors)
+    return _rank_numpy(np, vectors)
+
+
+def generate_local_summary(content, max_length=150):
+    """
+    从正文中抽取最重要的句子组成摘要，完全在本地运行
+
+    Args:
+        content: 要生成摘要的文章内容
+        max_length: 摘要最大长度(字符数)
+
+    Returns:
+        生成的摘要字符串，如果正文中没有可用的句子则返回None
+    """
+    sentences = split_sentences(summary_input.clean_for_summary(content))[:MAX_SENTENCES]
+    if not sentences:
+        return None
+    if len(sentences) == 1:
+        return sentences[0][:max_length]
+
+    scores = rank_sentences(sentences)
+    ranked = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)
+
+    # 按得分依次选取句子，直到达到最大长度，再按原文顺序输出
+    selected = []
+    total_length = 0
+    for index in ranked:
+        length = len(sentences[index])
+        if selected and total_length + length > max_length:
+            continue
+        selected.append(index)
+        total_length += length
+        if total_length >= max_length:
+            break
+
+    summary = "".join(
+        sentences[i] if re.search(rf'{text_utils.CJK_PATTERN}$|[。！？；]$', sentences[i]) else sentences[i] + " "
+        for i in sorted(selected)
+    ).strip()
+    if len(summary) > max_length:
+        summary = summary[:max_length-3] + "..."
+    return summary
@@ -0,0 +1,88 @@
+"""
+文件锁工具
+使用 fcntl 建议锁保护状态文件和文章的写入，多个转换进程（定时任务、手动运行）可以同时运行
+读取状态文件时加共享锁，写入时加排他锁。锁文件统一放在 LOCK_DIR 中，不会出现在_posts目录里；
+释放锁时没有其他持有者就删除锁文件，LOCK_DIR 中不会随文章数量积累锁文件
+不支持 fcntl 的系统（如Windows）上不加锁
+"""
+
+import hashlib
+import os
+from contextlib import contextmanager
+
+from ..config import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def _lock_path(path, lock_dir):
+    """
+    根据被保护文件的绝对路径生成锁文件路径
+    """
+    digest = hashlib.md5(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(lock_dir, f"{os.path.basename(path)}.{digest}.lock")
+
+
+@contextmanager
+def file_lock(path, shared=False, lock_dir=None):
+    """
+    对文件加建议锁，退出 with 语句块时释放
+    同一个文件的锁不可重入，持有锁时不要再调用会对同一文件加锁的函数
+
+    Args:
+        path: 被保护的文件路径
+        shared: 是否加共享锁（读取时使用），否则加排他锁
+        lock_dir: 锁文件目录，默认使用 settings.LOCK_DIR
+
+    Yields:
+        是否等待过其他进程释放锁
+    """
+    if fcntl is None:
+        yield False
+        return
+
+    lock_dir = lock_dir or settings.LOCK_DIR
+    os.makedirs(lock_dir, exist_ok=True)
+    lock_path = _lock_path(path, lock_dir)
+    mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    waited = False
+    while True:
+        lock_file = open(lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            waited = True
+            fcntl.flock(lock_file.fileno(), mode)
+        # 等待期间锁文件可能已被上一个持有者删除，此时锁住的是已删除的文件，需要重新打开
+        if _is_current(lock_file, lock_path):
+            break
+        lock_file.close()
+        waited = True
+
+    try:
+        yield waited
+    finally:
+        # 没有其他进程或线程持有、等待这把锁时删除锁文件；删除时持有排他锁，
+        # 之后打开同一路径的进程会创建新的锁文件
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(lock_path)
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def _is_current(lock_file, lock_path):
+    """
+    检查已打开的锁文件是否仍是 lock_path 指向的文件
+    """
+    try:
+        current = os.stat(lock_path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(lock_file.fileno())
+    return (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino)
@@ -0,0 +1,131 @@
+"""
+摘要输入预处理模块
+一次扫描删除数学公式、代码、callout语法和链接目标，
+再按令牌预算挑选信息量最大的段落作为摘要输入
+"""
+
+import math
+import re
+
+from ..config import settings
+from ..utils import text_utils
+
+# 一次扫描匹配所有需要清理的Markdown语法，按分组名决定替换方式
+CLEANUP_PATTERN = re.compile(
+    r'(?P<code_block>```.*?```|~~~.*?~~~)'
+    r'|(?P<math_block>\$\$.*?\$\$|\\\\?\[.*?\\\\?\])'
+    r'|(?P<inline_code>`[^`\n]*`)'
+    r'|(?P<inline_math>\$[^$\n]+\$|\\\\?\(.*?\\\\?\))'
+    r'|(?P<html><[^>\n]*>)'
+    r'|(?P<embed>!\[\[[^\]]*\]\]|!\[[^\]]*\]\([^)]*\))'
+    r'|\[\[(?:[^|\]]*\|)?(?P<wiki_text>[^\]]*)\]\]'
+    r'|\[(?P<link_text>[^\]]*)\]\([^)]*\)'
+    r'|(?P<callout>\[\s*!\s*[^\]]*\][+-]?)'
+    r'|^(?P<table>[ \t]*\|[^\n]*)$'
+    r'|^(?P<attribute>[ \t]*\{:[^}\n]*\}[ \t]*)$'
+    r'|^(?P<line_prefix>[ \t]*(?:>[ \t]*)*(?:#{1,6}[ \t]+|[-*+][ \t]+|\d+\.[ \t]+)?)'
+    r'|(?P<emphasis>[*_~=]{2,})',
+    re.DOTALL | re.MULTILINE
+)
+
+
+def _replace_markup(match):
+    if match.group('wiki_text') is not None:
+        return match.group('wiki_text')
+    if match.group('link_text') is not None:
+        return match.group('link_text')
+    return ''
+
+
+def clean_for_summary(text):
+    """
+    删除数学公式、代码、HTML、图片、callout标记、表格等不适合作为摘要输入的内容，
+    链接只保留显示文本。所有规则在一次扫描中完成
+
+    Args:
+        text: Markdown正文
+
+    Returns:
+        清理后的纯文本
+    """
+    text = CLEANUP_PATTERN.sub(_replace_markup, text)
+    # 合并清理后留下的多余空行
+    return re.sub(r'\n\s*\n\s*(?:\n\s*)+', '\n\n', text).strip()
+
+
+def select_paragraphs(text, token_budget):
+    """
+    在令牌预算内挑选信息量最大的段落，并按原文顺序输出
+    段落得分为其中各词的逆段落频率之和，再按长度的平方根归一化，第一段额外加权
+
+    Args:
+        text: 清理后的文本
+        token_budget: 令牌预算
+
+    Returns:
+        挑选后的文本
+    """
+    paragraphs = [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+    token_counts = [text_utils.estimate_tokens(p) for p in paragraphs]
+    if sum(token_counts) <= token_budget:
+        return "\n\n".join(paragraphs)
+
+    token_sets = [set(text_utils.tokenize(p)) for p in paragraphs]
+    paragraph_freq = {}
+    for tokens in token_sets:
+        for token in tokens:
+            paragraph_freq[token] = paragraph_freq.get(token, 0) + 1
+
+    count = len(paragraphs)
+    scores = []
+    for i, tokens in enumerate(token_sets):
+        information = sum(math.log((1 + count) / paragraph_freq[token]) for token in tokens)
+        score = information / math.sqrt(token_counts[i])
+        if i == 0:
+            score *= 1.5
+        scores.append(score)
+
+    selected = []
+    used_tokens = 0
+    for i in sorted(range(count), key=lambda i: scores[i], reverse=True):
+        if used_tokens + token_counts[i] > token_budget:
+            continue
+        selected.append(i)
+        used_tokens += token_counts[i]
+
+    # 单个段落就超过预算时，截取得分最高的段落
+    if not selected:
+        best = max(range(count), key=lambda i: scores[i])
+        ratio = token_budget / token_counts[best]
+        return paragraphs[best][:int(len(paragraphs[best]) * ratio)]
+
+    return "\n\n".join(paragraphs[i] for i in sorted(selected))
+
+
+def prepare_summary_input(body, token_budget=None):
+    """
+    摘要输入预处理：清理正文并按令牌预算挑选段落
+
+    Args:
+        body: 不含YAML前置元数据的Markdown正文
+        token_budget: 令牌预算，默认使用 settings.SUMMARY_INPUT_TOKEN_BUDGET
+
+    Returns:
+        元组 (摘要输入文本, 原文估算令牌数, 摘要输入估算令牌数)
+    """
+    token_budget = token_budget or settings.SUMMARY_INPUT_TOKEN_BUDGET
+    prepared = select_paragraphs(clean_for_summary(body), token_budget)
+    return prepared, text_utils.estimate_tokens(body), text_utils.estimate_tokens(prepared)
+
+
+def summary_signature(body):
+    """
+    计算正文的摘要签名，只基于清理后的文本，公式和代码的修改不影响签名
+
+    Args:
+        body: 不含YAML前置元数据的Markdown正文
+
+    Returns:
+        SimHash签名字符串
+    """
+    return text_utils.calculate_simhash(clean_for_summary(body))
@@ -5,6 +5,16 @@
 
 import re
 import time
+import hashlib
+
+# 常见的英文停用词
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'to', 'in', 'on', 'for', 'is', 'are', 'was', 'were',
+    'be', 'by', 'with', 'as', 'at', 'it', 'this', 'that', 'we', 'from', 'which', 'can',
+}
+
+# 汉字的Unicode范围
+CJK_PATTERN = r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]'
 
 
 def format_time_with_limited_seconds(format_str="%Y-%m-%d %H:%M:%S"):
@@ -35,6 +45,102 @@ def format_time_with_limited_seconds(format_str="%Y-%m-%d %H:%M:%S"):
     return time.strftime(format_str, limited_time)
 
 
+def calculate_text_hash(text):
+    """
+    计算文本内容的MD5哈希值
+    
+    Args:
+        text: 文本内容
+    
+    Returns:
+        MD5哈希值字符串
+    """
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def tokenize(sentence):
+    """
+    分词：汉字使用相邻字的二元组，其他语言使用小写单词
+    
+    Args:
+        sentence: 文本内容
+    
+    Returns:
+        词列表
+    """
+    tokens = []
+    for chunk in re.findall(rf'{CJK_PATTERN}+|[A-Za-z][A-Za-z0-9\-]+', sentence):
+        if re.match(CJK_PATTERN, chunk):
+            if len(chunk) == 1:
+                tokens.append(chunk)
+            else:
+                tokens.extend(chunk[i:i + 2] for i in range(len(chunk) - 1))
+        else:
+            word = chunk.lower()
+            if word not in STOPWORDS:
+                tokens.append(word)
+    return tokens
+
+
+def estimate_tokens(text):
+    """
+    粗略估算文本的令牌数：汉字等CJK字符约1个令牌，其他字符约4个字符1个令牌
+    
+    Args:
+        text: 文本内容
+    
+    Returns:
+        估算的令牌数
+    """
+    cjk_count = len(re.findall(r'[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]', text))
+    return cjk_count + (len(text) - cjk_count) // 4 + 1
+
+
+def calculate_simhash(text):
+    """
+    计算文本的64位SimHash签名，内容相近的文本签名的汉明距离也很小
+    
+    Args:
+        text: 文本内容
+    
+    Returns:
+        16位十六进制签名字符串
+    """
+    weights = [0] * 64
+    token_counts = {}
+    for token in tokenize(text):
+        token_counts[token] = token_counts.get(token, 0) + 1
+    
+    for token, count in token_counts.items():
+        token_hash = int(hashlib.md5(token.encode('utf-8')).hexdigest()[:16], 16)
+        for bit in range(64):
+            weights[bit] += count if token_hash >> bit & 1 else -count
+    
+    signature = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            signature |= 1 << bit
+    return f"{signature:016x}"
+
+
+def simhash_similarity(signature_a, signature_b):
+    """
+    根据两个SimHash签名的汉明距离计算相似度
+    
+    Args:
+        signature_a: 十六进制签名
+        signature_b: 十六进制签名
+    
+    Returns:
+        0到1之间的相似度，签名无效时返回0
+    """
+    try:
+        distance = bin(int(signature_a, 16) ^ int(signature_b, 16)).count('1')
+    except (TypeError, ValueError):
+        return 0.0
+    return 1 - distance / 64
+
+
 def extract_date_from_content(text):
     """
     从文档内容中提取日期信息
@@ -147,4 +253,78 @@ def convert_wiki_links(text):
     # 再匹配单独的[[xxx]]格式，包括可能带有#的内部链接
     text = re.sub(r'\[\[(.*?)\]\]', r'*\1*', text)
     
-    return text
\ No newline at end of file
+    return text
+
+def read_frontmatter(file_path, max_bytes=65536):
+    """
+    只读取文件开头的YAML前置元数据，遇到结束的 --- 即停止读取，不读取正文
+    
+    Args:
+        file_path: 文件路径
+        max_bytes: 最多读取的字节数，超过仍未找到结束分隔符则视为无元数据
+    
+    Returns:
+        YAML元数据内容（不含 --- 分隔行），如果没有元数据则返回空字符串
+    """
+    read_bytes = 0
+    yaml_lines = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        first_line = f.readline(max_bytes)
+        if first_line.strip() != '---':
+            return ""
+        read_bytes += len(first_line.encode('utf-8'))
+        
+        while read_bytes < max_bytes:
+            line = f.readline(max_bytes - read_bytes)
+            if not line:
+                break
+            read_bytes += len(line.encode('utf-8'))
+            if line.strip() == '---':
+                return "".join(yaml_lines)
+            yaml_lines.append(line)
+    
+    # 没有找到结束分隔符
+    return ""
+
+
+def parse_frontmatter_fields(yaml_content):
+    """
+    从YAML元数据中解析常用字段，只做轻量的逐行匹配
+    
+    Args:
+        yaml_content: YAML元数据内容
+    
+    Returns:
+        字典 {title, date, categories, has_description, summary_pending, final_version, summary_simhash, publish, tags}
+    """
+    title_match = re.search(r'^title:\s*"?(.*?)"?\s*$', yaml_content, re.MULTILINE)
+    date_match = re.search(r'^date:\s*(.*?)\s*$', yaml_content, re.MULTILINE)
+    categories_match = re.search(r'^categories:\s*\[(.*?)\]', yaml_content, re.MULTILINE)
+    simhash_match = re.search(r'^summary_simhash:\s*([0-9a-fA-F]+)', yaml_content, re.MULTILINE)
+    
+    categories = []
+    if categories_match:
+        categories = [c.strip().strip('\'"') for c in categories_match.group(1).split(',') if c.strip()]
+    
+    # 标签可以写成 tags: [a, b]、tags: a, b 或YAML列表，去掉Obsidian标签前的 #
+    tags = []
+    tags_match = re.search(r'^tags?:[ \t]*(.*?)\s*$', yaml_content, re.MULTILINE)
+    if tags_match:
+        if tags_match.group(1):
+            values = re.split(r'[,\s]+', tags_match.group(1).strip('[]'))
+        else:
+            list_match = re.match(r'(?:\n[ \t]*-[ \t]*.*)*', yaml_content[tags_match.end():])
+            values = re.findall(r'-[ \t]*(.*)', list_match.group(0))
+        tags = [t.strip().strip('\'"').lstrip('#') for t in values if t.strip().strip('\'"').lstrip('#')]
+    
+    return {
+        'title': title_match.group(1) if title_match else "",
+        'date': date_match.group(1) if date_match else "",
+        'categories': categories,
+        'has_description': bool(re.search(r'^description:', yaml_content, re.MULTILINE)),
+        'summary_pending': bool(re.search(r'^summary_pending\s*:\s*true\s*$', yaml_content, re.MULTILINE)),
+        'final_version': bool(re.search(r'final_version\s*:\s*true', yaml_content, re.IGNORECASE)),
+        'summary_simhash': simhash_match.group(1) if simhash_match else "",
+        'publish': bool(re.search(r'^publish\s*:\s*(true|yes)\s*$', yaml_content, re.MULTILINE | re.IGNORECASE)),
+        'tags': tags,
+    }
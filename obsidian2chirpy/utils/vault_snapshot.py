@@ -0,0 +1,176 @@
+"""
+笔记库快照模块
+保存每个目录的修改时间、文件列表以及各文件的修改时间和大小，刷新时只有新增或修改过的文件需要计算哈希值
+
+目录的修改时间只在其中直接增删、重命名条目时变化，在编辑器中直接修改文件内容、或修改子目录中的内容都不会改变它，
+因此无法根据上层目录跳过整个子树：刷新时仍会遍历并 stat 每个目录，节省的是读取目录列表和计算哈希值
+- 默认：修改时间未变的目录不再读取文件列表，但仍会 stat 其中的每个文件
+- SNAPSHOT_TRUST_DIRECTORY_MTIME：修改时间未变的目录中的文件也不再 stat，只适用于以"写临时文件再重命名"方式保存的编辑器，
+  直接覆盖写入的修改会被漏掉
+"""
+
+import json
+import os
+
+from ..config import settings
+from ..utils import crawler, icloud, lock_utils
+
+
+class VaultSnapshot:
+    """
+    笔记库目录树快照
+    """
+
+    def __init__(self, root, snapshot_path=None):
+        self.root = root
+        snapshot_path = snapshot_path or settings.SNAPSHOT_PATH
+        self.snapshot_path = snapshot_path
+        self.patterns = crawler.load_ignore_patterns(root)
+        self.old_dirs = {}
+        self.dirs = {}
+        try:
+            if os.path.exists(snapshot_path):
+                with lock_utils.file_lock(snapshot_path, shared=True):
+                    with open(snapshot_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                # 源文件夹改变后旧快照无效
+                if data.get('root') == root:
+                    self.old_dirs = data.get('dirs', {})
+        except Exception as e:
+            print(f"读取笔记库快照失败: {e}")
+
+    def _list_directory(self, path, relative_dir):
+        """
+        读取目录中未被忽略的Markdown文件和子目录
+
+        Returns:
+            元组 ({文件名: [修改时间, 大小]}, [子目录名])
+        """
+        files = {}
+        subdirectories = []
+        for entry in crawler._scan_directory(path):
+            try:
+                is_dir = entry.is_dir()
+                if is_dir and entry.is_symlink():
+                    continue
+            except OSError:
+                continue
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            if crawler.is_ignored(entry.name, relative_path, is_dir, self.patterns):
+                continue
+            if is_dir:
+                subdirectories.append(entry.name)
+                continue
+            # iCloud占位文件按对应的笔记名记录，占位文件的状态变化时笔记视为修改过
+            name = entry.name
+            target = icloud.placeholder_target(name)
+            if target and target.lower().endswith(crawler.MARKDOWN_EXTENSIONS):
+                name = target
+            elif not name.lower().endswith(crawler.MARKDOWN_EXTENSIONS):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files[name] = [stat.st_mtime, stat.st_size]
+        return files, sorted(subdirectories)
+
+    def refresh(self):
+        """
+        刷新快照，找出自上次保存快照以来新增或修改过的文件
+
+        Returns:
+            元组 (所有Markdown文件路径列表, 新增或修改过的文件路径集合)
+        """
+        all_files = []
+        changed_files = set()
+        self.dirs = {}
+        scanned_count = 0
+        stat_count = 0
+
+        def visit(path, relative_dir):
+            nonlocal scanned_count, stat_count
+            try:
+                dir_mtime = os.stat(path).st_mtime
+            except OSError:
+                return
+            old = self.old_dirs.get(relative_dir)
+            unchanged = old is not None and old['mtime'] == dir_mtime
+
+            if unchanged and settings.SNAPSHOT_TRUST_DIRECTORY_MTIME:
+                # 目录修改时间未变，沿用上次的文件列表和文件状态
+                files = old['files']
+                subdirectories = old['dirs']
+            elif unchanged:
+                # 目录修改时间未变，文件列表不变，只需检查各文件的修改时间和大小
+                files = {}
+                stat_count += len(old['files'])
+                for name in old['files']:
+                    try:
+                        stat = os.stat(os.path.join(path, name))
+                    except FileNotFoundError:
+                        # 笔记被移出本地后只剩占位文件
+                        try:
+                            stat = os.stat(icloud.placeholder_path(os.path.join(path, name)))
+                        except OSError:
+                            continue
+                    except OSError:
+                        continue
+                    files[name] = [stat.st_mtime, stat.st_size]
+                subdirectories = old['dirs']
+            else:
+                files, subdirectories = self._list_directory(path, relative_dir)
+                scanned_count += 1
+                stat_count += len(files)
+
+            old_files = old['files'] if old else {}
+            for name, state in files.items():
+                file_path = os.path.join(path, name)
+                all_files.append(file_path)
+                if old_files.get(name) != state:
+                    changed_files.add(file_path)
+
+            self.dirs[relative_dir] = {
+                'mtime': dir_mtime,
+                'files': files,
+                'dirs': subdirectories,
+            }
+            # 子目录的修改不会反映到本目录的修改时间，每个子目录都要检查
+            for name in subdirectories:
+                visit(os.path.join(path, name), f"{relative_dir}/{name}" if relative_dir else name)
+
+        visit(self.root, "")
+        print(f"笔记库快照：{len(all_files)} 个文件，{len(changed_files)} 个新增或修改；"
+              f"检查了 {len(self.dirs)} 个目录，重新读取了 {scanned_count} 个目录，检查了 {stat_count} 个文件的状态")
+        return all_files, changed_files
+
+    def forget(self, file_path):
+        """
+        从快照中移除一个文件，下次刷新时该文件会被视为新文件
+        用于处理失败的文件，保证下次运行时重新处理
+
+        Args:
+            file_path: 文件路径
+        """
+        directory, name = os.path.split(file_path)
+        relative_dir = os.path.relpath(directory, self.root).replace(os.sep, '/')
+        if relative_dir == '.':
+            relative_dir = ""
+        entry = self.dirs.get(relative_dir)
+        if entry:
+            entry['files'].pop(name, None)
+            # 目录修改时间置空，下次刷新时重新读取该目录
+            entry['mtime'] = None
+
+    def save(self):
+        """
+        保存快照
+        """
+        try:
+            with lock_utils.file_lock(self.snapshot_path):
+                temp_path = self.snapshot_path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'root': self.root, 'dirs': self.dirs}, f, ensure_ascii=False)
+                os.replace(temp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"保存笔记库快照失败: {e}")
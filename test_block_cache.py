@@ -0,0 +1,144 @@
+"""
+测试区块缓存
+- 修改一个区块后再次转换，只重新转换该区块，结果与整篇转换相同
+- 设置或处理器版本变化时缓存失效，所有区块重新转换
+- 每篇笔记的缓存单独保存，保存时只写入转换过的笔记，新的缓存实例只读取用到的笔记
+"""
+
+import os
+
+import pytest
+
+from obsidian2chirpy.config import context
+from obsidian2chirpy.core import block_cache as block_cache_module
+from obsidian2chirpy.core.block_cache import BlockCache
+from obsidian2chirpy.processors import markdown_processor
+
+FRONTMATTER = "---\ncreated: 2025-01-01 10:00:00\n---\n"
+
+# 每个区块都以普通文字开头，切分点之后的 >、$ 会与上一个区块合并
+BLOCKS = [
+    "# 标题\n\n",
+    "第一段，含有公式 $x$。\n\n",
+    "提示如下：\n>[!tip] 提示\n>内容 $y$\n\n",
+    "公式块：\n$$\na=b\n$$\n\n",
+    "最后一段，含有 [[链接|别名]]。\n",
+]
+
+
+@pytest.fixture
+def values(tmp_path):
+    values = context.snapshot(
+        DECISIONS_FILE_PATH=os.path.join(tmp_path, "callout_decisions.json"),
+        BLOCK_CACHE_DIR=os.path.join(tmp_path, "block_cache"),
+        CALLOUT_DEFAULT_DECISION="I",
+        ENABLE_AUTO_SUMMARY=False,
+    )
+    with context.use(values):
+        yield values
+
+
+@pytest.fixture
+def converted_blocks(monkeypatch):
+    """
+    记录每次实际转换的区块
+    """
+    blocks = []
+    original = block_cache_module.convert_block
+
+    def convert_block(block, file_path=None, strict=True):
+        blocks.append(block)
+        return original(block, file_path, strict)
+
+    monkeypatch.setattr(block_cache_module, "convert_block", convert_block)
+    return blocks
+
+
+def convert(cache, text, file_path):
+    """
+    分别按区块和整篇转换，两者应相同
+    """
+    blockwise = markdown_processor.process_and_format_md(text, file_path, block_cache=cache)
+    assert blockwise == markdown_processor.process_and_format_md(text, file_path)
+    return blockwise
+
+
+def test_editing_one_block_reconverts_only_that_block(values, converted_blocks, tmp_path):
+    cache = BlockCache()
+    note = os.path.join(tmp_path, "note.md")
+    convert(cache, FRONTMATTER + "".join(BLOCKS), note)
+    # YAML头部单独作为一个区块
+    assert converted_blocks[1:] == BLOCKS
+
+    converted_blocks.clear()
+    edited = list(BLOCKS)
+    edited[1] = "第一段，修改后的公式 $z$。\n\n"
+    convert(cache, FRONTMATTER + "".join(edited), note)
+    assert converted_blocks == [edited[1]]
+
+
+def test_unchanged_note_reuses_every_block(values, converted_blocks, tmp_path):
+    cache = BlockCache()
+    note = os.path.join(tmp_path, "note.md")
+    text = FRONTMATTER + "".join(BLOCKS)
+    convert(cache, text, note)
+    converted_blocks.clear()
+    convert(cache, text, note)
+    assert converted_blocks == []
+
+
+def test_block_with_unclosed_math_is_merged_with_the_next_block(values, tmp_path):
+    cache = BlockCache()
+    note = os.path.join(tmp_path, "note.md")
+    text = FRONTMATTER + "段落 $x\n\n继续 y$ 结束\n\n最后一段。\n"
+    convert(cache, text, note)
+    convert(cache, text.replace("最后一段", "修改后的最后一段"), note)
+
+
+def test_settings_change_invalidates_cached_blocks(values, converted_blocks, tmp_path):
+    cache = BlockCache()
+    note = os.path.join(tmp_path, "note.md")
+    text = FRONTMATTER + "".join(BLOCKS)
+    convert(cache, text, note)
+    block_count = len(converted_blocks)
+
+    converted_blocks.clear()
+    values['CALLOUT_TYPE_MAPPING'] = dict(values['CALLOUT_TYPE_MAPPING'], tip="warning")
+    result = convert(cache, text, note)
+    assert len(converted_blocks) == block_count
+    assert "{: .prompt-warning}" in result
+
+
+def test_processor_version_change_invalidates_cached_blocks(values, converted_blocks, monkeypatch, tmp_path):
+    cache = BlockCache()
+    note = os.path.join(tmp_path, "note.md")
+    text = FRONTMATTER + "".join(BLOCKS)
+    convert(cache, text, note)
+    block_count = len(converted_blocks)
+
+    converted_blocks.clear()
+    monkeypatch.setattr(markdown_processor, "VERSION", markdown_processor.VERSION + 1)
+    convert(cache, text, note)
+    assert len(converted_blocks) == block_count
+
+
+def test_save_writes_only_converted_notes(values, converted_blocks, tmp_path):
+    notes = [os.path.join(tmp_path, f"note{index}.md") for index in range(3)]
+    cache = BlockCache()
+    for note in notes:
+        convert(cache, FRONTMATTER + "".join(BLOCKS), note)
+    cache.save()
+    cache_dir = values['BLOCK_CACHE_DIR']
+    assert len(os.listdir(cache_dir)) == len(notes)
+    mtimes = {name: os.stat(os.path.join(cache_dir, name)).st_mtime_ns for name in os.listdir(cache_dir)}
+
+    # 新的缓存实例只读取转换的笔记，修改一个区块后只重写该笔记的缓存文件
+    converted_blocks.clear()
+    cache = BlockCache()
+    edited = FRONTMATTER + "".join(BLOCKS[:-1]) + "修改后的最后一段。\n"
+    convert(cache, edited, notes[0])
+    assert list(cache.entries) == [notes[0]]
+    assert converted_blocks == ["修改后的最后一段。\n"]
+    cache.save()
+    changed = [name for name in os.listdir(cache_dir) if os.stat(os.path.join(cache_dir, name)).st_mtime_ns != mtimes[name]]
+    assert changed == [os.path.basename(cache._entry_path(notes[0]))]
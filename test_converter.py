@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+测试在多个线程中同时使用设置不同的转换器
+每个转换器的转换结果只使用自己的设置，文章写入自己的_posts目录，
+步骤统计、AI用量和callout决策缓存只属于自己，结束后全局的 settings、统计和缓存不受影响，
+转换结束后不再保留笔记的锁
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import types
+
+from obsidian2chirpy.config import settings
+from obsidian2chirpy.core import cache_key
+from obsidian2chirpy.core.converter import Converter
+from obsidian2chirpy.processors import markdown_processor
+
+# 每个转换器在各自线程中转换的次数
+ROUNDS = 200
+
+NOTE = "---\ncreated: 2025-01-01 10:00:00\n---\n>[!tip] 提示\n>内容\n\n公式 $x$\n"
+
+
+def make_converter(temp_dir, name, tip_type):
+    """
+    创建转换器，使用各自的标题、callout映射和博客目录
+    """
+    mapping = dict(settings.CALLOUT_TYPE_MAPPING, tip=tip_type)
+    source_folder = os.path.join(temp_dir, name, "notes")
+    posts_root = os.path.join(temp_dir, name, "site", "_posts")
+    os.makedirs(source_folder)
+    os.makedirs(posts_root)
+    return Converter(
+        SOURCE_FOLDER=source_folder,
+        POSTS_ROOT=posts_root,
+        DECISIONS_FILE_PATH=os.path.join(temp_dir, name, "callout_decisions.json"),
+        DEFAULT_TITLE=f"标题{name}",
+        CALLOUT_TYPE_MAPPING=mapping,
+        ENABLE_AUTO_SUMMARY=False,
+        ENABLE_BLOCK_CACHE=False,
+    )
+
+
+def run_converter(converter, name, tip_type, barrier, problems):
+    """
+    在线程中反复转换同一篇笔记，检查结果是否使用该转换器的设置
+    """
+    barrier.wait()
+    for _ in range(ROUNDS):
+        text = converter.convert_text(NOTE)
+        if f'title: "标题{name}"' not in text or f"{{: .prompt-{tip_type}}}" not in text:
+            problems.append(f"转换器 {name} 的转换结果没有使用自己的设置：{text!r}")
+            return
+    note_path = os.path.join(converter.settings['SOURCE_FOLDER'], f"笔记{name}.md")
+    with open(note_path, 'w', encoding='utf-8') as f:
+        f.write(NOTE)
+    post_path = converter.convert_file(note_path)
+    if os.path.dirname(post_path) != converter.settings['OUTPUT_FOLDER']:
+        problems.append(f"转换器 {name} 的文章没有写入自己的_posts目录：{post_path}")
+
+
+def check_converter():
+    """
+    在两个线程中同时使用两个设置不同的转换器
+
+    Returns:
+        问题列表，为空表示通过
+    """
+    problems = []
+    global_stats = {name: list(values) for name, values in markdown_processor.stage_stats.items()}
+    global_title = settings.DEFAULT_TITLE
+    global_decisions = dict(cache_key._decisions_cache.default)
+    with tempfile.TemporaryDirectory() as temp_dir, contextlib.redirect_stdout(io.StringIO()):
+        cases = [("A", "tip"), ("B", "warning")]
+        converters = [make_converter(temp_dir, name, tip_type) for name, tip_type in cases]
+        barrier = threading.Barrier(len(cases))
+        threads = [
+            threading.Thread(target=run_converter, args=(converter, name, tip_type, barrier, problems))
+            for converter, (name, tip_type) in zip(converters, cases)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for converter in converters:
+            converter.close()
+
+    # convert_text 转换 ROUNDS 次，convert_file 再转换一次
+    for converter, (name, _) in zip(converters, cases):
+        runs = converter.stage_stats.get("callouts", [0, 0, 0.0])[0]
+        if runs != ROUNDS + 1:
+            problems.append(f"转换器 {name} 的步骤统计记录了 {runs} 次callout转换，应为 {ROUNDS + 1} 次")
+        if converter.usage_tracker.request_count:
+            problems.append(f"转换器 {name} 的AI用量记录了不存在的请求")
+        if converter.file_locks:
+            problems.append(f"转换器 {name} 转换结束后仍保留 {len(converter.file_locks)} 个笔记锁")
+    if markdown_processor.stage_stats != global_stats:
+        problems.append("转换器的步骤统计写入了全局的 stage_stats")
+    if cache_key._decisions_cache.default != global_decisions:
+        problems.append("转换器的callout决策缓存写入了全局的缓存")
+    if type(settings) is not types.ModuleType:
+        problems.append("转换器结束后 settings 仍在按线程查找设置")
+    if settings.DEFAULT_TITLE != global_title:
+        problems.append("转换器修改了全局的设置")
+    return problems
+
+
+def test_converter():
+    """测试多个线程同时使用设置不同的转换器"""
+    problems = check_converter()
+    assert not problems, "\n".join(problems)
+
+
+if __name__ == "__main__":
+    problems = check_converter()
+    if problems:
+        print("\n❌ 转换器检查未通过:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print(f"✅ 转换器检查通过：两个设置不同的转换器在两个线程中各转换 {ROUNDS} 次，结果和统计互不影响")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+测试守护进程的转换请求
+只转换源文件夹中自动处理时也会发布的笔记：源文件夹之外的文件（包括通过符号链接指向外部的文件）、
+被忽略规则排除的笔记，以及开启发布筛选时不符合发布规则的笔记都会被拒绝；转换出错时记录失败
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+from obsidian2chirpy.config import context
+from obsidian2chirpy.core.daemon import ConversionDaemon
+
+NOTE = "---\ncreated: 2025-03-01 10:00:00\n{extra}---\n\n正文\n"
+
+
+def write_note(path, extra=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(NOTE.format(extra=extra))
+    return path
+
+
+def request(daemon, path):
+    """
+    发送 convert 请求
+
+    Returns:
+        元组 (是否成功, 结果或错误信息)
+    """
+    response = daemon.dispatch(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "convert", "params": [path]}))
+    if "error" in response:
+        return False, response["error"]["message"]
+    return True, response["result"]
+
+
+def make_daemon(temp_dir, **overrides):
+    """
+    在临时的笔记库和博客目录中启动守护进程（不监听套接字）
+    """
+    values = context.snapshot(
+        SOURCE_FOLDER=os.path.join(temp_dir, "vault"),
+        POSTS_ROOT=os.path.join(temp_dir, "site", "_posts"),
+        DECISIONS_FILE_PATH=os.path.join(temp_dir, "site", "callout_decisions.json"),
+        ENABLE_AUTO_SUMMARY=False,
+        **overrides,
+    )
+    os.makedirs(values['POSTS_ROOT'], exist_ok=True)
+    with context.use(values):
+        return ConversionDaemon()
+
+
+def check_daemon():
+    """
+    检查守护进程拒绝的路径和失败记录
+
+    Returns:
+        问题列表，为空表示通过
+    """
+    problems = []
+    with tempfile.TemporaryDirectory() as temp_dir, contextlib.redirect_stdout(io.StringIO()):
+        vault = os.path.join(temp_dir, "vault")
+        allowed = write_note(os.path.join(vault, "物理", "笔记.md"), "publish: true\n")
+        unflagged = write_note(os.path.join(vault, "物理", "未标记.md"))
+        drafted = write_note(os.path.join(vault, "草稿", "草稿笔记.md"), "publish: true\n")
+        outside = write_note(os.path.join(temp_dir, "outside", "外部.md"), "publish: true\n")
+        linked = os.path.join(vault, "链接.md")
+        os.symlink(outside, linked)
+        with open(os.path.join(vault, ".o2cignore"), 'w', encoding='utf-8') as f:
+            f.write("草稿/\n")
+
+        daemon = make_daemon(temp_dir)
+        try:
+            ok, result = request(daemon, allowed)
+            if not ok:
+                problems.append(f"没有转换源文件夹中的笔记：{result}")
+            for path, label in ((outside, "源文件夹之外的文件"), (linked, "指向源文件夹之外的符号链接"), (drafted, "被忽略规则排除的笔记")):
+                ok, _ = request(daemon, path)
+                if ok:
+                    problems.append(f"转换了{label}")
+            ok, _ = request(daemon, unflagged)
+            if not ok:
+                problems.append("未开启发布筛选时拒绝了没有发布标记的笔记")
+
+            # 转换时抛出的任何异常都计入失败
+            def convert_file(path):
+                raise OSError("磁盘已满")
+            daemon.converter.convert_file = convert_file
+            request(daemon, allowed)
+            status = daemon.status()
+            if status["failed"] != 1 or status["last_error"] != "磁盘已满":
+                problems.append(f"转换出错时没有记录失败：{status}")
+        finally:
+            daemon.close()
+
+        daemon = make_daemon(temp_dir, PUBLISH_FILTER=True)
+        try:
+            ok, _ = request(daemon, unflagged)
+            if ok:
+                problems.append("开启发布筛选时转换了不符合发布规则的笔记")
+            ok, result = request(daemon, allowed)
+            if not ok:
+                problems.append(f"开启发布筛选时没有转换符合发布规则的笔记：{result}")
+        finally:
+            daemon.close()
+
+        posts = [name for _, _, names in os.walk(os.path.join(temp_dir, "site", "_posts")) for name in names]
+        if any("外部" in name or "草稿" in name for name in posts):
+            problems.append(f"被拒绝的笔记写入了_posts目录：{posts}")
+    return problems
+
+
+def test_daemon():
+    """测试守护进程只转换允许发布的笔记"""
+    problems = check_daemon()
+    assert not problems, "\n".join(problems)
+
+
+if __name__ == "__main__":
+    problems = check_daemon()
+    if problems:
+        print("\n❌ 守护进程检查未通过:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("✅ 守护进程检查通过")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+测试iCloud占位文件的处理
+- 合并哈希记录时保留只剩占位文件的笔记的记录，否则这些笔记每次运行都会被当作新笔记重新下载、转换
+- 下载命令的进程在下载完成或超时后被回收，同时运行的下载命令不超过上限
+"""
+
+import os
+import sys
+import tempfile
+
+from obsidian2chirpy.config import context
+from obsidian2chirpy.utils import file_utils, icloud
+
+# 模拟下载命令：稍等片刻后用笔记替换占位文件
+FAKE_DOWNLOAD_SCRIPT = (
+    "import os, sys, time\n"
+    "path = sys.argv[1]\n"
+    "directory, name = os.path.split(path)\n"
+    "time.sleep(0.2)\n"
+    "open(path, 'w').write('# note\\n')\n"
+    "os.remove(os.path.join(directory, '.' + name + '.icloud'))\n"
+)
+
+# 模拟下载的笔记数和同时运行的下载命令数上限
+NOTE_COUNT = 6
+MAX_PROCESSES = 2
+
+
+def evict(path):
+    """
+    把笔记替换为iCloud占位文件
+    """
+    os.rename(path, icloud.placeholder_path(path))
+
+
+def check_compaction(temp_dir):
+    """
+    检查合并哈希记录时是否保留被移出本地的笔记的记录
+
+    Returns:
+        问题列表
+    """
+    hash_path = os.path.join(temp_dir, "file_hash_record.txt")
+    journal_path = os.path.join(temp_dir, "file_hash_journal.txt")
+    notes = {name: os.path.join(temp_dir, f"{name}.md") for name in ("note1", "note2", "note3")}
+    for path in notes.values():
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("# note\n")
+
+    file_utils.append_hash_journal(journal_path, notes["note1"], "hash1")
+    file_utils.append_hash_journal(journal_path, notes["note2"], "hash2")
+    file_utils.append_hash_journal(journal_path, notes["note3"], "hash3")
+    evict(notes["note1"])
+    os.remove(notes["note3"])
+    file_utils.compact_file_hashes(hash_path, journal_path)
+
+    records = file_utils.load_file_hashes(hash_path)
+    problems = []
+    if records.get(notes["note1"]) != "hash1":
+        problems.append("合并哈希记录时删除了只剩占位文件的笔记的记录")
+    if records.get(notes["note2"]) != "hash2":
+        problems.append("合并哈希记录时丢失了本地笔记的记录")
+    if notes["note3"] in records:
+        problems.append("合并哈希记录时没有删除已删除笔记的记录")
+    return problems
+
+
+def check_downloads(temp_dir):
+    """
+    检查下载命令的并发数和进程回收
+
+    Returns:
+        问题列表
+    """
+    notes = [os.path.join(temp_dir, f"evicted{i}.md") for i in range(NOTE_COUNT)]
+    for path in notes:
+        with open(icloud.placeholder_path(path), 'w', encoding='utf-8') as f:
+            f.write("")
+
+    # 记录启动的下载进程，以及启动时仍在运行的进程数
+    processes = []
+    running_counts = []
+    original_start_download = icloud.start_download
+
+    def start_download(path):
+        running_counts.append(sum(1 for process in processes if process.poll() is None))
+        process = original_start_download(path)
+        processes.append(process)
+        return process
+
+    values = context.snapshot(
+        ICLOUD_DOWNLOAD_COMMAND=[sys.executable, "-c", FAKE_DOWNLOAD_SCRIPT],
+        ICLOUD_DOWNLOAD_TIMEOUT=30,
+    )
+    icloud.start_download = start_download
+    try:
+        with context.use(values):
+            waiter = icloud.DownloadWaiter(notes, max_processes=MAX_PROCESSES)
+            ready = [path for batch in waiter.batches(interval=0.05) for path in batch]
+    finally:
+        icloud.start_download = original_start_download
+
+    problems = []
+    if sorted(ready) != sorted(notes) or waiter.pending:
+        problems.append(f"没有返回所有下载完成的笔记：{len(ready)}/{len(notes)}")
+    if len(processes) != len(notes):
+        problems.append(f"下载命令启动了 {len(processes)} 次，应为 {len(notes)} 次")
+    if max(running_counts, default=0) >= MAX_PROCESSES:
+        problems.append(f"同时运行的下载命令超过上限 {MAX_PROCESSES}")
+    if any(process.returncode is None for process in processes if process):
+        problems.append("有下载命令的进程没有被回收")
+    return problems
+
+
+def check_icloud():
+    """
+    检查iCloud占位文件的处理
+
+    Returns:
+        问题列表，为空表示通过
+    """
+    problems = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        problems.extend(check_compaction(temp_dir))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        problems.extend(check_downloads(temp_dir))
+    return problems
+
+
+def test_icloud():
+    """测试iCloud占位文件的处理"""
+    problems = check_icloud()
+    assert not problems, "\n".join(problems)
+
+
+if __name__ == "__main__":
+    problems = check_icloud()
+    if problems:
+        print("\n❌ iCloud占位文件检查未通过:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("\n✅ iCloud占位文件检查通过")
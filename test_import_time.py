@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+测试命令行程序的启动耗时
+用 python -X importtime 测量导入 main.py 和守护进程客户端的累计耗时，超过预算，
+或在导入时加载了只在生成摘要、运行外部命令时才需要的模块，则测试失败
+预算约为正常耗时的10倍，只有导入时加载了大量模块（如在顶层导入了重量级依赖）才会超过，机器负载造成的波动不会导致失败
+"""
+
+import os
+import subprocess
+import sys
+
+# 导入耗时预算（毫秒），取多次测量中的最小值比较；正常情况下分别约为30毫秒和7毫秒
+IMPORT_TIME_BUDGET_MS = {
+    "main": 300,
+    "obsidian2chirpy.client": 80,
+}
+
+# 导入时不应加载的模块
+LAZY_MODULES = ["requests", "subprocess", "numpy"]
+
+# 每个模块的测量次数
+REPEAT = 5
+
+
+def measure_import(module):
+    """
+    在新的解释器中导入模块，测量导入耗时
+
+    Args:
+        module: 模块名
+
+    Returns:
+        元组 (耗时（毫秒）, 导入过程中加载的模块名集合)
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root, capture_output=True, text=True, check=True
+    )
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), name))
+
+    # 只统计 site 之后的条目，解释器启动时加载的模块不计入
+    site_index = max((index for index, (_, name) in enumerate(entries) if name.strip() == "site"), default=-1)
+    entries = entries[site_index + 1:]
+    # 顶层条目（名称前只有一个空格）的累计耗时之和即为导入语句的耗时
+    total_us = sum(cumulative for cumulative, name in entries if not name.startswith("  "))
+    return total_us / 1000, {name.strip() for _, name in entries}
+
+
+def check_import_time():
+    """
+    检查各模块的导入耗时（多次测量中的最小值）和加载的模块
+
+    Returns:
+        问题列表，为空表示通过
+    """
+    problems = []
+    for module, budget in IMPORT_TIME_BUDGET_MS.items():
+        measurements = [measure_import(module) for _ in range(REPEAT)]
+        elapsed = min(ms for ms, _ in measurements)
+        loaded = set().union(*(modules for _, modules in measurements))
+        print(f"{module}: {elapsed:.1f} ms（预算 {budget} ms）")
+        if elapsed > budget:
+            problems.append(f"导入 {module} 耗时 {elapsed:.1f} ms，超过预算 {budget} ms")
+        for lazy_module in LAZY_MODULES:
+            if lazy_module in loaded:
+                problems.append(f"导入 {module} 时加载了 {lazy_module}")
+    return problems
+
+
+def test_import_time():
+    """测试命令行程序的导入耗时和导入时加载的模块"""
+    problems = check_import_time()
+    assert not problems, "\n".join(problems)
+
+
+if __name__ == "__main__":
+    problems = check_import_time()
+    if problems:
+        print("\n❌ 启动耗时检查未通过:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("\n✅ 启动耗时检查通过")
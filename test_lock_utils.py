@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+测试文件锁
+多个线程同时对同一个文件加锁并修改时结果不丢失，共享锁可以同时持有；
+释放后锁文件被删除，LOCK_DIR 中不会随加锁的文件数量积累锁文件
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+from obsidian2chirpy.utils import lock_utils
+
+# 同时加锁的线程数、每个线程的加锁次数，以及依次加锁的不同文件数
+THREADS = 8
+ROUNDS = 200
+FILE_COUNT = 300
+
+
+def check_exclusive(temp_dir, lock_dir):
+    """
+    多个线程在排他锁内读取、加一、写回同一个计数文件，最终计数应等于加锁总次数
+    """
+    counter_path = os.path.join(temp_dir, "counter.txt")
+    with open(counter_path, 'w', encoding='utf-8') as f:
+        f.write("0")
+
+    def increment():
+        for _ in range(ROUNDS):
+            with lock_utils.file_lock(counter_path, lock_dir=lock_dir):
+                with open(counter_path, 'r', encoding='utf-8') as f:
+                    value = int(f.read())
+                with open(counter_path, 'w', encoding='utf-8') as f:
+                    f.write(str(value + 1))
+
+    threads = [threading.Thread(target=increment) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(counter_path, 'r', encoding='utf-8') as f:
+        value = int(f.read())
+    if value != THREADS * ROUNDS:
+        return [f"排他锁没有保护并发修改：计数为 {value}，应为 {THREADS * ROUNDS}"]
+    return []
+
+
+def check_shared(temp_dir, lock_dir):
+    """
+    两个线程应能同时持有同一个文件的共享锁
+    """
+    path = os.path.join(temp_dir, "shared.txt")
+    barrier = threading.Barrier(2, timeout=5)
+    failures = []
+
+    def read():
+        with lock_utils.file_lock(path, shared=True, lock_dir=lock_dir):
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                failures.append(True)
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ["两个线程不能同时持有共享锁"] if failures else []
+
+
+def check_cleanup(temp_dir, lock_dir):
+    """
+    依次对大量不同文件加锁后，锁目录应为空
+    """
+    for index in range(FILE_COUNT):
+        with lock_utils.file_lock(os.path.join(temp_dir, f"post{index}.md"), lock_dir=lock_dir):
+            pass
+    leftover = os.listdir(lock_dir)
+    if leftover:
+        return [f"释放锁后仍有 {len(leftover)} 个锁文件"]
+    return []
+
+
+def check_lock_utils():
+    """
+    检查文件锁的互斥、共享和锁文件清理
+
+    Returns:
+        问题列表，为空表示通过
+    """
+    if lock_utils.fcntl is None:
+        return []
+    problems = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lock_dir = os.path.join(temp_dir, ".o2c_locks")
+        problems.extend(check_exclusive(temp_dir, lock_dir))
+        problems.extend(check_shared(temp_dir, lock_dir))
+        problems.extend(check_cleanup(temp_dir, lock_dir))
+        if not problems and os.listdir(lock_dir):
+            problems.append("所有锁释放后锁目录不为空")
+    return problems
+
+
+def test_lock_utils():
+    """测试文件锁"""
+    problems = check_lock_utils()
+    assert not problems, "\n".join(problems)
+
+
+if __name__ == "__main__":
+    problems = check_lock_utils()
+    if problems:
+        print("\n❌ 文件锁检查未通过:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("✅ 文件锁检查通过")
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""
+测试分片转换与合并
+在临时的笔记库和博客目录中，分别不分片转换和分成3片转换后合并，
+两者的哈希记录、文章索引和文章内容应相同；清单有冲突时合并失败，且不修改任何文件
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from obsidian2chirpy.config import context
+from obsidian2chirpy.core import sharding
+from obsidian2chirpy.core.file_processor import process_folder
+
+# 分片数和笔记数
+SHARD_COUNT = 3
+NOTE_COUNT = 12
+
+NOTE_TEMPLATE = (
+    "---\ncreated: 2025-03-{day:02d} 10:00:00\n---\n\n"
+    "# 第 {index} 篇\n\n正文 {index} 与公式 $x_{index}$\n\n>[!tip] 提示\n>内容 {index}\n"
+)
+
+POST_TEMPLATE = '---\ntitle: "{title}"\ndate: 2025-03-{day:02d} 10:00:00 +0800\ncategories: [已有]\n---\n\n旧的正文\n'
+
+
+def make_site(root):
+    """
+    在 root 下创建笔记库和博客目录，返回转换使用的设置
+    笔记分布在多个文件夹中；一半笔记在博客中已有文章，按更新处理，另一半按发布筛选新建文章，
+    博客中还有一篇不对应笔记的文章
+    """
+    vault = os.path.join(root, "vault")
+    posts_root = os.path.join(root, "site", "_posts")
+    for index in range(NOTE_COUNT):
+        folder = os.path.join(vault, ["", "物理", os.path.join("数学", "代数")][index % 3])
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"笔记{index}.md"), 'w', encoding='utf-8') as f:
+            f.write(NOTE_TEMPLATE.format(day=index + 1, index=index))
+    os.makedirs(os.path.join(posts_root, "已有"))
+    titles = [f"笔记{index}" for index in range(0, NOTE_COUNT, 2)] + ["其他文章"]
+    for day, title in enumerate(titles, 1):
+        with open(os.path.join(posts_root, "已有", f"2025-03-{day:02d}-{title}.md"), 'w', encoding='utf-8') as f:
+            f.write(POST_TEMPLATE.format(title=title, day=day))
+    return context.snapshot(
+        SOURCE_FOLDER=vault,
+        POSTS_ROOT=posts_root,
+        DECISIONS_FILE_PATH=os.path.join(root, "site", "callout_decisions.json"),
+        ENABLE_AUTO_SUMMARY=False,
+        CALLOUT_DEFAULT_DECISION="I",
+        PUBLISH_FILTER=True,
+        PUBLISH_REQUIRE_FLAG=False,
+        PUBLISH_EXCLUDE_TAGS=[],
+    )
+
+
+def run_shards(root):
+    """
+    创建笔记库，依次转换每个分片
+    每个分片使用一份独立的设置，加上 shard_settings 返回的分片设置
+
+    Returns:
+        合并使用的设置
+    """
+    values = make_site(root)
+    for index in range(1, SHARD_COUNT + 1):
+        with context.use(dict(values)) as shard_values:
+            shard_values.update(sharding.shard_settings(index, SHARD_COUNT))
+            process_folder("")
+    return values
+
+
+def read_text(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def site_state(values):
+    """
+    返回博客目录的状态：哈希记录、文章索引和各文章的内容
+    忽略记录文件的注释行和随转换时间变化的 last_modified_at
+    """
+    def content_lines(path):
+        text = read_text(path) or ""
+        return sorted(line for line in text.splitlines() if line and not line.startswith('#'))
+
+    posts = {}
+    for directory, _, names in os.walk(values['POSTS_ROOT']):
+        for name in names:
+            path = os.path.join(directory, name)
+            lines = read_text(path).splitlines()
+            posts[os.path.relpath(path, values['POSTS_ROOT'])] = [
+                line for line in lines if not line.startswith("last_modified_at:")
+            ]
+    return {
+        "hashes": content_lines(values['HASH_FILE_PATH']),
+        "inventory": content_lines(values['INVENTORY_PATH']),
+        "posts": posts,
+    }
+
+
+def files_state(values):
+    """
+    返回合并会修改的文件的原始内容，用于检查合并失败时没有修改任何文件
+    """
+    paths = [values['HASH_FILE_PATH'], values['INVENTORY_PATH']]
+    paths += sorted(
+        os.path.join(values['SHARD_DIR'], name) for name in os.listdir(values['SHARD_DIR'])
+        if name.startswith("manifest.")
+    )
+    return {path: read_text(path) for path in paths}
+
+
+def check_merge(root, full_state):
+    """
+    检查分片转换并合并后，与不分片转换的结果相同
+    """
+    values = run_shards(root)
+    with context.use(dict(values)):
+        merged = sharding.merge_manifests()
+    if not merged:
+        return ["分片清单合并失败"]
+    problems = []
+    sharded_state = site_state(values)
+    for name, label in (("hashes", "哈希记录"), ("inventory", "文章索引"), ("posts", "文章")):
+        if sharded_state[name] != full_state[name]:
+            problems.append(f"分片转换合并后的{label}与不分片转换不同")
+    if len(full_state["hashes"]) != NOTE_COUNT:
+        problems.append(f"不分片转换的哈希记录有 {len(full_state['hashes'])} 条，应为 {NOTE_COUNT} 条")
+    return problems
+
+
+def check_conflict(root, tamper, label):
+    """
+    检查清单有冲突时合并失败，且哈希记录、文章索引和清单都保持不变
+
+    Args:
+        tamper: 制造冲突的函数，参数为设置字典
+        label: 冲突的说明
+    """
+    values = run_shards(root)
+    tamper(values)
+    before = files_state(values)
+    with context.use(dict(values)):
+        merged = sharding.merge_manifests()
+    problems = []
+    if merged:
+        problems.append(f"{label}时合并成功，应拒绝合并")
+    if files_state(values) != before:
+        problems.append(f"{label}时合并修改了哈希记录、文章索引或分片清单")
+    return problems
+
+
+def swap_shard_index(values):
+    # 把第2片的清单标记为第1片，清单中的笔记不属于标记的分片
+    path = os.path.join(values['SHARD_DIR'], f"manifest.shard-2-of-{SHARD_COUNT}.json")
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest["shard"] = [1, SHARD_COUNT]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def remove_synced_post(values):
+    # 删除一篇分片转换的文章，相当于该分片的文章还没有同步过来
+    path = os.path.join(values['SHARD_DIR'], f"manifest.shard-1-of-{SHARD_COUNT}.json")
+    with open(path, 'r', encoding='utf-8') as f:
+        post = sorted(json.load(f)["posts"].values())[0]
+    os.remove(os.path.join(values['POSTS_ROOT'], *post.split('/')))
+
+
+def check_sharding():
+    """
+    比较分片转换合并与不分片转换的结果，并检查冲突时的合并
+
+    Returns:
+        问题列表，为空表示通过
+    """
+    problems = []
+    with tempfile.TemporaryDirectory() as temp_dir, contextlib.redirect_stdout(io.StringIO()):
+        # 各次转换使用同一个目录，哈希记录中的源文件路径相同
+        root = os.path.join(temp_dir, "run")
+        values = make_site(root)
+        with context.use(dict(values)):
+            process_folder("")
+        full_state = site_state(values)
+
+        checks = [
+            lambda: check_merge(root, full_state),
+            lambda: check_conflict(root, swap_shard_index, "清单的分片序号与笔记不符"),
+            lambda: check_conflict(root, remove_synced_post, "分片的文章尚未同步"),
+        ]
+        for check in checks:
+            shutil.rmtree(root)
+            problems.extend(check())
+    return problems
+
+
+def test_sharding():
+    """测试分片转换与合并"""
+    problems = check_sharding()
+    assert not problems, "\n".join(problems)
+
+
+if __name__ == "__main__":
+    problems = check_sharding()
+    if problems:
+        print("\n❌ 分片检查未通过:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print(f"✅ 分片检查通过：{SHARD_COUNT} 个分片合并后与不分片转换的结果相同，有冲突时拒绝合并且不修改文件")
@@ -0,0 +1,86 @@
+"""
+测试转换步骤的预筛选
+每个步骤的预筛选只在该步骤不会修改文本时才跳过：
+预筛选不通过的输入（包括只差一个字符就会触发该步骤的输入）经过该步骤后保持不变，
+预筛选通过的典型输入确实会被该步骤修改
+"""
+
+import os
+
+import pytest
+
+from obsidian2chirpy.config import context
+from obsidian2chirpy.processors import markdown_processor
+
+STAGES = {stage.name: stage for stage in markdown_processor.STAGES}
+
+# 各步骤预筛选不通过的输入，含有其他步骤的触发字符以及与该步骤语法相近的内容
+SKIPPED_INPUTS = {
+    "separate_callouts": ["[!info] 标题\n[!tip] 标题\n", "x $a$ [[链接]]\n", "a\n\n\n\nb"],
+    "wiki_links": ["[文字](链接) ]]", "[ [a]]", ">[!info] t\n>内容\n", "[a] [b]"],
+    "callouts": ["> 引用\n> 第二行\n", "[!info] 标题\n内容", ">文字 [!tip]", "x > y [z]"],
+    "math": ["\\(x\\) 与 \\[y\\]", "{{a}} |x|", ">[!info] t\n>内容\n"],
+    "math_braces": ["{{a}} |x| \\{b\\}", "$x$ 与 $$y$$", "\\[x\\]"],
+    "math_newlines": ["$$\na=b\n$$", "\\[x\\] \\(y\\)", "a\n\n\nb"],
+    "math_blank_lines": ["段落\n$$x$$\n段落", "a\n\nb\n\nc", "\\[x\\]\n文字"],
+    "math_dollars": ["$x$ $$y$$", "\\[x\\] \\(y\\)", "{{a}}"],
+}
+
+# 各步骤预筛选通过、且会被该步骤修改的输入
+CHANGED_INPUTS = {
+    "separate_callouts": ">[!info] a\n>x\n>[!tip] b\n>y\n",
+    "wiki_links": "见 [[笔记|别名]]",
+    "callouts": ">[!tip] 提示\n>内容\n",
+    "math": "公式 $x$",
+    "math_braces": "\\\\(|x|\\\\)",
+    "math_newlines": "文字\\\\[x\\\\]文字",
+    "math_blank_lines": "a\n\n\nb",
+    "math_dollars": "\\\\(x\\\\)",
+}
+
+
+@pytest.fixture
+def file_path(tmp_path):
+    """
+    使用临时的callout决策文件，未支持的callout类型按I处理，不询问用户
+    """
+    values = context.snapshot(
+        DECISIONS_FILE_PATH=os.path.join(tmp_path, "callout_decisions.json"),
+        CALLOUT_DEFAULT_DECISION="I",
+        DISABLED_STAGES=[],
+        STAGE_ORDER=[],
+    )
+    with context.use(values):
+        yield os.path.join(tmp_path, "note.md")
+
+
+@pytest.mark.parametrize("name,text", [(name, text) for name, texts in SKIPPED_INPUTS.items() for text in texts])
+def test_skipped_stage_leaves_text_unchanged(file_path, name, text):
+    stage = STAGES[name]
+    assert not stage.prefilter(text)
+    assert stage.func(text, file_path) == text
+
+
+@pytest.mark.parametrize("name", sorted(CHANGED_INPUTS))
+def test_prefilter_passes_text_the_stage_changes(file_path, name):
+    stage = STAGES[name]
+    text = CHANGED_INPUTS[name]
+    assert stage.prefilter(text)
+    assert stage.func(text, file_path) != text
+
+
+def test_every_stage_is_covered():
+    assert set(SKIPPED_INPUTS) == set(STAGES)
+    assert set(CHANGED_INPUTS) == set(STAGES)
+
+
+def test_convert_body_skips_only_stages_that_would_not_change_text(file_path):
+    text = "普通段落，含有 [文字](链接) 和 {{a}}\n\n第二段"
+    with context.use_state({}):
+        converted = markdown_processor.convert_body(text, file_path)
+        stats = markdown_processor.current_stage_stats()
+    unfiltered = text
+    for stage in markdown_processor.STAGES:
+        unfiltered = stage.func(unfiltered, file_path)
+    assert converted == unfiltered
+    assert all(runs == 0 and skips == 1 for runs, skips, _ in stats.values())